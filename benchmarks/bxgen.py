@@ -0,0 +1,164 @@
+"""
+Generator for large, valid BX programs to benchmark the compiler.
+
+Every generated program type checks, terminates and only computes with non-negative values below 2^50
+(every assignment is reduced modulo 1009), so all optimization levels have to print the same numbers.
+
+Usage: python benchmarks/bxgen.py [--functions N] [--statements N] [--depth N] [--live-vars N]
+                                  [--call-density P] [--loops N] [--params N] [--seed N] > program.bx
+"""
+import argparse
+import random
+from typing import List
+
+MODULUS = 1009
+
+
+class ProgramGenerator:
+    """
+    Generates a BX program.
+
+    Args:
+        functions (int, optional): number of functions besides main
+        statements (int, optional): number of simple statements (assignments) per function,
+            the statements inside of ifs and loops count as well
+        depth (int, optional): maximal nesting depth of ifs inside a function or a loop
+        live_vars (int, optional): number of variables of every function, they are all live until the return
+        call_density (float, optional): probability that an assignment contains a call to another function
+        loops (int, optional): number of while loops in every function
+        params (int, optional): number of parameters of every function
+        seed (int, optional): seed of the random generator, the same parameters and seed give the same program
+    """
+
+    def __init__(
+        self,
+        functions=10,
+        statements=20,
+        depth=2,
+        live_vars=8,
+        call_density=0.1,
+        loops=2,
+        params=2,
+        seed=0,
+    ) -> None:
+        self.functions = functions
+        self.statements = statements
+        self.depth = depth
+        self.live_vars = max(1, live_vars)
+        self.call_density = call_density
+        self.loops = loops
+        self.params = max(1, params)
+        self.rng = random.Random(seed)
+        # only the first quarter of the functions are called by others and they don't call anything,
+        # this bounds the runtime of the programs while still mixing calls into every function
+        self.leaves = max(1, functions // 4)
+
+    def program(self) -> str:
+        parts = [self.function(i) for i in range(self.functions)]
+        calls = [
+            f"    print(f{i}({', '.join(str(self.rng.randrange(MODULUS)) for _ in range(self.params))}));\n"
+            for i in range(self.functions)
+        ]
+        parts.append("def main() {\n" + "".join(calls) + "}\n")
+        return "\n".join(parts)
+
+    def function(self, index: int) -> str:
+        self.index = index
+        params = ", ".join(f"p{i}" for i in range(self.params))
+        lines = [f"def f{index}({params}: int): int {{"]
+        # every parameter is used outside of the loops
+        for v in range(self.live_vars):
+            lines.append(f"    var v{v} = (p{v % self.params} + {v}) % {MODULUS} : int;")
+        # half of the statements go into the loop bodies, the rest before, between and after the loops
+        in_loops = self.statements // 2 if self.loops else 0
+        bodies = split(in_loops, self.loops)
+        segments = split(self.statements - in_loops, self.loops + 1)
+        for k in range(self.loops):
+            lines += self.block(segments[k], 0, "    ")
+            lines.append(f"    var i{k} = 0 : int;")
+            lines.append(f"    while (i{k} < {self.rng.randint(2, 6)}) {{")
+            lines.append(f"        i{k} = i{k} + 1;")
+            lines += self.block(bodies[k], 0, "        ")
+            lines.append("    }")
+        lines += self.block(segments[-1], 0, "    ")
+        total = " + ".join(f"v{v}" for v in range(self.live_vars))
+        lines.append(f"    return ({total}) % {MODULUS};")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    def block(self, budget: int, depth: int, indent: str) -> List[str]:
+        lines = []
+        while budget > 0:
+            if depth < self.depth and budget >= 3 and self.rng.random() < 0.25:
+                then = self.rng.randint(1, budget - 1)
+                other = self.rng.randint(0, budget - then)
+                lines.append(f"{indent}if ({self.condition()}) {{")
+                lines += self.block(then, depth + 1, indent + "    ")
+                if other > 0:
+                    lines.append(f"{indent}}} else {{")
+                    lines += self.block(other, depth + 1, indent + "    ")
+                lines.append(f"{indent}}}")
+                budget -= then + other
+            else:
+                lines.append(f"{indent}{self.var()} = ({self.expr()}) % {MODULUS};")
+                budget -= 1
+        return lines
+
+    def var(self) -> str:
+        return f"v{self.rng.randrange(self.live_vars)}"
+
+    def operand(self) -> str:
+        r = self.rng.random()
+        if r < self.call_density and self.index >= self.leaves:
+            callee = self.rng.randrange(self.leaves)
+            return f"f{callee}({', '.join(self.var() for _ in range(self.params))})"
+        if r < 0.8:
+            return self.var()
+        return str(self.rng.randrange(1, 50))
+
+    def expr(self) -> str:
+        # at most four operands below 2^10 and shifts by at most 3, so the value stays below 2^50
+        expr = self.operand()
+        for _ in range(self.rng.randint(1, 3)):
+            op = self.rng.choice(["+", "*", "+", "^", "&", "|", ">>", "<<"])
+            if op in (">>", "<<"):
+                expr = f"({expr} {op} {self.rng.randint(1, 3)})"
+            else:
+                expr = f"{expr} {op} {self.operand()}"
+        return expr
+
+    def condition(self) -> str:
+        r = self.rng.random()
+        if r < 0.3:
+            return f"{self.var()} < {self.var()}"
+        if r < 0.6:
+            return f"{self.var()} % {self.rng.randint(2, 5)} == 0"
+        if r < 0.8:
+            return f"({self.var()} & 1) == 1 && {self.var()} > {self.rng.randrange(MODULUS)}"
+        return f"!({self.var()} == {self.var()}) || {self.var()} >= {self.rng.randrange(MODULUS)}"
+
+
+def split(total: int, parts: int) -> List[int]:
+    # total split into parts that differ by at most one
+    return [total // parts + (i < total % parts) for i in range(parts)]
+
+
+def generate(**params) -> str:
+    """
+    Generate a program, see ProgramGenerator for the parameters
+    """
+    return ProgramGenerator(**params).program()
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    argparser.add_argument("--functions", type=int, default=10)
+    argparser.add_argument("--statements", type=int, default=20)
+    argparser.add_argument("--depth", type=int, default=2)
+    argparser.add_argument("--live-vars", type=int, default=8)
+    argparser.add_argument("--call-density", type=float, default=0.1)
+    argparser.add_argument("--loops", type=int, default=2)
+    argparser.add_argument("--params", type=int, default=2)
+    argparser.add_argument("--seed", type=int, default=0)
+    args = argparser.parse_args()
+    print(generate(**vars(args)), end="")
@@ -0,0 +1,110 @@
+"""
+Compares the PLY front end (lib/scanner.py, lib/parser.py) with the hand-written one (lib/rdparser.py)
+on large generated programs: tokens per second of the scanners, ASTs per second of the parsers,
+and the time it takes to import each front end.
+
+Usage: python benchmarks/parser_bench.py [--functions N] [--repeat R]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lib.cache import fingerprint
+from lib.parser import parser
+from lib.scanner import lexer
+from lib import rdparser
+
+
+def generate(functions: int) -> str:
+    """
+    A program with `functions` functions using all statements and most operators
+    """
+    parts = ["var g = 3 : int;\n"]
+    for i in range(functions):
+        parts.append(
+            f"""def f{i}(a, b: int, c: bool): int {{
+    var x = a + {i} * (b - g) : int;
+    var y = -b << 2 : int;
+    // the loop
+    while (x > 0 && !c || x == {i}) {{
+        if (x % 2 == 0) {{ y = y + x * b / 3; }} else {{ y = y - (g ^ ~x) | 1 & a; }}
+        x = x - 1;
+        if (y >= 1000) {{ break; }}
+    }}
+    print(y >> 1);
+    return y;
+}}
+"""
+        )
+    parts.append(
+        "def main() {\n" + "".join(f"    print(f{i}({i}, 2, true));\n" for i in range(functions)) + "}\n"
+    )
+    return "".join(parts)
+
+
+def ply_tokens(src: str) -> int:
+    lexer.input(src)
+    count = 0
+    while lexer.token():
+        count += 1
+    return count
+
+
+def ply_parse(src: str):
+    lexer.lineno = 1
+    return parser.parse(src, lexer=lexer)
+
+
+def best_time(fun, src: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fun(src)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def import_time(module: str, repeat: int) -> float:
+    # fresh interpreter every time, the import itself is measured inside it
+    code = f"import time; s = time.perf_counter(); import {module}; print(time.perf_counter() - s)"
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    return min(
+        float(subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout)
+        for _ in range(repeat)
+    )
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    argparser.add_argument("--functions", type=int, default=2000, help="functions in the generated program")
+    argparser.add_argument("--repeat", type=int, default=5, help="runs per measurement, the best one is reported")
+    args = argparser.parse_args()
+
+    src = generate(args.functions)
+    ntokens = len(rdparser.scan(src)[0])
+    assert ntokens == ply_tokens(src), "the scanners disagree on the number of tokens"
+    assert fingerprint(ply_parse(src)) == fingerprint(rdparser.parse(src)), "the parsers build different ASTs"
+
+    print(f"{args.functions} functions, {len(src)} bytes, {ntokens} tokens, best of {args.repeat} runs")
+    print(f"{'front end':<10} {'import [ms]':>12} {'tokens/s':>12} {'parse [ms]':>12} {'ASTs/s':>10}")
+    results = {}
+    for name, module, tokenize, parse in [
+        ("ply", "lib.parser", ply_tokens, ply_parse),
+        ("rd", "lib.rdparser", rdparser.scan, rdparser.parse),
+    ]:
+        scan = best_time(tokenize, src, args.repeat)
+        full = best_time(parse, src, args.repeat)
+        results[name] = full
+        print(
+            f"{name:<10} {import_time(module, args.repeat) * 1000:>12.1f} {ntokens / scan:>12.0f}"
+            f" {full * 1000:>12.1f} {1 / full:>10.2f}"
+        )
+    print(f"rd parses {results['ply'] / results['rd']:.1f}x faster than ply")
+
+
+if __name__ == "__main__":
+    main()
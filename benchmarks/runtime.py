@@ -0,0 +1,284 @@
+"""
+Runtime benchmark of the generated code: compiles a suite of BX workloads at every optimization level,
+runs every binary a few times after a warm-up and compares the levels.
+
+For every workload and level we record the wall time of the runs (mean and 95% confidence interval),
+the instructions retired in user space (if `perf stat` works on this machine), the speedup over -O0
+and a checksum of the output, which has to be the same at every level.
+The comparison is printed as a markdown table and can be written to a CSV file to track it over time.
+
+Usage: python benchmarks/runtime.py [--levels 0,2,4] [--workloads fib,collatz] [--runs N] [--warmup N]
+                                    [--csv FILE] [--markdown FILE]
+"""
+import argparse
+import hashlib
+import io
+import math
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from typing import Dict, List
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.setrecursionlimit(100000)
+
+from bxgen import generate
+from lib.compile import compile
+
+# name -> the program (a file in examples/ or parameters for bxgen), its standard input,
+# and whether its output is the same in every run (benchmark.bx prints the time it took)
+WORKLOADS = {
+    "benchmark": {"file": "examples/benchmark.bx", "stdin": "", "deterministic": False},
+    "fib": {"file": "examples/recursive_fib.bx", "stdin": "35\n", "deterministic": True},
+    "fib_loop": {"file": "examples/fib_loop.bx", "stdin": "90\n", "deterministic": True},
+    "collatz": {"file": "examples/collatz.bx", "stdin": "", "deterministic": True},
+    "generated": {"generate": {"functions": 12, "statements": 20, "seed": 1}, "stdin": "", "deterministic": True},
+    # parameters in %rdx and %rcx, which div, mod and the shifts clobber, and on the stack
+    "generated_params": {
+        "generate": {"functions": 12, "statements": 20, "params": 8, "seed": 2},
+        "stdin": "",
+        "deterministic": True,
+    },
+}
+
+# two sided 95% quantiles of the t distribution by degrees of freedom
+T_95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]  # fmt: skip
+
+
+class CompileTimeout(Exception):
+    pass
+
+
+def _alarm(signum, frame):
+    raise CompileTimeout()
+
+
+def confidence(samples: List[float]) -> float:
+    """
+    Half width of the 95% confidence interval of the mean of the samples
+    """
+    if len(samples) < 2:
+        return math.nan
+    df = len(samples) - 1
+    t = T_95[df - 1] if df <= len(T_95) else 1.96
+    return t * statistics.stdev(samples) / math.sqrt(len(samples))
+
+
+def perf_available() -> bool:
+    """
+    Whether `perf stat` can count the instructions of a process on this machine
+    """
+    try:
+        result = subprocess.run(
+            ["perf", "stat", "-x,", "-e", "instructions:u", "true"], capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0 and perf_instructions(result.stderr) is not None
+
+
+def perf_instructions(stderr: str) -> int | None:
+    # the csv output of perf stat: value,unit,event,...
+    for line in stderr.splitlines():
+        fields = line.split(",")
+        if len(fields) > 2 and fields[2].startswith("instructions"):
+            return int(fields[0]) if fields[0].isdigit() else None
+    return None
+
+
+def source(workload: Dict) -> str:
+    if "file" in workload:
+        with open(os.path.join(ROOT, workload["file"])) as fp:
+            return fp.read()
+    return generate(**workload["generate"])
+
+
+def build(src: str, optim: int, path: str, timeout: int) -> str | None:
+    """
+    Compile and link a program to `path`, returns an error message if that fails
+    """
+    signal.signal(signal.SIGALRM, _alarm)
+    signal.alarm(timeout)
+    try:
+        with redirect_stdout(io.StringIO()):
+            asm = compile(src, optim=optim)
+    except CompileTimeout:
+        return f"compile timeout after {timeout}s"
+    except (Exception, SystemExit) as e:
+        return f"compile error {type(e).__name__}: {e}"
+    finally:
+        signal.alarm(0)
+    with open(path + ".S", "w") as fp:
+        fp.write(asm)
+    result = subprocess.run(
+        ["gcc", "-o", path, path + ".S", os.path.join(ROOT, "bx_runtime.c")], capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return "link error " + result.stderr.strip().splitlines()[-1]
+    return None
+
+
+def run(path: str, stdin: str, timeout: int, perf: bool):
+    """
+    Run a binary once, returns (wall time in seconds, instructions or None, output)
+    """
+    command = [path]
+    if perf:
+        command = ["perf", "stat", "-x,", "-e", "instructions:u", "--"] + command
+    start = time.perf_counter()
+    result = subprocess.run(command, input=stdin.encode(), capture_output=True, timeout=timeout)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"exit code {result.returncode}")
+    return wall, perf_instructions(result.stderr.decode()) if perf else None, result.stdout
+
+
+def measure(name: str, optim: int, args, perf: bool, tmpdir: str) -> Dict:
+    """
+    Build and run one workload at one level
+
+    Returns:
+        dict: one row of the comparison, "status" is "ok" or what went wrong
+    """
+    workload = WORKLOADS[name]
+    row = {"workload": name, "level": f"O{optim}", "runs": 0, "mean": math.nan, "ci95": math.nan,
+           "min": math.nan, "instructions": None, "checksum": "", "status": "ok"}  # fmt: skip
+    path = os.path.join(tmpdir, f"{name}.O{optim}")
+    error = build(source(workload), optim, path, args.timeout)
+    if error is not None:
+        row["status"] = error
+        return row
+    walls = []
+    instructions = []
+    outputs = set()
+    try:
+        for i in range(args.warmup + args.runs):
+            wall, count, output = run(path, workload["stdin"], args.timeout, perf)
+            outputs.add(output)
+            if i >= args.warmup:
+                walls.append(wall)
+                if count is not None:
+                    instructions.append(count)
+    except subprocess.TimeoutExpired:
+        row["status"] = f"run timeout after {args.timeout}s"
+        return row
+    except RuntimeError as e:
+        row["status"] = str(e)
+        return row
+    row.update(runs=len(walls), mean=statistics.mean(walls), ci95=confidence(walls), min=min(walls))
+    if instructions:
+        row["instructions"] = round(statistics.median(instructions))
+    if workload["deterministic"]:
+        if len(outputs) > 1:
+            row["status"] = "output differs between runs"
+        row["checksum"] = hashlib.sha256(min(outputs)).hexdigest()[:12]
+    return row
+
+
+def compare(rows: List[Dict]):
+    """
+    Add the speedup over -O0 and compare the checksums with -O0
+    """
+    baselines = {row["workload"]: row for row in rows if row["level"] == "O0"}
+    for row in rows:
+        base = baselines.get(row["workload"])
+        row["speedup"] = math.nan
+        row["speedup_ci95"] = math.nan
+        if base is None or row["status"] != "ok" or base["status"] != "ok":
+            continue
+        speedup = base["mean"] / row["mean"]
+        row["speedup"] = speedup
+        if row is base:
+            continue
+        # propagation of the relative errors of both means
+        row["speedup_ci95"] = speedup * math.hypot(base["ci95"] / base["mean"], row["ci95"] / row["mean"])
+        if row["checksum"] != base["checksum"]:
+            row["status"] = "WRONG OUTPUT"
+
+
+COLUMNS = ["workload", "level", "runs", "mean", "ci95", "min", "speedup", "speedup_ci95", "instructions", "checksum", "status"]
+
+
+def markdown(rows: List[Dict]) -> str:
+    lines = [
+        "| workload | level | mean [ms] | ± 95% | speedup vs O0 | instructions | checksum | status |",
+        "|---|---|---:|---:|---:|---:|---|---|",
+    ]
+    for row in rows:
+        if row["status"] != "ok" and math.isnan(row["mean"]):
+            lines.append(f"| {row['workload']} | {row['level']} | | | | | | {row['status']} |")
+            continue
+        speedup = "" if math.isnan(row["speedup"]) else f"{row['speedup']:.2f}x"
+        if not math.isnan(row["speedup_ci95"]):
+            speedup += f" ± {row['speedup_ci95']:.2f}"
+        instructions = "" if row["instructions"] is None else f"{row['instructions']:,}"
+        lines.append(
+            f"| {row['workload']} | {row['level']} | {row['mean'] * 1000:.1f} | {row['ci95'] * 1000:.1f}"
+            f" | {speedup} | {instructions} | {row['checksum']} | {row['status']} |"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def write_csv(rows: List[Dict], path: str):
+    import csv
+
+    with open(path, "w", newline="") as fp:
+        writer = csv.DictWriter(fp, fieldnames=COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({column: "" if row[column] is None else row[column] for column in COLUMNS})
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    argparser.add_argument("--levels", default="0,1,2,3,4,5,6", help="comma separated optimization levels")
+    argparser.add_argument("--workloads", default=",".join(WORKLOADS), help="comma separated names of the workloads")
+    argparser.add_argument("--runs", type=int, default=5, help="measured runs per binary")
+    argparser.add_argument("--warmup", type=int, default=1, help="runs before the measured ones")
+    argparser.add_argument("--timeout", type=int, default=60, help="seconds per compilation and per run")
+    argparser.add_argument("--no-perf", action="store_true", help="don't count instructions with perf stat")
+    argparser.add_argument("--csv", help="write the results to this CSV file")
+    argparser.add_argument("--markdown", help="write the table to this file instead of printing it")
+    args = argparser.parse_args()
+    names = args.workloads.split(",")
+    for name in names:
+        if name not in WORKLOADS:
+            argparser.error(f"unknown workload {name}, expected one of {', '.join(WORKLOADS)}")
+    levels = [int(level) for level in args.levels.split(",")]
+    if 0 not in levels:
+        levels.insert(0, 0)  # the reference for the speedups and checksums
+
+    perf = not args.no_perf and perf_available()
+    if not perf:
+        print("perf stat is not available, instructions are not counted", file=sys.stderr)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in names:
+            for optim in levels:
+                row = measure(name, optim, args, perf, tmpdir)
+                print(f"{name} O{optim}: {row['status']}", file=sys.stderr)
+                rows.append(row)
+    compare(rows)
+
+    table = markdown(rows)
+    if args.markdown:
+        with open(args.markdown, "w") as fp:
+            fp.write(table)
+    else:
+        print(table, end="")
+    if args.csv:
+        write_csv(rows, args.csv)
+
+
+if __name__ == "__main__":
+    main()
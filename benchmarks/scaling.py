@@ -0,0 +1,223 @@
+"""
+Compile-time scaling benchmark: compiles generated programs (see bxgen.py) of growing size at every
+optimization level, times every pass and fits a growth exponent per pass, i.e. the k in time ~ size^k.
+
+A pass fails the benchmark if its exponent is larger than --max-exponent or if it grew by more than
+--tolerance compared to the baseline file. A compilation that crashes or runs into the timeout fails as well,
+unless the baseline already records it as failing at that level.
+
+Usage: python benchmarks/scaling.py [--levels 0,2,4] [--vary statements] [--sizes 20,40,80,160]
+                                    [--baseline FILE] [--update-baseline]
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import signal
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.setrecursionlimit(100000)  # the parser recurses along the nesting of the program
+
+from bxgen import ProgramGenerator, generate
+from lib.compile import compile
+from lib.timing import PassTimer
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scaling_baseline.json")
+VARIABLE_PARAMETERS = ["functions", "statements", "depth", "live_vars", "loops", "params"]
+# spans that are not passes: the whole function and the lazy imports
+IGNORED_SPANS = {"function", "import"}
+
+
+class CompileTimeout(Exception):
+    pass
+
+
+def _alarm(signum, frame):
+    raise CompileTimeout()
+
+
+def time_passes(src: str, optim: int, timeout: int) -> Dict[str, float]:
+    """
+    Compile a program and return the wall time of every pass summed over all functions
+
+    Args:
+        src (str): the program
+        optim (int): the optimization level
+        timeout (int): seconds until the compilation is aborted with CompileTimeout, 0 for no timeout
+    """
+    timer = PassTimer()
+    # a collection would be charged to whatever pass happens to trigger it
+    gc.collect()
+    gc.disable()
+    timer.start()
+    signal.signal(signal.SIGALRM, _alarm)
+    signal.alarm(timeout)
+    try:
+        start = time.perf_counter()
+        compile(src, optim=optim)
+        total = time.perf_counter() - start
+    finally:
+        signal.alarm(0)
+        timer.stop()
+        gc.enable()
+    times = {"total": total}
+    for record in timer.records:
+        if record["name"] not in IGNORED_SPANS:
+            times[record["name"]] = times.get(record["name"], 0.0) + record["wall"]
+    return times
+
+
+def fit_exponent(sizes: List[int], times: List[float]) -> float:
+    """
+    Least squares fit of log(time) = k * log(size) + c, returns k
+    """
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(t, 1e-9)) for t in times]
+    mx = sum(xs) / len(xs)
+    my = sum(ys) / len(ys)
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sum((x - mx) ** 2 for x in xs)
+
+
+def run_level(optim: int, args) -> Dict:
+    """
+    Time the passes at one optimization level for all sizes and fit the exponents
+
+    Returns:
+        dict: "times" pass -> list of seconds per size, "exponents" pass -> exponent
+        and "error" (None if every compilation succeeded, otherwise the sizes before the failing one are fitted)
+    """
+    times: Dict[str, List[float]] = {}
+    sizes = []
+    error = None
+    # the first compilation imports the passes and fills the caches of the interpreter
+    try:
+        time_passes(generate(functions=1, seed=args.seed), optim, args.timeout)
+    except (Exception, SystemExit):
+        pass
+    programs = [generate(**{"functions": args.functions, "seed": args.seed, args.vary: size}) for size in args.sizes]
+    best: List[Dict[str, float]] = [{} for _ in args.sizes]
+    # the repetitions go round over all sizes, so a slow phase of the machine slows down every size alike
+    # instead of bending the fit
+    for _ in range(args.repeat):
+        for i, (size, src) in enumerate(zip(args.sizes, programs)):
+            if error is not None and i >= len(sizes):
+                break
+            try:
+                for name, seconds in time_passes(src, optim, args.timeout).items():
+                    best[i][name] = min(best[i].get(name, math.inf), seconds)
+            except CompileTimeout:
+                error = f"timeout after {args.timeout}s at {args.vary}={size}"
+            except (Exception, SystemExit) as e:
+                error = f"{type(e).__name__} at {args.vary}={size}: {e}"
+            if error is not None:
+                # the larger sizes would fail as well, the smaller ones can still be fitted
+                break
+            if len(sizes) <= i:
+                sizes.append(size)
+    for result in best[: len(sizes)]:
+        for name, seconds in result.items():
+            times.setdefault(name, []).append(seconds)
+    exponents = {}
+    if len(sizes) >= 2:
+        for name, series in times.items():
+            # passes that are too fast are mostly noise, and a pass has to run at every size to be fitted
+            if len(series) == len(sizes) and series[-1] >= args.min_time:
+                exponents[name] = fit_exponent(sizes, series)
+    return {"times": times, "exponents": exponents, "error": error}
+
+
+def check(level: str, result: Dict, baseline: Dict, args) -> List[str]:
+    """
+    Compare the result of one level with the thresholds and the baseline, returns the failures
+    """
+    failures = []
+    known = baseline.get("levels", {}).get(level, {})
+    if result["error"] is not None and known.get("error") is None:
+        failures.append(f"{level}: {result['error']}")
+    for name, exponent in result["exponents"].items():
+        if exponent > args.max_exponent:
+            failures.append(f"{level} {name}: exponent {exponent:.2f} above the maximum {args.max_exponent:.2f}")
+        previous = known.get("exponents", {}).get(name)
+        if previous is not None and exponent > previous + args.tolerance:
+            failures.append(f"{level} {name}: exponent {exponent:.2f} regressed from {previous:.2f}")
+    return failures
+
+
+def report(level: str, result: Dict, sizes: List[int]):
+    print(f"\n{level}" + (f"  FAILED: {result['error']}" if result["error"] else ""))
+    if not result["times"]:
+        return
+    print(f"{'pass':<28}" + "".join(f" {size:>9}" for size in sizes) + f" {'exponent':>9}")
+    for name, series in sorted(result["times"].items(), key=lambda item: -item[1][-1]):
+        exponent = result["exponents"].get(name)
+        print(
+            f"{name:<28}"
+            + "".join(f" {seconds * 1000:>9.2f}" for seconds in series)
+            + " " * 10 * (len(sizes) - len(series))
+            + (f" {exponent:>9.2f}" if exponent is not None else f" {'-':>9}")
+        )
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    argparser.add_argument("--levels", default="0,1,2,3,4,5,6", help="comma separated optimization levels")
+    argparser.add_argument("--vary", default="statements", choices=VARIABLE_PARAMETERS, help="generator parameter that grows")
+    argparser.add_argument("--sizes", default="20,40,80,160", help="comma separated values of the growing parameter")
+    argparser.add_argument("--functions", type=int, default=4, help="functions per program, unless they are varied")
+    argparser.add_argument("--seed", type=int, default=0)
+    argparser.add_argument("--repeat", type=int, default=5, help="compilations per size, the fastest one counts")
+    argparser.add_argument("--timeout", type=int, default=60, help="seconds per compilation, 0 for none")
+    argparser.add_argument("--min-time", type=float, default=0.05, help="passes faster than this (in seconds) at the largest size are not checked")
+    argparser.add_argument("--max-exponent", type=float, default=2.5, help="fail if a pass grows faster than size^k")
+    argparser.add_argument("--tolerance", type=float, default=0.5, help="allowed growth of an exponent over the baseline")
+    argparser.add_argument("--baseline", default=DEFAULT_BASELINE, help="json file with the exponents to compare with")
+    argparser.add_argument("--update-baseline", action="store_true", help="write the exponents of this run to the baseline")
+    args = argparser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+    if len(args.sizes) < 2:
+        argparser.error("need at least two sizes to fit an exponent")
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        if baseline.get("vary") != args.vary:
+            print(f"baseline {args.baseline} varies {baseline.get('vary')}, ignoring it", file=sys.stderr)
+            baseline = {}
+
+    defaults = ProgramGenerator(functions=args.functions, seed=args.seed)
+    print(
+        f"varying {args.vary} over {', '.join(map(str, args.sizes))}; functions={defaults.functions}"
+        f" statements={defaults.statements} depth={defaults.depth} live_vars={defaults.live_vars}"
+        f" loops={defaults.loops} call_density={defaults.call_density}; times in ms, best of {args.repeat}"
+    )
+    failures = []
+    results = {}
+    for optim in [int(level) for level in args.levels.split(",")]:
+        level = f"O{optim}"
+        results[level] = run_level(optim, args)
+        report(level, results[level], args.sizes)
+        failures += check(level, results[level], baseline, args)
+
+    if args.update_baseline:
+        levels = {
+            level: {"exponents": {name: round(k, 3) for name, k in r["exponents"].items()}, "error": r["error"]}
+            for level, r in results.items()
+        }
+        with open(args.baseline, "w") as fp:
+            json.dump({"vary": args.vary, "sizes": args.sizes, "levels": levels}, fp, indent=2, sort_keys=True)
+            fp.write("\n")
+        print(f"\nwrote {args.baseline}")
+    if failures and not args.update_baseline:
+        print("\nregressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
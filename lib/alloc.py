@@ -1,6 +1,6 @@
 from .ssa import *
 from .tac import *
-from typing import List, Dict
+from typing import List, Dict, Set
 
 CC_REG_ORDER = ["rdi", "rsi", "rdx", "rcx", "r8", "r9"]
 
@@ -39,12 +39,17 @@ class DataSlot(MemorySlot):
 @dataclass
 class InterferenceGraphNode:
     tmp: SSATemp | TACTemp
-    nbh: List[TACTemp | SSATemp]
+    nbh: Set[TACTemp | SSATemp]
     value: int = 0
 
 
 @dataclass
 class InterferenceGraph:
+    """
+    Undirected interference graph stored as adjacency sets, so adding an edge, testing for one and
+    removing or merging a node only touch the neighbourhoods involved.
+    """
+
     nodes: Dict[SSATemp | TACTemp, InterferenceGraphNode]
 
     def __repr__(self):
@@ -53,38 +58,63 @@ class InterferenceGraph:
     def __str__(self):
         return str(self.nodes)
 
-    def remove(self, tmp: SSATemp | TACTemp):
-        """removes a node from the graph, used in register coalescing
+    def add_node(self, tmp: SSATemp | TACTemp) -> InterferenceGraphNode:
+        """adds a node without neighbours if tmp is not in the graph yet
 
         Args:
-            tmp (SSATemp|TACTemp): the name of the node to be removed
+            tmp (SSATemp|TACTemp): the name of the node
 
         Returns:
-            InterferenceGraph: New Graph without the removed node
+            InterferenceGraphNode: the node of tmp
+        """
+        node = self.nodes.get(tmp)
+        if node is None:
+            node = self.nodes[tmp] = InterferenceGraphNode(tmp, set(), 0)
+        return node
+
+    def add_edges(self, tmp: SSATemp | TACTemp, others):
+        """adds the edges between tmp and each of others (except tmp itself), adding the missing nodes
+
+        Args:
+            tmp (SSATemp|TACTemp): a node of the graph
+            others (iterable of SSATemp|TACTemp): the temporaries that interfere with tmp
         """
-        del self.nodes[tmp]
-        for i in list(self.nodes.keys()):
-            node = self.nodes[i]
-            if tmp in node.nbh:
-                node.nbh.remove(tmp)
+        nbh = self.nodes[tmp].nbh
+        for other in others:
+            if other is not tmp and other not in nbh:
+                nbh.add(other)
+                self.add_node(other).nbh.add(tmp)
+
+    def interferes(self, tmp1: SSATemp | TACTemp, tmp2: SSATemp | TACTemp) -> bool:
+        return tmp2 in self.nodes[tmp1].nbh
+
+    def remove(self, tmp: SSATemp | TACTemp):
+        """removes a node from the graph, used in register coalescing and spilling. O(degree)
+
+        Args:
+            tmp (SSATemp|TACTemp): the name of the node to be removed
+        """
+        node = self.nodes.pop(tmp)
+        for nei in node.nbh:
+            self.nodes[nei].nbh.discard(tmp)
 
     def merge_nodes(self, new: SSATemp | TACTemp, old1: SSATemp | TACTemp, old2: SSATemp | TACTemp):
-        """Merge nodes old1 and old2 into new (adding new), used in register coalescing.
+        """Merge nodes old1 and old2 into new (adding new), used in register coalescing. O(degree)
+        The old nodes are kept, they are removed by the caller.
 
         Args:
             new (Temp): temporary to be added
-            a (Temp): temporary whos neighbours it copies
-            b (Temp): temporary whos neighbours it copies
+            old1 (Temp): temporary whos neighbours it copies
+            old2 (Temp): temporary whos neighbours it copies
 
         Returns:
-            _type_: _description_
+            InterferenceGraph: the graph
         """
-        nei = self.nodes[old1].nbh + self.nodes[old2].nbh
-        self.nodes[new] = InterferenceGraphNode(new, nei, 0)
+        self.add_node(new)
+        self.add_edges(new, (self.nodes[old1].nbh | self.nodes[old2].nbh) - {old1, old2})
         return self
 
 
-
 class Allocator:
     @abstractmethod
     def allocate(self) -> AllocRecord:
@@ -102,7 +132,7 @@ class SpillingAllocator(Allocator):
         }
         params_stack_mapping = {
             param: StackSlot(16 + (i) * 8)
-            for i, param in enumerate(reversed(self.proc.params[6:]))
+            for i, param in enumerate(self.proc.params[6:])
         }
         varlist = self.proc.body.get_tmps()
         var_mapping = {var: StackSlot(-(i + 1) * 8) for i, var in enumerate(varlist)}
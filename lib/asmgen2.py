@@ -1,5 +1,6 @@
 from .tac import *
 from .alloc import AllocRecord, MemorySlot, Register, StackSlot, DataSlot
+from .liveness import SerializedLivenessAnalyzer
 
 OPCODE_TO_ASM = {
     "add": "addq",
@@ -17,7 +18,7 @@ CC_REG_ORDER = ["rdi", "rsi", "rdx", "rcx", "r8", "r9"]
 SIMPLE_BIN_OPS = {"add", "sub", "mul", "and", "or", "xor"}
 SIMPLE_UN_OPS = {"not", "neg"}
 CALLEE_SAVE = ["rbx", "r12", "r13", "r14", "r15"]
-CALLER_SAVE = ["rax", "rdi", "rsi", "rdx", "rcx", "r8", "r9", "10", "r11"]
+CALLER_SAVE = ["rax", "rdi", "rsi", "rdx", "rcx", "r8", "r9", "r10", "r11"]
 
 
 def global_symbs(decls: List[StatementDecl | Function]):
@@ -55,7 +56,8 @@ class AllocAsmGen:
         self.alloc = alloc
         self.tac = proc.body
         self.body = ""
-        self.reg_used = list(
+        # sorted, so the callee save registers are pushed in the same order in every run
+        self.reg_used = sorted(
             {
                 slot.name
                 for slot in self.alloc.mapping.values()
@@ -98,7 +100,7 @@ class AllocAsmGen:
             if i < 6 and self.get_location(param) != Register(CC_REG_ORDER[i]):
                 head_code += f"    movq %{CC_REG_ORDER[i]}, {self.to_address(param)}\n"
             if i >= 6 and self.get_location(param) != StackSlot(16 + (i - 6) * 8):
-                head_code += f"    movq {16+(i-6)*8}(%rsp), %r11\n"
+                head_code += f"    movq {16+(i-6)*8}(%rbp), %r11\n"
                 head_code += f"    movq %r11, {self.to_address(param)}\n"
 
         return head_code
@@ -133,7 +135,10 @@ class AllocAsmGen:
         Returns:
             str: Compiled assembly code
         """
-        for op in self.tac.ops:
+        # the allocation may have renamed temporaries, so the liveness is computed on the final TAC
+        self.liveness = SerializedLivenessAnalyzer(self.tac)
+        self.liveness.liveness()
+        for k, op in enumerate(self.tac.ops):
             if not isinstance(op, TACLabel):
                 self.body += "    /* " + op.pretty() + "*/\n"
             match op:
@@ -160,7 +165,7 @@ class AllocAsmGen:
                     "call",
                     _,
                 ):
-                    self.compile_call(op)  # this gets a little bit complicated
+                    self.compile_call(op, k)  # this gets a little bit complicated
                 case TACOp(
                     "jz" | "jnz" | "jl" | "jle" | "jnl" | "jnle" as op,
                     [arg, label],
@@ -287,12 +292,13 @@ class AllocAsmGen:
         elif isinstance(var, TACGlobal):
             return DataSlot(var.name)
         
-    def compile_call(self, op: TACOp) -> str:
+    def compile_call(self, op: TACOp, k: int) -> str:
         """
         Utitility function to compile call instructions
 
         Args:
             op (TACOp): The Call instruction to be compiled
+            k (int): its index in the TAC
 
         Return:
             str: The compiled call
@@ -304,12 +310,14 @@ class AllocAsmGen:
         args = op.args[1:]
         res = op.result
         # store caller-save registers
+        live_in, live_out = self.liveness.at(k)
         used_registers = [
             self.get_location(var)
-            for var in op.live_out.intersection(
-                op.live_in
+            for var in live_out.intersection(
+                live_in
             )  # we look for all variables that have to stay alive throughout the call
-            if isinstance(self.get_location(var), Register)
+            if not str(var.id).startswith("%%")  # the dummies of the preallocated registers hold no value
+            and isinstance(self.get_location(var), Register)
             and self.get_location(var).name in CALLER_SAVE
         ]
         stack_offset = 0 # to keep track of the stack pointer
@@ -317,7 +325,7 @@ class AllocAsmGen:
             self.body += f"    pushq %{reg.name}\n"
             stack_offset +=1
         # stack alignment
-        if max(len(args) - 6, 0) + len(used_registers) % 2 != 0:
+        if (max(len(args) - 6, 0) + len(used_registers)) % 2 != 0:
             self.body += f"    movq $0, %r11\n    pushq %r11\n"
             stack_offset +=1 
         # allocate arguments according to CC
@@ -342,7 +350,7 @@ class AllocAsmGen:
         self.body += f"    callq {callee}\n"
 
         # remove alignment buffer if inserted
-        if max(len(args) - 6, 0) + len(used_registers) % 2 != 0:
+        if (max(len(args) - 6, 0) + len(used_registers)) % 2 != 0:
             self.body += f"    addq $8, %rsp\n"
         # restore stack
         if len(args) > 6:
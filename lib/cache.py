@@ -0,0 +1,223 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from dataclasses import fields, is_dataclass
+from typing import Any, Dict, List, Set, Tuple
+from .bxast import *
+from .tac import TACGlobal
+
+DEFAULT_CACHE_DIR = ".bxcache"
+DEFAULT_CACHE_SIZE = 256 * 2**20  # bytes
+
+STAGES = ["ast", "tac", "asm"]
+
+_compiler_version = None
+
+
+def compiler_version() -> str:
+    """
+    Version of the compiler used in the cache keys.
+    We don't have release numbers, so this is a hash of the sources of the compiler itself:
+    every change to a pass invalidates all entries it could have produced.
+    """
+    global _compiler_version
+    if _compiler_version is None:
+        digest = hashlib.sha256(f"python{sys.version_info[:2]}".encode())
+        libdir = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(libdir)):
+            if name.endswith(".py"):
+                with open(os.path.join(libdir, name), "rb") as fp:
+                    digest.update(name.encode())
+                    digest.update(fp.read())
+        _compiler_version = digest.hexdigest()
+    return _compiler_version
+
+
+def fingerprint(node) -> str:
+    """
+    A stable textual representation of an AST, with the type annotations added by the checker.
+    They are part of it since they depend on the rest of the program: the return types of the called functions
+    and the types of the globals decide how a call or a variable is lowered.
+
+    Args:
+        node: an AST node, list of nodes or leaf value
+    """
+    if isinstance(node, (list, tuple)):
+        return "[" + ",".join(fingerprint(child) for child in node) + "]"
+    if isinstance(node, PrimiType):
+        return f"PrimiType({node.name})"
+    if isinstance(node, FunctionType):
+        return f"FunctionType({fingerprint(node.input_type)},{fingerprint(node.out_type)})"
+    if isinstance(node, Type) or isinstance(node, type):
+        return getattr(node, "__name__", type(node).__name__)
+    if is_dataclass(node):
+        children = [f"{f.name}={fingerprint(getattr(node, f.name))}" for f in fields(node)]
+        return f"{type(node).__name__}({','.join(children)})"
+    return repr(node)
+
+
+def referenced_names(node) -> Set[str]:
+    """
+    All variable names read or written somewhere in the AST
+    """
+    names = set()
+    if isinstance(node, (list, tuple)):
+        for child in node:
+            names |= referenced_names(child)
+    elif isinstance(node, ExpressionVar):
+        names.add(node.name)
+    elif isinstance(node, StatementAssign):
+        names.add(node.lvalue)
+        names |= referenced_names(node.rvalue)
+    elif is_dataclass(node):
+        for f in fields(node):
+            if f.name != "ty":
+                names |= referenced_names(getattr(node, f.name))
+    return names
+
+
+def hash_key(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def source_key(src: str) -> str:
+    """
+    Key for the checked AST of a whole source file
+    """
+    return hash_key("ast", compiler_version(), src)
+
+
+def unit_key(fun: Function, globalmap: Dict[str, TACGlobal], optim=None, allocator=None) -> str:
+    """
+    Key for the compilation of a single function.
+    It depends on the function's checked AST (including the types of the calls and variables in it),
+    the globals it reads and writes and the compiler version.
+
+    Args:
+        fun (Function): the AST of the function
+        globalmap (dict str -> TACGlobal): a mapping of global variables
+        optim (int, optional): the optimization level. None for results that don't depend on it
+        allocator (str, optional): the register allocator. None for results that don't depend on it
+    """
+    globs = sorted(name for name in referenced_names(fun.body) if name in globalmap)
+    return hash_key(
+        "unit", compiler_version(), fingerprint(fun), ",".join(globs), str(optim), str(allocator)
+    )
+
+
+class CompilationCache:
+    """
+    Content addressed on disk cache for the results of the different compilation stages
+    (checked ASTs, lowered TACProcs and the final assembly of each function).
+
+    Every entry is a pickle file named after its key, so entries are shared by all processes using the same directory.
+    Writes are atomic (write to a temporary file and rename). Reading an entry refreshes its modification time,
+    and `evict` deletes the least recently used entries until the cache fits into `max_size` bytes.
+
+    Args:
+        path (str, optional): the directory of the cache
+        max_size (int, optional): the maximal size of the cache in bytes
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_DIR, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.path = path
+        self.max_size = max_size
+
+    def _entry(self, stage: str, key: str) -> str:
+        return os.path.join(self.path, stage, key)
+
+    def get(self, stage: str, key: str) -> Any | None:
+        """
+        Look up an entry
+
+        Args:
+            stage (str): one of STAGES
+            key (str): the key of the entry
+        Returns:
+            The stored object or None if there is no (readable) entry
+        """
+        entry = self._entry(stage, key)
+        try:
+            with open(entry, "rb") as fp:
+                value = pickle.load(fp)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # a corrupted entry (e.g. from an old python version) is just a miss
+            self._remove(entry)
+            return None
+        try:
+            os.utime(entry)  # mark as recently used
+        except OSError:
+            pass
+        return value
+
+    def put(self, stage: str, key: str, value: Any):
+        """
+        Store an entry, replacing any older one with the same key.
+
+        Args:
+            stage (str): one of STAGES
+            key (str): the key of the entry
+            value: any picklable object
+        """
+        directory = os.path.join(self.path, stage)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                pickle.dump(value, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._entry(stage, key))
+        except BaseException:
+            self._remove(tmp)
+            raise
+
+    def entries(self) -> List[Tuple[str, os.stat_result]]:
+        found = []
+        for stage in STAGES:
+            directory = os.path.join(self.path, stage)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.startswith(".tmp"):
+                    continue
+                entry = os.path.join(directory, name)
+                try:
+                    found.append((entry, os.stat(entry)))
+                except FileNotFoundError:
+                    pass  # evicted by another process
+        return found
+
+    def size(self) -> int:
+        return sum(stat.st_size for _, stat in self.entries())
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache is smaller than max_size.
+        """
+        entries = self.entries()
+        size = sum(stat.st_size for _, stat in entries)
+        if size <= self.max_size:
+            return
+        entries.sort(key=lambda entry: entry[1].st_mtime)
+        for entry, stat in entries:
+            if size <= self.max_size:
+                break
+            self._remove(entry)
+            size -= stat.st_size
+
+    def clear(self):
+        for entry, _ in self.entries():
+            self._remove(entry)
+
+    def _remove(self, entry: str):
+        try:
+            os.remove(entry)
+        except FileNotFoundError:
+            pass
@@ -1,6 +1,7 @@
-from typing import List, Any, Tuple, Set
+from typing import Dict, List, Any, Tuple, Set
 from dataclasses import field
 from .tac import *
+from .dominance import CFGInfo
 
 mutex_jmps = [
     ("jz", "jnz"),
@@ -23,6 +24,8 @@ class BasicBlock:
     # for liveness analysis
     live_in: Set[TACTemp] = field(default_factory=set)
     live_out: Set[TACTemp] = field(default_factory=set)
+    # position in the CFGIndex of the last CFG it was part of
+    id: int = -1
 
     def final(self) -> bool:
         return self.ops[-1].opcode == "ret"
@@ -92,15 +95,82 @@ def coalesce_block(block1: BasicBlock, block2: BasicBlock):
 
 
 def lookup_block(label: TACLabel, blocks: List[BasicBlock]):
+    # linear search, use CFGIndex.block when looking up many labels
     for block in blocks:
         if block.entry == label:
             return block
 
 
+class CFGIndex:
+    """
+    Array based view of a CFG: every block gets a dense integer id (its position in the index, also stored
+    in `block.id`), labels are mapped to ids by a dict and the edges are kept as adjacency lists of ids.
+    Looking up the block of a label and the successors or predecessors of a block take constant time.
+    Works for BasicBlock and SSABasicBlock alike.
+
+    Args:
+        blocks (list of BasicBlock or SSABasicBlock): the blocks of a procedure, the initial one first
+    """
+
+    def __init__(self, blocks) -> None:
+        self.blocks = []
+        self.ids: Dict[TACLabel, int] = {}
+        self.succs: List[List[int]] = []
+        self.preds: List[List[int]] = []
+        self._info = None  # CFGInfo of the current edges
+        for block in blocks:
+            self.add(block)
+        for i in range(len(self.blocks)):
+            self.link(i)
+
+    def add(self, block) -> int:
+        """
+        Add a block without edges, returns its id
+        """
+        self._info = None
+        block.id = len(self.blocks)
+        self.ids[block.entry] = block.id
+        self.blocks.append(block)
+        self.succs.append([])
+        self.preds.append([])
+        return block.id
+
+    def link(self, i: int):
+        """
+        Add the edges to the targets of the jumps of block i, every target once and in the order of the jumps
+        """
+        self._info = None
+        succs = self.succs[i]
+        for lbl in self.blocks[i].successor_labels():
+            j = self.ids[lbl]
+            if j not in succs:
+                succs.append(j)
+                self.preds[j].append(i)
+
+    def block(self, label: TACLabel):
+        return self.blocks[self.ids[label]]
+
+    def info(self) -> CFGInfo:
+        """
+        The dominance and loop information (a CFGInfo) of the CFG, computed when it is first needed and kept
+        until blocks or edges are added to the index. `CFGAnalyzer.cfg` builds a new index whenever the CFG changed.
+        """
+        if self._info is None:
+            self._info = CFGInfo(self.blocks, self.succs, self.preds)
+        return self._info
+
+    def successors(self, block) -> List:
+        return [self.blocks[j] for j in self.succs[block.id]]
+
+    def predecessors(self, block) -> List:
+        return [self.blocks[j] for j in self.preds[block.id]]
+
+
 class CFGAnalyzer:
     def __init__(self, proc: TACProc):
         self.proc = proc
         self.entry_label_counter = 0
+        self.index: CFGIndex | None = None  # of the blocks passed to the last call of cfg
 
     def fresh_entry_label(self):
         lbl = TACLabel(f".Ltmp.{self.proc.name}.{self.entry_label_counter}")
@@ -147,42 +217,48 @@ class CFGAnalyzer:
         return blocks
 
     def cfg(self, blocks: List[BasicBlock]) -> BasicBlock:
+        """
+        Compute the successors, predecessors and fallthroughs of the blocks from their jumps
+        and keep the CFGIndex of the blocks in `self.index`
+        """
         blocks[0].initial = True
+        self.index = CFGIndex(blocks)
         for block in blocks:
             block.successors = set()
             block.predecessors = set()
-        for block in blocks:        
-            successor_labels = block.successor_labels()
-            successors = set([lookup_block(lbl, blocks) for lbl in successor_labels])
+        for block in blocks:
+            successors = set(self.index.successors(block))
             block.successors = successors
             for succ in successors:
                 succ.predecessors.add(block)
             if block.ops[-1].opcode == "jmp":
-                block.fallthrough = lookup_block(block.ops[-1].args[0], blocks)
+                block.fallthrough = self.index.block(block.ops[-1].args[0])
         return blocks[0]
 
     def coalesce_blocks(self, blocks: List[BasicBlock]) -> List[BasicBlock]:
+        """
+        Merge every chain of blocks in which each block is the only successor of the previous one
+        and the previous one is its only predecessor. Expects `cfg(blocks)` to be up to date.
+        """
+        index = self.index
+
+        def absorbable(j: int) -> bool:
+            # the block is merged into its predecessor
+            if len(index.preds[j]) != 1 or index.blocks[j].initial:
+                return False
+            i = index.preds[j][0]
+            return i != j and len(index.succs[i]) == 1
+
         new_blocks = []
-        len_before = -1
-        while len_before != len(
-            blocks
-        ):  # coalesce while there are still things to coalesce
-            len_before = len(blocks)
-            new_blocks = []
-            coalesced = set()
-            for block in blocks:
-                if block.entry in coalesced:
-                    continue
-                if (
-                    len(block.successors) == 1
-                    and len(list(block.successors)[0].predecessors) == 1
-                ):
-                    coalesced.add(list(block.successors)[0].entry)
-                    new_blocks.append(block.coalesce(list(block.successors)[0]))
-                else:
-                    new_blocks.append(block)
-            blocks = new_blocks
-        return blocks
+        for block in blocks:
+            if absorbable(block.id):
+                continue  # part of the chain of its predecessor
+            i = block.id
+            while len(index.succs[i]) == 1 and absorbable(index.succs[i][0]):
+                i = index.succs[i][0]
+                block = block.coalesce(index.blocks[i])
+            new_blocks.append(block)
+        return new_blocks
 
     def unc_thread(self, blocks: List[BasicBlock]):
         skippable_blocks = []
@@ -191,6 +267,9 @@ class CFGAnalyzer:
                 skippable_blocks.append(block)
         for skippable in skippable_blocks:
             end_skip = self.trace_jumps(skippable)
+            if getattr(end_skip, "defs", None):
+                # the phi functions of an SSA block name the skipped blocks as their sources
+                continue
             for pred in skippable.predecessors:
                 pred.fallthrough = end_skip
                 pred.replace_jumps(skippable.entry, end_skip.entry)
@@ -198,7 +277,7 @@ class CFGAnalyzer:
     def cond_thread(self, blocks: List[BasicBlock]):
         for block in blocks:
             for op in block.get_cond_jumps():
-                target = lookup_block(op.args[1], blocks)
+                target = self.index.block(op.args[1])
                 eliminated = self.eliminate_cond_jumps(target, (op.args[0], op.opcode))
                 if eliminated is not None:
                     # we insert a new block with the changed instructions
@@ -206,6 +285,7 @@ class CFGAnalyzer:
                     # if block was the only predecessor the old target will be removed by UCE
                     op.args[1] = eliminated.entry
                     blocks.append(eliminated)
+                    self.index.add(eliminated)
 
     def eliminate_cond_jumps(self, block: BasicBlock, condition: Tuple[TACTemp, str]):
         new_ops = []
@@ -1,31 +1,50 @@
+import os
 import sys
-from typing import Dict
+from typing import Dict, List, TYPE_CHECKING
 from .asmgen import AsmGen, make_data_section, make_text_section, global_symbs
-from .parser import parser
 from .tmm import TMM
 from .tac import TACGlobal, TACProc, pretty_print, print_detailed
-from .liveness import LivenessAnalyzer, SSALivenessAnalyzer
-from .cfg import CFGAnalyzer, Serializer
 from .bxast import Function, StatementDecl
 from .checker import SyntaxChecker, TypeChecker
-from .ssa import SSACrudeGenerator, SSADeconstructor, ssa_print_detailed, SSAOptimizer, ssa_print
-from .asmgen2 import AllocAsmGen
-from .alloc import SpillingAllocator, AllocRecord
-from .greedy_coloring import GraphAndColorAllocator, TACGraphAndColorAllocator
-from .dataflow import SCCPOptimizer
-
-def compile(src: str, optim=0):
-    decls = parser.parse(src)
-    s_checker = SyntaxChecker()
-    errs = s_checker.check_program(decls)
-    if errs != []:
-        s_checker.pp_errs(errs)
-        sys.exit()
-    t_checker = TypeChecker()
-    type_check = t_checker.check(decls)
-    if len(type_check) > 0:
-        print("Type checking failed")
-        sys.exit()
+from . import timing
+from .timing import span
+
+# The optimization passes are only imported by compile_tac when the optimization level needs them,
+# and the cache and process pool only when they are used. This keeps the startup of -O0 compilations short.
+if TYPE_CHECKING:
+    from .cache import CompilationCache
+
+
+FRONTENDS = ["ply", "rd"]
+# "graph" colors an interference graph, "linear" is the linear scan, "auto" uses the linear scan for huge functions
+ALLOCATORS = ["graph", "linear", "auto"]
+# "pruned" builds minimal SSA form with dominance frontiers, "crude" puts a phi function for every live-in
+# temporary at the entry of every block and leaves it to the rename simplification to remove them
+SSA_CONSTRUCTIONS = ["pruned", "crude"]
+
+
+def compile(
+    src: str,
+    optim=0,
+    jobs=1,
+    cache: "CompilationCache | None" = None,
+    frontend="ply",
+    allocator: str | Dict[str, str] = "auto",
+):
+    """
+    Compiles a BX program to x86 assembly
+
+    Args:
+        src (str): the source code of the program
+        optim (int, optional): the optimization level, defaults to 0
+        jobs (int, optional): number of worker processes used to compile the functions.
+            1 compiles everything in this process, 0 or None uses one worker per CPU.
+        cache (CompilationCache, optional): cache for the ASTs, TAC and assembly of unchanged functions
+        frontend (str, optional): the parser to use, one of FRONTENDS
+        allocator (str or dict str -> str, optional): the register allocator used from -O3 on, one of ALLOCATORS,
+            or a mapping from function names to ALLOCATORS (functions that are not in it use "auto")
+    """
+    decls = front_end(src, cache=cache, frontend=frontend)
     globvars = [decl for decl in decls if isinstance(decl, StatementDecl)]
     funs = [fun for fun in decls if isinstance(fun, Function)]
     globalmap = {var.name: TACGlobal(var.name) for var in globvars}
@@ -33,81 +52,320 @@ def compile(src: str, optim=0):
     symbs = global_symbs(decls)
     data_section = make_data_section(globvars)
     text_section = make_text_section(
-        [compile_unit(fun, globalmap, optim=optim) for fun in funs]
+        compile_units(funs, globalmap, optim=optim, jobs=jobs, cache=cache, allocator=allocator)
     )
+    if cache is not None:
+        cache.evict()
     return symbs + data_section + text_section
 
 
-def compile_unit(fun: Function, globalmap: Dict[str, TACGlobal], optim=0) -> str:
+def parse(src: str, frontend="ply") -> List[Function | StatementDecl] | None:
+    """
+    Parses a BX program, syntax errors are printed
+
+    Args:
+        src (str): the source code of the program
+        frontend (str, optional): "ply" for the PLY generated parser (parser.py),
+            "rd" for the hand-written recursive descent parser (rdparser.py)
+    Returns:
+        the declarations of the program or None if it has syntax errors
+    """
+    # the first import of a front end loads its tables, the span keeps that out of the parse time
+    if frontend == "ply":
+        with span("import"):
+            from .parser import parser
+            from .scanner import lexer
+
+        # the lexer is shared by all parses of the process (e.g. of a server worker or in watch mode),
+        # it counts the lines on from the end of the previous program
+        lexer.lineno = 1
+        return parser.parse(src, lexer=lexer)
+    if frontend == "rd":
+        with span("import"):
+            from .rdparser import parse as rd_parse
+
+        return rd_parse(src)
+    raise ValueError(f"unknown frontend {frontend}, expected one of {', '.join(FRONTENDS)}")
+
+
+def front_end(
+    src: str, cache: "CompilationCache | None" = None, frontend="ply"
+) -> List[Function | StatementDecl]:
+    """
+    Parses and checks a BX program, exits if the program is not valid
+
+    Args:
+        src (str): the source code of the program
+        cache (CompilationCache, optional): if given, checked ASTs are looked up and stored here
+        frontend (str, optional): the parser to use, see `parse`
+    Returns:
+        the (type annotated) declarations of the program
+    """
+    if cache is not None:
+        from .cache import source_key
+
+        key = source_key(src)
+        decls = cache.get("ast", key)
+        if decls is not None:
+            return decls
+    with span("parse", frontend=frontend):
+        decls = parse(src, frontend)
+    if decls is None:
+        sys.exit()  # the syntax error is printed already
+    with span("check"):
+        s_checker = SyntaxChecker()
+        errs = s_checker.check_program(decls)
+        if errs != []:
+            s_checker.pp_errs(errs)
+            sys.exit()
+        t_checker = TypeChecker()
+        type_check = t_checker.check(decls)
+        if len(type_check) > 0:
+            print("Type checking failed")
+            sys.exit()
+    if cache is not None:
+        cache.put("ast", key, decls)
+    return decls
+
+
+def compile_units(
+    funs: List[Function],
+    globalmap: Dict[str, TACGlobal],
+    optim=0,
+    jobs=1,
+    cache=None,
+    allocator="auto",
+    mp_context=None,
+) -> List[str]:
+    """
+    Compiles all functions, possibly in parallel.
+    The functions only share the (read-only) globalmap so each one can be compiled in its own process.
+    The assembly is returned in the same order as the functions, such that the output is
+    identical to a serial compilation.
+
+    Args:
+        funs (list of Function): the ASTs of the functions
+        globalmap (dict str -> TACGlobal): a mapping of global variables
+        optim (int, optional): the optimization level
+        jobs (int, optional): number of worker processes, 0 or None for one per CPU
+        cache (CompilationCache, optional): cache for the results of unchanged functions
+        allocator (str or dict str -> str, optional): the register allocator, see `compile`
+        mp_context (multiprocessing context, optional): how the workers are started,
+            defaults to fork where it is available
+    """
+    if not jobs:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(funs))
+    if jobs <= 1:
+        return [compile_unit(fun, globalmap, optim=optim, cache=cache, allocator=allocator) for fun in funs]
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from itertools import repeat
+
+    # the compilation of a function doesn't depend on the process (not even on its hash seed, see `stable_hash`),
+    # so any start method gives the same assembly as a serial build, fork just starts the workers faster
+    context = mp_context
+    if context is None and "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    timer = timing.active()
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+        # map keeps the order of the inputs so we can just concatenate the results
+        results = list(
+            pool.map(
+                _compile_unit_timed if timer is not None else compile_unit,
+                funs,
+                repeat(globalmap),
+                repeat(optim),
+                repeat(cache),
+                repeat(allocator),
+                *([repeat(timer.memory)] if timer is not None else []),
+                chunksize=max(1, len(funs) // (4 * jobs)),
+            )
+        )
+    if timer is None:
+        return results
+    for _, records in results:
+        timer.records += records
+    return [asm for asm, _ in results]
+
+
+def _compile_unit_timed(
+    fun: Function, globalmap: Dict[str, TACGlobal], optim=0, cache=None, allocator="auto", memory=False
+):
+    # runs in a worker process of a timed compilation, the timings are sent back with the assembly
+    timer = timing.PassTimer(memory=memory)
+    timer.start()
+    try:
+        asm = compile_unit(fun, globalmap, optim=optim, cache=cache, allocator=allocator)
+    finally:
+        timer.stop()
+    return asm, timer.records
+
+
+def compile_unit(fun: Function, globalmap: Dict[str, TACGlobal], optim=0, cache=None, allocator="auto") -> str:
     """
     Compiles a single function
 
     Args:
         fun (Fuction): the AST of the function
         globalmap (dict str -> TACGlobal): a mapping of global variables
-        register_alloc (bool, optional): whether to do register allocation, defaults to True
+        optim (int, optional): the optimization level
+        cache (CompilationCache, optional): if given, the lowered TAC and the assembly are looked up and stored here
+        allocator (str or dict str -> str, optional): the register allocator, see `compile`
+    """
+    allocator = function_allocator(allocator, fun.name)
+    with span("function", function=fun.name):
+        if cache is None:
+            with span("lower"):
+                tacproc = TMM(fun, globalmap).lower()
+            return compile_tac(tacproc, optim=optim, allocator=allocator)
+        from .cache import unit_key
+
+        with span("cache lookup"):
+            asm_key = unit_key(fun, globalmap, optim, allocator)
+            asm = cache.get("asm", asm_key)
+        if asm is not None:
+            return asm
+        with span("cache lookup"):
+            tac_key = unit_key(fun, globalmap)
+            tacproc = cache.get("tac", tac_key)
+        if tacproc is None:
+            with span("lower"):
+                tacproc = TMM(fun, globalmap).lower()
+            cache.put("tac", tac_key, tacproc)
+        asm = compile_tac(tacproc, optim=optim, allocator=allocator)
+        cache.put("asm", asm_key, asm)
+        return asm
+
+
+def function_allocator(allocator: str | Dict[str, str], name: str) -> str:
+    """
+    The register allocator of the function called name, see `compile`
     """
-    lowerer = TMM(fun, globalmap)
-    tacproc = lowerer.lower()
+    if isinstance(allocator, dict):
+        return allocator.get(name, "auto")
+    return allocator
+
+
+def compile_tac(tacproc: TACProc, optim=0, allocator="auto", ssa_construction="pruned") -> str:
+    """
+    Compiles a lowered function
+
+    Args:
+        tacproc (TACProc): the TAC of the function, it is modified in place
+        optim (int, optional): the optimization level
+        allocator (str, optional): the register allocator from -O3 on, one of ALLOCATORS
+        ssa_construction (str, optional): how the SSA form is built from -O2 on, one of SSA_CONSTRUCTIONS
+    """
+    if allocator not in ALLOCATORS:
+        raise ValueError(f"unknown allocator {allocator}, expected one of {', '.join(ALLOCATORS)}")
+    if ssa_construction not in SSA_CONSTRUCTIONS:
+        raise ValueError(
+            f"unknown SSA construction {ssa_construction}, expected one of {', '.join(SSA_CONSTRUCTIONS)}"
+        )
 
     if optim == 0:
-        asm_gen = AsmGen(tacproc)
-        asm = asm_gen.compile()
+        with span("asmgen"):
+            asm_gen = AsmGen(tacproc)
+            asm = asm_gen.compile()
         return asm
 
-    cfg_analyzer = CFGAnalyzer(tacproc)
-    blocks = cfg_analyzer.optimize(
-        coalesce=optim > 0, unc_thread=optim > 0, cond_thread=optim > 1
-    )
-    liveness_analyzer = LivenessAnalyzer(blocks)
-    liveness_analyzer.liveness()
+    with span("import"):
+        from .cfg import CFGAnalyzer, Serializer
+        from .liveness import LivenessAnalyzer
+
+    with span("cfg optimization"):
+        cfg_analyzer = CFGAnalyzer(tacproc)
+        blocks = cfg_analyzer.optimize(
+            coalesce=optim > 0, unc_thread=optim > 0, cond_thread=optim > 1
+        )
+    with span("liveness"):
+        liveness_analyzer = LivenessAnalyzer(blocks)
+        liveness_analyzer.liveness()
 
     if optim > 1:
-        ssa_gen = SSACrudeGenerator(blocks, tacproc)
-        ssaproc = ssa_gen.to_ssa()
-        cfg_analyzer.cfg(ssaproc.blocks)
+        with span("import"):
+            from .ssa import SSACrudeGenerator, SSADeconstructor, SSAOptimizer, SSAPrunedGenerator
+
+        with span("ssa construction"):
+            if ssa_construction == "pruned":
+                ssa_gen = SSAPrunedGenerator(blocks, tacproc)
+            else:
+                ssa_gen = SSACrudeGenerator(blocks, tacproc)
+            ssaproc = ssa_gen.to_ssa()
+            cfg_analyzer.cfg(ssaproc.blocks)
+        if optim > 3:
+            with span("import"):
+                from .gvn import GVNOptimizer
+
+            with span("gvn") as gvn_span:
+                gvn = GVNOptimizer(ssaproc)
+                ssaproc = gvn.optimize()
+                gvn_span.note(eliminated=gvn.eliminated)
         if optim < 5:
             # when SCCP is active we don't need this anymore
-            ssa_optim = SSAOptimizer(ssaproc)
-            ssaproc = ssa_optim.optimize(
-                copy_propagate=optim > 3, rename_and_dead_choice=optim > 1
-            )
+            with span("ssa optimization"):
+                ssa_optim = SSAOptimizer(ssaproc)
+                ssaproc = ssa_optim.optimize(
+                    copy_propagate=optim > 3, rename_and_dead_choice=optim > 1
+                )
+        else:
+            # only the copy propagation, it removes the copies left by the value numbering
+            with span("ssa optimization"):
+                ssaproc = SSAOptimizer(ssaproc).optimize(copy_propagate=True, rename_and_dead_choice=False)
+        if optim > 3:
+            with span("import"):
+                from .dce import DCEOptimizer
+
+            with span("dce") as dce_span:
+                dce = DCEOptimizer(ssaproc)
+                ssaproc = dce.optimize()
+                dce_span.note(eliminated=dce.eliminated)
         # print(fun.name)
         # for block in ssaproc.blocks:
         #    ssa_print(block)
         #print(len(ssaproc.blocks))
         if optim > 4:
-            dataflow_optim = SCCPOptimizer(ssaproc)
-            ssaproc = dataflow_optim.optimize()
+            with span("import"):
+                from .dataflow import SCCPOptimizer
+
+            with span("sccp"):
+                dataflow_optim = SCCPOptimizer(ssaproc)
+                ssaproc = dataflow_optim.optimize()
+            with span("dce") as dce_span:
+                dce = DCEOptimizer(ssaproc)
+                ssaproc = dce.optimize()
+                dce_span.note(eliminated=dce.eliminated)
 
         #print(len(ssaproc.blocks))
 
-        ssa_liveness_analyzer = SSALivenessAnalyzer(ssaproc)
-        ssa_liveness_analyzer.liveness()
-        
         # This is code for using Allocation in SSA form
         # graph_alloc = GraphAndColorAllocator(ssa_blocks, tacproc).allocate()
         # print(graph_alloc)#
         if optim >4:
             # run the coalescing once again
             # Luckily the TAC CFG Analyzer works on SSA as well
+            with span("cfg cleanup"):
+                cfg_analyzer.cfg(ssaproc.blocks)
+                cfg_analyzer.unc_thread(ssaproc.blocks)
+                cfg_analyzer.cfg(ssaproc.blocks)
+                ssaproc.blocks = cfg_analyzer.coalesce_blocks(ssaproc.blocks)
+                ssaproc.invalidate_def_use()
+        with span("ssa deconstruction"):
             cfg_analyzer.cfg(ssaproc.blocks)
-            cfg_analyzer.unc_thread(ssaproc.blocks)
-            cfg_analyzer.cfg(ssaproc.blocks)
-            ssaproc.blocks = cfg_analyzer.coalesce_blocks(ssaproc.blocks)
-        cfg_analyzer.cfg(ssaproc.blocks)
 
-        # print(fun.name)
-        # for block in ssaproc.blocks:
-        #    ssa_print(block)
-        serializer = SSADeconstructor(ssaproc)
+            # print(fun.name)
+            # for block in ssaproc.blocks:
+            #    ssa_print(block)
+            serializer = SSADeconstructor(ssaproc)
 
-        tacproc.body = serializer.to_tac()
+            tacproc.replace_body(serializer.to_tac())
 
             
     else:
-        serializer = Serializer(blocks)
-        tacproc.body = serializer.to_tac()
+        with span("serialization"):
+            serializer = Serializer(blocks)
+            tacproc.replace_body(serializer.to_tac())
     
 
     if optim > 2 and optim != 5:
@@ -119,12 +377,23 @@ def compile_unit(fun: Function, globalmap: Dict[str, TACGlobal], optim=0) -> str
         #    serializer.rename_alloc(graph_alloc.mapping)
         # )
         # print(alloc)
+        with span("import"):
+            from .greedy_coloring import TACGraphAndColorAllocator
+            from .linear_scan import LinearScanAllocator, LINEAR_SCAN_THRESHOLD
+            from .asmgen2 import AllocAsmGen
 
-        alloc = TACGraphAndColorAllocator(tacproc).allocate(
-            coalesce_registers=optim > 3
-        )
+        if allocator == "auto":
+            allocator = "linear" if len(tacproc.body.ops) > LINEAR_SCAN_THRESHOLD else "graph"
+        with span("register allocation", allocator=allocator):
+            if allocator == "linear":
+                alloc = LinearScanAllocator(tacproc).allocate()
+            else:
+                alloc = TACGraphAndColorAllocator(tacproc).allocate(
+                    coalesce_registers=optim > 3
+                )
         asm_gen = AllocAsmGen(tacproc, alloc)
     else:
         asm_gen = AsmGen(tacproc)
-    asm = asm_gen.compile()
+    with span("asmgen"):
+        asm = asm_gen.compile()
     return asm
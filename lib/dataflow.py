@@ -1,7 +1,7 @@
 from .ssa import *
 from .tac import COND_JMP_OPS, JMP_OPS
-from math import log2
-STATIC_OPS = [    
+from .timing import span
+STATIC_OPS = [
     "mod",
     "div",
     "add",
@@ -21,221 +21,305 @@ DYN_OPS = [
     "call"
 ]
 
+
+class LatticeValue:
+    """
+    The two values of the constant propagation lattice that are not constants
+    """
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+UNDEF = LatticeValue("undef")  # top: no value has reached the temporary (yet)
+DYN = LatticeValue("dyn")  # bottom: the value is only known at runtime
+
+
+def meet(a, b):
+    if a is UNDEF:
+        return b
+    if b is UNDEF or a == b:
+        return a
+    return DYN
+
+
+def wrap(value: int) -> int:
+    # the arithmetic of BX is 64 bit two's complement
+    return (value + 2**63) % 2**64 - 2**63
+
+
+def truncating_div(a: int, b: int) -> int:
+    # idiv rounds towards zero, Python's // towards minus infinity
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+def fold(opcode: str, args: List[int]) -> int | LatticeValue:
+    """
+    The value of an instruction with constant operands as the generated code computes it
+    """
+    match opcode, args:
+        case ("copy" | "const"), [a]:
+            return a
+        case "neg", [a]:
+            return wrap(-a)
+        case "not", [a]:
+            return ~a
+        case "add", [a, b]:
+            return wrap(a + b)
+        case "sub", [a, b]:
+            return wrap(a - b)
+        case "mul", [a, b]:
+            return wrap(a * b)
+        case ("div" | "mod"), [a, b]:
+            if b == 0:
+                return DYN  # the division traps at runtime
+            q = wrap(truncating_div(a, b))
+            return q if opcode == "div" else wrap(a - b * q)
+        case "and", [a, b]:
+            return a & b
+        case "or", [a, b]:
+            return a | b
+        case "xor", [a, b]:
+            return a ^ b
+        case "lshift", [a, b]:
+            return wrap(a << (b & 63))
+        case "rshift", [a, b]:
+            return a >> (b & 63)
+    return DYN
+
+
+def power_of_two(value) -> int | None:
+    # the exponent if value is a positive power of two
+    if isinstance(value, int) and value > 0 and value & (value - 1) == 0:
+        return value.bit_length() - 1
+    return None
+
+
 class SCCPOptimizer:
     """
-    Use Sparse Conditional Constant Propagation on SSA form to utilize statically available information.
+    Sparse Conditional Constant Propagation (Wegman and Zadeck) on SSA form to utilize statically available
+    information.
+
+    Every temporary has a value of the lattice UNDEF > constants > DYN, which only goes down. Two worklists
+    drive the analysis: the CFG edges that became executable and the SSA edges (the uses from the def-use index)
+    of the temporaries whose value was lowered. A phi function meets the values of its executable incoming edges
+    only, an instruction is evaluated when its block is reached and whenever one of its operands is lowered,
+    and the jumps at the end of a block decide which of its outgoing edges are executable.
+    So every instruction is visited a few times at most instead of in every round over the whole procedure.
+
+    Afterwards the blocks that are never reached and the phi sources of edges that are never taken are removed,
+    the jumps with a known condition are resolved, the constants are propagated into their uses and the
+    instructions that compute them are deleted.
     """
+
     def __init__(self, ssaproc: SSAProc) -> None:
         self.proc = ssaproc
-        self.eval = {block.entry: block.initial for block in ssaproc.blocks}
-        self.vals = {var: "undef" for var in ssaproc.get_tmps()} | {param: "dyn" for param in ssaproc.params}
-        
+        self.vals: Dict[SSATemp, int | LatticeValue] = {param: DYN for param in ssaproc.params}
+        self.executable_edges: Set[Tuple[SSALabel | None, SSALabel]] = set()
+        self.executable: Set[SSALabel] = set()
+
     def optimize(self):
         """
         Apply SCCP to the given SSAProc.
         """
-        # iterate the process as long as we are making progress
-        old_eval = self.eval.copy()
-        old_vals = self.vals.copy()
-        self.sccp_iterate()
-        while old_eval != self.eval or old_vals != self.vals:
-            old_eval = self.eval.copy()
-            old_vals = self.vals.copy()
-            self.sccp_iterate()
+        with span("sccp fixpoint"):
+            self.propagate()
 
         # update the procedure with the newly gained information
-        self.delete_blocks()
-        self.replace_vals()
-        self.delete_insts()
+        with span("sccp rewrite"):
+            self.delete_blocks()
+            self.rewrite_jumps()
+            self.proc.invalidate_def_use()
+            self.replace_vals()
+            self.delete_insts()
+            self.simplify()
+            self.proc.invalidate_def_use()
         return self.proc
 
+    def propagate(self):
+        self.proc.invalidate_def_use()
+        index = self.proc.def_use
+        blocks = {block.entry: block for block in self.proc.blocks}
+        # the temporaries that are used but never defined hold whatever is in them at the entry of the procedure
+        for tmp in index.uses:
+            if index.definition(tmp) is None:
+                self.vals.setdefault(tmp, DYN)
+
+        initial = [block for block in self.proc.blocks if block.initial][0]
+        cfg_work: List[Tuple[SSALabel | None, SSALabel]] = [(None, initial.entry)]
+        ssa_work: List[Tuple[SSABasicBlock, Phi | SSAOp]] = []
+        while cfg_work or ssa_work:
+            while cfg_work:
+                edge = cfg_work.pop()
+                if edge in self.executable_edges:
+                    continue
+                self.executable_edges.add(edge)
+                block = blocks[edge[1]]
+                for phi in block.defs:
+                    self.visit_phi(block, phi, ssa_work)
+                if block.entry in self.executable:
+                    continue  # the instructions only depend on the values, not on the edge
+                self.executable.add(block.entry)
+                for op in block.ops:
+                    if not op.is_jmp():
+                        self.visit_op(block, op, ssa_work)
+                self.visit_jumps(block, cfg_work)
+            while ssa_work and not cfg_work:
+                block, user = ssa_work.pop()
+                if block.entry not in self.executable:
+                    continue
+                if isinstance(user, Phi):
+                    self.visit_phi(block, user, ssa_work)
+                elif user.is_jmp():
+                    self.visit_jumps(block, cfg_work)
+                else:
+                    self.visit_op(block, user, ssa_work)
+            if not cfg_work and not ssa_work:
+                # a condition that is still undefined (it can only be computed from undefined values)
+                # is decided at runtime, this keeps the jumps and their targets consistent
+                for entry in list(self.executable):
+                    block = blocks[entry]
+                    for op in block.ops:
+                        if op.opcode in COND_JMP_OPS and self.get_val(op.args[0]) is UNDEF:
+                            self.lower(op.args[0], DYN, ssa_work)
+
+    def lower(self, tmp: SSATemp, value, ssa_work):
+        # values only go down the lattice, the uses of tmp are revisited when it changes
+        old = self.vals.get(tmp, UNDEF)
+        new = meet(old, value)
+        if new is old or (type(new) is type(old) and new == old):
+            return
+        self.vals[tmp] = new
+        ssa_work.extend(self.proc.def_use.uses_of(tmp))
+
+    def visit_phi(self, block: SSABasicBlock, phi: Phi, ssa_work):
+        value = UNDEF
+        for lbl, src in phi.sources.items():
+            if (lbl, block.entry) in self.executable_edges:
+                value = meet(value, self.get_val(src))
+        if value is not UNDEF:
+            self.lower(phi.defined, value, ssa_work)
+
+    def visit_op(self, block: SSABasicBlock, op: SSAOp, ssa_work):
+        if isinstance(op.result, SSATemp):
+            value = self.evaluate(op)
+            if value is not UNDEF:
+                self.lower(op.result, value, ssa_work)
+
+    def evaluate(self, op: SSAOp):
+        if op.opcode not in STATIC_OPS:
+            return DYN
+        args = [self.get_val(arg) for arg in op.args]
+        # results that don't depend on the dynamic operand
+        if op.opcode == "sub" and op.args[0] is op.args[1] and isinstance(op.args[0], SSATemp):
+            return 0
+        if op.opcode in ["mul", "and"] and 0 in [arg for arg in args if isinstance(arg, int)]:
+            return 0
+        if any(arg is DYN for arg in args):
+            return DYN
+        if any(arg is UNDEF for arg in args):
+            return UNDEF
+        return fold(op.opcode, args)
+
+    def evaluate_jumps(self, block: SSABasicBlock):
+        """
+        The jumps of the block with the known conditions resolved and the labels they can jump to.
+        Stops at a condition that is still UNDEF.
+        """
+        new_jumps = []
+        targets = []
+        for jmp in block.ops:
+            if not jmp.is_jmp():
+                continue
+            if jmp.opcode == "ret":
+                new_jumps.append(jmp)
+                break
+            if jmp.opcode == "jmp":
+                new_jumps.append(jmp)
+                targets.append(jmp.args[0])
+                break
+            cond = self.get_val(jmp.args[0])
+            if cond is UNDEF:
+                break
+            if cond is DYN:
+                new_jumps.append(jmp)
+                targets.append(jmp.args[1])
+                continue
+            taken = {"jz": cond == 0, "jnz": cond != 0, "jl": cond < 0,
+                     "jle": cond <= 0, "jnl": cond >= 0, "jnle": cond > 0}[jmp.opcode]
+            if taken:
+                new_jumps.append(SSAOp("jmp", [jmp.args[1]], None))
+                targets.append(jmp.args[1])
+                break
+        return new_jumps, targets
+
+    def visit_jumps(self, block: SSABasicBlock, cfg_work):
+        for lbl in self.evaluate_jumps(block)[1]:
+            if (block.entry, lbl) not in self.executable_edges:
+                cfg_work.append((block.entry, lbl))
+
+    def delete_blocks(self):
+        # delete all blocks that are never reached, and the edges that are never taken
+        edges = self.executable_edges
+        self.proc.blocks = [block for block in self.proc.blocks if block.entry in self.executable]
+        for block in self.proc.blocks:
+            block.predecessors = [pred for pred in block.predecessors if (pred.entry, block.entry) in edges]
+            block.successors = [succ for succ in block.successors if (block.entry, succ.entry) in edges]
+            for phi in block.defs:
+                phi.sources = {lbl: src for lbl, src in phi.sources.items() if (lbl, block.entry) in edges}
+
+    def rewrite_jumps(self):
+        # the jumps whose condition is known are removed or become unconditional
+        for block in self.proc.blocks:
+            new_jumps, _ = self.evaluate_jumps(block)
+            block.ops = [op for op in block.ops if not op.is_jmp()] + new_jumps
+            if new_jumps and new_jumps[-1].opcode == "jmp":
+                block.fallthrough = next(
+                    (succ for succ in block.successors if succ.entry == new_jumps[-1].args[0]), block.fallthrough
+                )
+
     def replace_vals(self):
         # replace the statically kown values in the end
+        renames = RenameTable()
         for tmp, val in self.vals.items():
-            if val not in ["dyn", "undef"]:
-                self.proc.rename_var(tmp, val, replace_results=False)
-        
+            if isinstance(val, int):
+                renames.rename(tmp, val)
+        self.proc.apply_renames(renames, replace_results=False)
+
     def delete_insts(self):
         # delete all instructions that set statically known values (they aren't necessary anymore)
-        self.proc.delete_setting_inst(set([key for key, val in self.vals.items() if val not in ["dyn", "undef"]]))
+        self.proc.delete_setting_inst({tmp for tmp, val in self.vals.items() if isinstance(val, int)})
 
-    def delete_blocks(self):
-        # delete all blocks that are not evaluated
-        self.proc.blocks = [block for block in self.proc.blocks if self.eval[block.entry]]
+    def simplify(self):
+        # identities and strength reduction on the instructions that are left
         for block in self.proc.blocks:
-            block.predecessors = [block for block in block.predecessors if self.eval[block.entry]]
-            block.successors = [block for block in block.successors if self.eval[block.entry]]
+            for inst in block.ops:
+                match inst.opcode, inst.args:
+                    case ("add" | "sub" | "or" | "xor" | "lshift" | "rshift"), [x, 0]:
+                        inst.opcode, inst.args = "copy", [x]
+                    case ("add" | "or" | "xor"), [0, x]:
+                        inst.opcode, inst.args = "copy", [x]
+                    case ("mul" | "div"), [x, 1]:
+                        inst.opcode, inst.args = "copy", [x]
+                    case "mul", [1, x]:
+                        inst.opcode, inst.args = "copy", [x]
+                    # a division by a power of two is not a shift for negative numbers, only the multiplication is
+                    case "mul", [x, c] if power_of_two(c) is not None:
+                        inst.opcode, inst.args = "lshift", [x, power_of_two(c)]
+                    case "mul", [c, x] if power_of_two(c) is not None:
+                        inst.opcode, inst.args = "lshift", [x, power_of_two(c)]
+                if inst.opcode == "copy" and isinstance(inst.args[0], int):
+                    inst.opcode = "const"
 
-    def sccp_iterate(self):
-        # apply SCCP to each evaluated block
-        for block in self.proc.blocks:
-            if self.eval[block.entry]:
-                self.sccp_block(block)
-    
-    def sccp_block(self, block: SSABasicBlock):
-        jmp_ops = []
-        new_phis = []
-        for phi in block.defs:
-            if self.sccp_phi(phi):
-                new_phis.append(phi)
-        new_insts = []
-        for inst in block.ops:
-            if inst.opcode not in JMP_OPS:
-                if self.sccp_inst(inst):
-                    new_insts.append(inst)
-            else:
-                jmp_ops.append(inst)
-        new_jumps = self.sccp_jumps(jmp_ops)      
-        block.defs = new_phis
-        block.ops = new_insts + new_jumps
-        self.update_pred_succ(jmp_ops, block)
-
-    def update_pred_succ(self, jmp_ops: List[SSAOp], block: SSABasicBlock):
-        # after we do the jump optimization we may have to update the predecessors/successors.
-        jmp_labels = [op.args[1] if op.opcode in COND_JMP_OPS else op.args[0] for op in jmp_ops if op.opcode != "ret"]
-        # search for fallthrough 
-        if jmp_ops[-1].opcode == "jmp":
-            fallthrough_label = jmp_ops[-1].args[0]
-        else:
-            fallthrough_label = None
-
-        new_succ = []
-        for succ in block.successors:
-            if succ.entry not in jmp_labels:
-                succ.predecessors = [pred for pred in succ.predecessors if pred.entry != block.entry]
-            else:
-                new_succ.append(succ)
-            if fallthrough_label is not None and fallthrough_label == succ.entry:
-                block.fallthrough = succ
-        block.successors = new_succ
-        
-    def sccp_inst(self, inst: SSAOp):
-        if self.static(inst):
-            # interpret the op statically
-            match inst.opcode:
-                case "add": self.vals[inst.result] = self.get_val(inst.args[0]) + self.get_val(inst.args[1])
-                case "sub": self.vals[inst.result] = self.get_val(inst.args[0]) - self.get_val(inst.args[1])
-                case "mul": self.vals[inst.result] = self.get_val(inst.args[0]) * self.get_val(inst.args[1])
-                case "div": self.vals[inst.result] = self.get_val(inst.args[0]) // self.get_val(inst.args[1])
-                case "mod": self.vals[inst.result] = self.get_val(inst.args[0]) % self.get_val(inst.args[1])
-                case "and": self.vals[inst.result] = self.get_val(inst.args[0]) & self.get_val(inst.args[1])
-                case "xor": self.vals[inst.result] = self.get_val(inst.args[0]) ^ self.get_val(inst.args[1])
-                case "or": self.vals[inst.result] = self.get_val(inst.args[0]) | self.get_val(inst.args[1])
-                case "rshift": self.vals[inst.result] = self.get_val(inst.args[0]) >> self.get_val(inst.args[1])
-                case "lshift": self.vals[inst.result] = self.get_val(inst.args[0]) << self.get_val(inst.args[1])
-                case "not": self.vals[inst.result] = ~self.get_val(inst.args[0]) 
-                case "neg": self.vals[inst.result] = -self.get_val(inst.args[0])
-                case "copy": self.vals[inst.result] = self.get_val(inst.args[0])
-                case "const": self.vals[inst.result] = self.get_val(inst.args[0])
-            return False # indicates that this instruction can be removed
-        # a bunch of special rules
-        # x-x = 0
-        elif inst.opcode == "sub" and inst.args[0] == inst.args[1]:
-            self.vals[inst.result] = 0
-        # addition/multiplication identities
-        elif inst.opcode in  ["sub", "add"] and self.get_val(inst.args[1]) == 0:
-            inst.opcode = "copy"
-            inst.args = [inst.args[0]]
-        elif inst.opcode == "add" and self.get_val(inst.args[0]) == 0:
-            inst.opcode = "copy"
-            inst.args = [inst.args[1]]
-        elif inst.opcode in ["mul", "div"] and self.get_val(inst.args[1]) == 1:
-            inst.opcode = "copy"
-            inst.args = [inst.args[0]]
-        elif inst.opcode == "mul" and self.get_val(inst.args[0]) == 1:
-            inst.opcode = "copy"
-            inst.args = [inst.args[1]]
-        # convert mul/div by power of two into a shift
-        elif inst.opcode == "div" and log2(self.get_val(inst.args[1])).is_integer():
-            inst.opcode = "rshift"
-            inst.args = [inst.args[0], int(log2(self.get_val(inst.args[1])))]
-        elif inst.opcode == "mul" and isinstance(self.get_val(inst.args[1]), int) and log2(self.get_val(inst.args[1])).is_integer():
-            inst.opcode = "lshift"
-            inst.args = [inst.arg[0], int(log2(self.get_val(inst.args[1])))]
-        elif inst.opcode == "mul" and log2(self.get_val(inst.args[0])).is_integer():
-            inst.opcode = "lshift"
-            inst.args = [inst.arg[0], int(log2(self.get_val(inst.args[0])))]
-        # also propagate dynamic information
-        elif self.dynamic(inst):
-            self.vals[inst.result] = "dyn"
-        return True
-    
-    def static(self, inst: SSAOp):
-        return inst.opcode in STATIC_OPS and all([self.get_val(v) not in ["undef", "dyn"] for v in inst.args]) and isinstance(inst.result, SSATemp)
-    
-    def dynamic(self, inst: SSAOp):
-        return inst.opcode in DYN_OPS or any([self.get_val(var) == "dyn" for var in inst.args])
-    
-    def sccp_jumps(self, jmp_ops: List[SSAOp]):
-        # go through all of the jumps until one is definite, stopping after a definite jump
-        new_jmp_ops = []
-        for jmp in jmp_ops:
-            match jmp.opcode:
-                case "ret": 
-                    new_jmp_ops.append(jmp)
-                case code if code in COND_JMP_OPS and self.get_val(jmp.args[0]) == "dyn": 
-                    new_jmp_ops.append(jmp)
-                    self.eval[jmp.args[1]] = True
-                case code if code in COND_JMP_OPS and self.get_val(jmp.args[0]) == "undef": 
-                    new_jmp_ops = jmp_ops # abort the whole jumpy analysis
-                    break
-                case "jz" if self.get_val(jmp.args[0]) == 0: 
-                    self.eval[jmp.args[1]] = True 
-                    new_jmp_ops.append(SSAOp("jmp", [jmp.args[1]], None))
-                    break
-                case "jnz" if self.get_val(jmp.args[0]) != 0: 
-                    self.eval[jmp.args[1]] = True 
-                    new_jmp_ops.append(SSAOp("jmp", [jmp.args[1]], None))
-                    break
-                case "jl" if self.get_val(jmp.args[0]) < 0: 
-                    self.eval[jmp.args[1]] = True 
-                    new_jmp_ops.append(SSAOp("jmp", [jmp.args[1]], None))
-                    break
-                case "jle" if self.get_val(jmp.args[0]) <= 0: 
-                    self.eval[jmp.args[1]] = True 
-                    new_jmp_ops.append(SSAOp("jmp", [jmp.args[1]], None))
-                    break
-                case "jnl" if self.get_val(jmp.args[0]) >= 0: 
-                    self.eval[jmp.args[1]] = True 
-                    new_jmp_ops.append(SSAOp("jmp", [jmp.args[1]], None))
-                    break
-                case "jnle" if self.get_val(jmp.args[0]) > 0: 
-                    self.eval[jmp.args[1]] = True 
-                    new_jmp_ops.append(SSAOp("jmp", [jmp.args[1]], None))
-                    break
-                case "jmp":
-                    self.eval[jmp.args[0]] = True 
-                    new_jmp_ops.append(jmp)
-                    break
-        return new_jmp_ops
-
-    def sccp_phi(self, phi: Phi):
-        # handle the cases for the phi functions
-        source_vals = [self.get_val(v) for v in phi.sources.values()]
-        computed_values = set([
-            self.get_val(v) for lbl, v in phi.sources.items() 
-            if self.eval[lbl]
-        ])
-        # There are at least two different values to choose -> result is dynamic
-        if len(set(source_vals) - {"undef", "dyn"}) > 1:
-            self.vals[phi.defined] = "dyn"
-            return True
-        # On of the possible (i.e. actually evaluated) predecessors provides a dynamic source -> result is dynamic
-        elif (True, "dyn") in [(self.eval[lbl],self.get_val(v)) for lbl, v in phi.sources.items()]:
-            self.vals[phi.defined] = "dyn"
-            return True
-        # We know all values of the sources and they are all the same -> result is static
-        elif "dyn" not in source_vals and "undef" not in source_vals and len(computed_values) == 1:
-            self.vals[phi.defined] = computed_values.pop()
-            return False
-        
-        self.vals[phi.defined] = "dyn"
-        return True
-        
     def get_val(self, var: SSATemp | TACGlobal):
-        if isinstance(var, TACGlobal):
-            return "dyn"
-        elif isinstance(var, int) or isinstance(var, bool):
+        if isinstance(var, SSATemp):
+            return self.vals.get(var, UNDEF)
+        elif isinstance(var, int):
             return var
-        else:
-            return self.vals[var]
\ No newline at end of file
+        return DYN
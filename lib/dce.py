@@ -0,0 +1,67 @@
+from .ssa import *
+from .tac import JMP_OPS
+
+# the instructions that do something besides computing their result: output, calls with their arguments and jumps
+EFFECT_OPS = ["print", "param", "call"] + JMP_OPS
+
+
+class DCEOptimizer:
+    """
+    Mark and sweep dead code elimination on SSA form. The roots are the instructions with an effect: `print`,
+    `param`, `call`, the jumps and `ret`, the stores to globals and the divisions that may trap. From them the
+    definitions of their operands are marked live through the def-use index, and from a live phi function the
+    definitions of all its sources. Everything that is not marked is deleted, also the cycles of phi functions
+    and instructions that only use each other (e.g. a counter in a loop that is never read), which a pass that
+    deletes unused temporaries one at a time can't see.
+
+    The jumps are always live, so branches and loops are kept even if nothing in them is live:
+    removing them by control dependence would also remove loops that don't terminate.
+
+    Args:
+        ssaproc (SSAProc): the procedure, changed in place
+    """
+
+    def __init__(self, ssaproc: SSAProc) -> None:
+        self.proc = ssaproc
+        self.eliminated = 0  # number of deleted phi functions and instructions
+
+    def optimize(self) -> SSAProc:
+        index = self.proc.def_use
+        live: Set[int] = set()  # ids of the live phi functions and instructions
+        work: List[Phi | SSAOp] = []
+        for block in self.proc.blocks:
+            for op in block.ops:
+                if self.is_root(op):
+                    live.add(id(op))
+                    work.append(op)
+        while work:
+            user = work.pop()
+            for tmp in index.used(user):
+                definition = index.definition(tmp)
+                if definition is not None and id(definition[1]) not in live:
+                    live.add(id(definition[1]))
+                    work.append(definition[1])
+
+        for block in self.proc.blocks:
+            for user in block.defs + block.ops:
+                if id(user) not in live:
+                    index.remove(block, user)
+                    self.eliminated += 1
+        index.sweep()
+        return self.proc
+
+    def is_root(self, op: SSAOp) -> bool:
+        if op.opcode in EFFECT_OPS or not isinstance(op.result, SSATemp):
+            return True
+        if op.opcode in ["div", "mod"]:
+            # idiv traps for a division by 0 and for the smallest number divided by -1
+            return self.constant(op.args[1]) in [None, 0, -1]
+        return False
+
+    def constant(self, value) -> int | None:
+        if isinstance(value, int):
+            return value
+        definition = self.proc.def_use.definition(value) if isinstance(value, SSATemp) else None
+        if definition is not None and isinstance(definition[1], SSAOp) and definition[1].opcode == "const":
+            return self.constant(definition[1].args[0])
+        return None
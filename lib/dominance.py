@@ -0,0 +1,318 @@
+from typing import Dict, List, Set
+
+
+class DominatorTree:
+    """
+    Dominator tree of a graph given as adjacency lists of integer ids, e.g. the `succs` and `preds` of a CFGIndex.
+    The immediate dominators are computed with the iterative algorithm of Cooper, Harvey and Kennedy
+    over the reverse postorder, which needs a few passes over the graph for the reducible CFGs of BX.
+    The nodes that can't be reached from the root have no immediate dominator and are in no frontier.
+
+    Args:
+        succs (list of list of int): the successors of every node
+        preds (list of list of int): the predecessors of every node
+        root (int, optional): the entry node, defaults to 0
+    """
+
+    def __init__(self, succs: List[List[int]], preds: List[List[int]], root: int = 0) -> None:
+        self.succs = succs
+        self.preds = preds
+        self.root = root
+        n = len(succs)
+        self.postorder = self._postorder(n)
+        # position in the postorder, -1 for the unreachable nodes
+        self.po_number = [-1] * n
+        for i, node in enumerate(self.postorder):
+            self.po_number[node] = i
+        self.idom = self._immediate_dominators(n)
+        self.children: List[List[int]] = [[] for _ in range(n)]
+        for node in reversed(self.postorder):
+            if node != root:
+                self.children[self.idom[node]].append(node)
+        # preorder interval of every subtree of the dominator tree, for the O(1) dominance test
+        self.pre = [-1] * n
+        self.last = [-1] * n
+        self._number_subtrees()
+        self._frontiers: List[List[int]] | None = None
+
+    def _postorder(self, n: int) -> List[int]:
+        order = []
+        visited = [False] * n
+        visited[self.root] = True
+        stack = [(self.root, iter(self.succs[self.root]))]
+        while stack:
+            node, it = stack[-1]
+            for succ in it:
+                if not visited[succ]:
+                    visited[succ] = True
+                    stack.append((succ, iter(self.succs[succ])))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+        return order
+
+    def _immediate_dominators(self, n: int) -> List[int]:
+        po_number = self.po_number
+        idom = [-1] * n
+        idom[self.root] = self.root
+
+        def intersect(a: int, b: int) -> int:
+            while a != b:
+                while po_number[a] < po_number[b]:
+                    a = idom[a]
+                while po_number[b] < po_number[a]:
+                    b = idom[b]
+            return a
+
+        rpo = self.postorder[::-1]
+        changed = True
+        while changed:
+            changed = False
+            for node in rpo:
+                if node == self.root:
+                    continue
+                new_idom = -1
+                for pred in self.preds[node]:
+                    if idom[pred] == -1:
+                        continue  # not processed yet or unreachable
+                    new_idom = pred if new_idom == -1 else intersect(pred, new_idom)
+                if idom[node] != new_idom:
+                    idom[node] = new_idom
+                    changed = True
+        idom[self.root] = -1
+        return idom
+
+    def _number_subtrees(self):
+        counter = 0
+        stack = [(self.root, False)]
+        while stack:
+            node, done = stack.pop()
+            if done:
+                self.last[node] = counter - 1
+                continue
+            self.pre[node] = counter
+            counter += 1
+            stack.append((node, True))
+            for child in reversed(self.children[node]):
+                stack.append((child, False))
+
+    def reachable(self, node: int) -> bool:
+        return self.po_number[node] != -1
+
+    def dominates(self, a: int, b: int) -> bool:
+        """
+        Whether a dominates b (every node dominates itself)
+        """
+        return self.reachable(a) and self.reachable(b) and self.pre[a] <= self.pre[b] <= self.last[a]
+
+    def preorder(self) -> List[int]:
+        """
+        The reachable nodes in a preorder of the dominator tree, every node after its dominators
+        """
+        order = [-1] * len(self.postorder)
+        for node in self.postorder:
+            order[self.pre[node]] = node
+        return order
+
+    def frontiers(self) -> List[List[int]]:
+        """
+        The dominance frontier of every node: the nodes it does not strictly dominate that have a predecessor
+        it dominates. Computed by walking up from the predecessors of every join node (Cooper, Harvey and Kennedy).
+        """
+        if self._frontiers is None:
+            frontiers: List[List[int]] = [[] for _ in self.succs]
+            for node in self.postorder:
+                preds = [pred for pred in self.preds[node] if self.reachable(pred)]
+                if len(preds) < 2:
+                    continue
+                for pred in preds:
+                    runner = pred
+                    # the root has no immediate dominator, a walk to it ends above it
+                    while runner != self.idom[node] and runner != -1:
+                        if not frontiers[runner] or frontiers[runner][-1] != node:
+                            frontiers[runner].append(node)
+                        runner = self.idom[runner]
+            self._frontiers = frontiers
+        return self._frontiers
+
+    def iterated_frontier(self, nodes) -> List[int]:
+        """
+        The iterated dominance frontier of a set of nodes: where the definitions in them merge
+
+        Args:
+            nodes (iterable of int): e.g. the blocks that define a temporary
+        Returns:
+            list of int: sorted
+        """
+        frontiers = self.frontiers()
+        result: Set[int] = set()
+        work = list(nodes)
+        while work:
+            node = work.pop()
+            for df in frontiers[node]:
+                if df not in result:
+                    result.add(df)
+                    work.append(df)
+        return sorted(result)
+
+
+class Loop:
+    """
+    A natural loop: its header and the nodes of its body (the header included), with its place in the loop forest
+
+    Args:
+        header (int): the node all back edges of the loop jump to
+        body (set of int): the nodes of the loop
+    """
+
+    __slots__ = ("header", "body", "parent", "children", "depth")
+
+    def __init__(self, header: int, body: Set[int]) -> None:
+        self.header = header
+        self.body = body
+        self.parent: Loop | None = None
+        self.children: List[Loop] = []
+        self.depth = 1
+
+    def __repr__(self) -> str:
+        return f"Loop({self.header}, depth={self.depth}, {sorted(self.body)})"
+
+
+class LoopForest:
+    """
+    The natural loops of a graph and how they nest. An edge t -> h is a back edge if h dominates t, the loop of h
+    is h and every node that reaches a t without passing through h (the loops of all back edges to h are merged).
+    A loop is nested in the smallest other loop that contains its header, its depth is the number of loops
+    that contain it.
+
+    Args:
+        dom (DominatorTree): the dominator tree of the graph
+    """
+
+    def __init__(self, dom: DominatorTree) -> None:
+        bodies: Dict[int, Set[int]] = {}
+        for tail in dom.postorder:
+            for header in dom.succs[tail]:
+                if dom.dominates(header, tail):
+                    body = bodies.setdefault(header, {header})
+                    work = [tail] if tail not in body else []
+                    body.add(tail)
+                    while work:
+                        node = work.pop()
+                        for pred in dom.preds[node]:
+                            if pred not in body and dom.reachable(pred):
+                                body.add(pred)
+                                work.append(pred)
+        # outer loops first, so a loop finds its parent as the innermost loop of its header so far
+        self.loops = sorted(
+            (Loop(header, body) for header, body in bodies.items()),
+            key=lambda loop: (-len(loop.body), dom.pre[loop.header]),
+        )
+        self.innermost: List[Loop | None] = [None] * len(dom.succs)
+        for loop in self.loops:
+            parent = self.innermost[loop.header]
+            if parent is not None:
+                loop.parent = parent
+                loop.depth = parent.depth + 1
+                parent.children.append(loop)
+            for node in loop.body:
+                self.innermost[node] = loop
+        self.roots = [loop for loop in self.loops if loop.parent is None]
+        self.depths = [loop.depth if loop is not None else 0 for loop in self.innermost]
+
+    def depth(self, node: int) -> int:
+        return self.depths[node]
+
+    def loop_of(self, node: int) -> Loop | None:
+        """
+        The innermost loop that contains node
+        """
+        return self.innermost[node]
+
+    def is_header(self, node: int) -> bool:
+        loop = self.innermost[node]
+        return loop is not None and loop.header == node
+
+
+class CFGInfo:
+    """
+    Dominance and loop information of a CFG of BasicBlocks or SSABasicBlocks: the dominator tree, the dominance
+    frontiers, the postdominator tree and the loop forest. Each is computed when it is first asked for.
+    `CFGIndex.info()` keeps one per CFGIndex, so it is computed again only after the CFG changed.
+
+    The postdominator tree is the dominator tree of the reversed graph from a virtual exit node (the node
+    `len(blocks)`) that all blocks without successors jump to. Blocks that can't reach an exit (infinite loops)
+    have no immediate postdominator.
+
+    Args:
+        blocks (list of BasicBlock or SSABasicBlock): the blocks, the initial one first
+        succs (list of list of int): the successors of every block by position in blocks
+        preds (list of list of int): the predecessors of every block by position in blocks
+    """
+
+    def __init__(self, blocks, succs: List[List[int]], preds: List[List[int]]) -> None:
+        self.blocks = blocks
+        self.succs = succs
+        self.preds = preds
+        self.position = {block.entry: i for i, block in enumerate(blocks)}
+        self._dominators: DominatorTree | None = None
+        self._postdominators: DominatorTree | None = None
+        self._loops: LoopForest | None = None
+
+    @property
+    def dominators(self) -> DominatorTree:
+        if self._dominators is None:
+            self._dominators = DominatorTree(self.succs, self.preds)
+        return self._dominators
+
+    @property
+    def postdominators(self) -> DominatorTree:
+        if self._postdominators is None:
+            exit = len(self.blocks)
+            exits = [i for i in range(exit) if not self.succs[i]]
+            reversed_succs = [list(preds) for preds in self.preds] + [exits]
+            reversed_preds = [list(succs) for succs in self.succs] + [[]]
+            for i in exits:
+                reversed_preds[i].append(exit)
+            self._postdominators = DominatorTree(reversed_succs, reversed_preds, root=exit)
+        return self._postdominators
+
+    @property
+    def loops(self) -> LoopForest:
+        if self._loops is None:
+            self._loops = LoopForest(self.dominators)
+        return self._loops
+
+    def _block(self, i: int):
+        return self.blocks[i] if 0 <= i < len(self.blocks) else None
+
+    def idom(self, block):
+        """
+        The immediate dominator of the block, None for the initial block and the unreachable ones
+        """
+        return self._block(self.dominators.idom[self.position[block.entry]])
+
+    def dominates(self, block1, block2) -> bool:
+        return self.dominators.dominates(self.position[block1.entry], self.position[block2.entry])
+
+    def frontier(self, block) -> List:
+        return [self.blocks[i] for i in self.dominators.frontiers()[self.position[block.entry]]]
+
+    def ipdom(self, block):
+        """
+        The immediate postdominator of the block, None if it is the virtual exit or there is none
+        """
+        return self._block(self.postdominators.idom[self.position[block.entry]])
+
+    def postdominates(self, block1, block2) -> bool:
+        return self.postdominators.dominates(self.position[block1.entry], self.position[block2.entry])
+
+    def loop_depth(self, block) -> int:
+        return self.loops.depths[self.position[block.entry]]
+
+    def loop_depths(self) -> List[int]:
+        """
+        The loop depth of every block, in the order of the blocks
+        """
+        return self.loops.depths
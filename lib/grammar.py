@@ -0,0 +1,101 @@
+# Tokens, reserved words and operator precedences of BX.
+# They are shared by the PLY front end (scanner.py, parser.py) and the hand-written one (rdparser.py).
+
+reserved = {
+    "def": "DEF",
+    "var": "VAR",
+    "int": "INT",
+    "bool": "BOOL",
+    "if": "IF",
+    "while": "WHILE",
+    "else": "ELSE",
+    "true": "TRUE",
+    "false": "FALSE",
+    "break": "BREAK",
+    "continue": "CONTINUE",
+    "return": "RETURN",
+}
+tokens = (
+    "IDENT",
+    "NUMBER",
+    "TRUE",
+    "FALSE",
+    "MAIN",
+    "LPAREN",
+    "RPAREN",
+    "VAR",
+    "EQUALS",
+    "COLON",
+    "SEMICOLON",
+    "PLUS",
+    "MINUS",
+    "TIMES",
+    "DIVIDE",
+    "MOD",
+    "AND",
+    "OR",
+    "XOR",
+    "LSHIFT",
+    "RSHIFT",
+    "TILDE",
+    "COMMENT",
+    "LBRACE",
+    "RBRACE",
+    "INT",
+    "BOOL",
+    "COMMA",
+    "DEF",
+    "EQUALSEQUALS",
+    "NOTEQUALS",
+    "LESSTHAN",
+    "LESSTHANEQUALS",
+    "GREATERTHAN",
+    "GREATERTHANEQUALS",
+    "OROR",
+    "ANDAND",
+    "BANG",
+    "ELSE",
+    "IF",
+    "WHILE",
+    "BREAK",
+    "CONTINUE",
+    "RETURN",
+)
+
+precedence = (
+    ("left", "OROR"),
+    ("left", "ANDAND"),
+    ("left", "OR"),
+    ("left", "XOR"),
+    ("left", "AND"),
+    ("nonassoc", "EQUALSEQUALS", "NOTEQUALS"),
+    ("nonassoc", "LESSTHAN", "LESSTHANEQUALS", "GREATERTHAN", "GREATERTHANEQUALS"),
+    ("left", "LSHIFT", "RSHIFT"),
+    ("left", "PLUS", "MINUS"),
+    ("left", "TIMES", "DIVIDE", "MOD"),
+    ("right", "TILDE"),
+    ("right", "UMINUS", "BANG"),
+)
+
+TOKEN_TO_BINOP = {
+    "&": "bitwise-and",
+    "&&": "boolean-and",
+    "|": "bitwise-or",
+    "||": "boolean-or",
+    "<": "lt",
+    "<=": "lte",
+    ">": "gt",
+    ">=": "gte",
+    "==": "equals",
+    "!=": "notequals",
+    "+": "addition",
+    "-": "subtraction",
+    "*": "multiplication",
+    "/": "division",
+    "%": "modulus",
+    "^": "bitwise-xor",
+    "~": "bitwise-negation",
+    "!": "boolean-negation",
+    "<<": "lshift",
+    ">>": "rshift",
+}
@@ -1,7 +1,8 @@
-import random
 from .mcs import *
+from .liveness import SSALivenessAnalyzer, SerializedLivenessAnalyzer
 from .ssa import *
 from .tac import *
+from .timing import span
 
 
 color_map = (
@@ -32,6 +33,20 @@ def reg_to_color(reg):
     return reg_map[reg]
 
 
+def fixed_params(params: List[SSATemp], G: InterferenceGraph) -> Dict[SSATemp, str]:
+    """
+    The parameters that stay in their CC registers, with these registers. A parameter that is still live where
+    an instruction clobbers its register (e.g. in %rdx at a division) interferes with the dummy of the register,
+    it is colored like any other temporary instead and moved at the entry of the procedure.
+    """
+    fixed = {}
+    for param, c in zip(params, CC_REG_ORDER):
+        node = G.nodes.get(param)
+        if node is None or all(str(nei.id) != c for nei in node.nbh):
+            fixed[param] = c
+    return fixed
+
+
 def greedy_coloring(params: List[SSATemp], G: InterferenceGraph, elim: List[SSATemp]):
     """
     Parameters
@@ -55,7 +70,7 @@ def greedy_coloring(params: List[SSATemp], G: InterferenceGraph, elim: List[SSAT
     available_colors = [i + 1 for i in range(K)]
     col = {u: 0 for u in elim}
     # also I can handle it  if the params are not allocated to their CC registers
-    for param, c in zip(params, CC_REG_ORDER):
+    for param, c in fixed_params(params, G).items():
         col[param] = reg_to_color(c)
         # I don't know why we would need to do this, we don't need to keep the params alive
         # available_colors.remove(col)
@@ -73,29 +88,66 @@ def greedy_coloring(params: List[SSATemp], G: InterferenceGraph, elim: List[SSAT
     return col
 
 
-def spill(col):
+def spill(params, G, col, costs):
     """
+    Spill temporaries until col uses at most as many colors as there are registers. Instead of coloring again,
+    every temporary with a color above that (in the order of decreasing spill cost) either takes a register color
+    from the neighbours that have it, if spilling them is cheaper than spilling the temporary, or is spilled itself.
+    The spill cost of a temporary is the number of its uses and definitions weighted by the loop depth,
+    divided by its degree. The parameters and the dummies are never spilled.
+
     Parameters
     ----------
+    params : list[temps]
+        list of temps which store the parameters of the function
+    G : interferance graph, the spilled temps are removed from it
     col : dict
         the keys are temps
-        the values are the assigned color (int)
+        the values are the assigned color (int), updated in place
+    costs : dict
+        the keys are temps
+        the values are the weighted number of uses and definitions
 
     Returns
     -------
-    temp | None
+    list[temps]
+        the spilled temps
 
     """
-    colors = set([col[u] for u in col.keys()])
-    nb_colors = len(colors)
-    if nb_colors <= 13:  # no need to spill
-        return None
-    else:
-        maxi = max(colors)
-        return random.choice([u for u in col.keys() if col[u] == maxi])
+    K = len(color_map)
+    fixed = set(fixed_params(params, G))
+    spill_cost = {
+        u: float("inf") if u in fixed or str(u.id).startswith("%%") else costs.get(u, 0) / max(len(node.nbh), 1)
+        for u, node in G.nodes.items()
+    }
+    spilled = []
+    for u in sorted((u for u in col if col[u] > K), key=lambda u: -spill_cost[u]):
+        holders = {}
+        for v in G.nodes[u].nbh:
+            if col[v] <= K:
+                holders.setdefault(col[v], []).append(v)
+        # a color that got free since, or the cheapest one to take if that is cheaper than spilling u
+        best, price = None, spill_cost[u]
+        for c in range(1, K + 1):
+            if c not in holders:
+                best = c
+                break
+            cost = sum(spill_cost[v] for v in holders[c])
+            if cost < price:
+                best, price = c, cost
+        if best is None:
+            victims = [u]
+        else:
+            victims = holders.get(best, [])
+            col[u] = best
+        for v in victims:
+            spilled.append(v)
+            G.remove(v)
+            del col[v]
+    return spilled
 
 
-def allocate(params, G, elim):
+def allocate(params, G, elim, costs=None):
     """
 
     Parameters
@@ -107,6 +159,8 @@ def allocate(params, G, elim):
     G : interferance graph
     elim: list[temps]
         elimination ordering
+    costs: dict, optional
+        the weighted number of uses and definitions of the temps, see `spill`
     Returns
     -------
     int, dict
@@ -116,14 +170,7 @@ def allocate(params, G, elim):
 
     col = greedy_coloring(params, G, elim)
     # the register coalsecing will mp go here
-    to_spill = spill(col)
-    spilled = []
-    while to_spill is not None:
-        spilled.append(to_spill)
-        G.remove(to_spill)
-        elim.remove(to_spill)
-        col = greedy_coloring(params, G, elim)
-        to_spill = spill(col)
+    spilled = spill(params, G, col, costs or {})
     stacksize = 8 * len(spilled)
     alloc = col
     for i, u in enumerate(spilled):
@@ -144,7 +191,7 @@ def free_color(graph: InterferenceGraph, coloring: Dict[SSATemp | TACTemp, int],
     Returns:
         bool or int: if it finds a free (register) color it returns its number. If not it returns false.
     """
-    already_used = {coloring[tmp] for tmp in graph.nodes[tmp1].nbh + graph.nodes[tmp2].nbh}
+    already_used = {coloring[tmp] for tmp in graph.nodes[tmp1].nbh | graph.nodes[tmp2].nbh}
 
     for i in range(1, len(color_map)+1):
         if i not in already_used:
@@ -183,17 +230,21 @@ class GraphAndColorAllocator:
             AllocRecord
         """
         # get the interference graph
-        lout, de, use, cop = self.gather_liveness()
-        ig = transformer(lout, de, use, cop)
+        with span("buildIG"):
+            lout, de, use, cop = self.gather_liveness()
+            ig = transformer(lout, de, use, cop)
         # compute elimination ordering
-        seo = mcs(ig)
-        stacksize, mapping = allocate(self.proc.params, ig, seo)
+        with span("mcs"):
+            seo = mcs(ig)
+        with span("coloring"):
+            stacksize, mapping = allocate(self.proc.params, ig, seo, self.spill_costs())
         
         if coalesce_registers:
-            self.coalesce_registers(ig, mapping)
+            with span("register coalescing"):
+                self.coalesce_registers(ig, mapping)
         mapping = {tmp: self.to_slot(alloc) for tmp, alloc in mapping.items()}
         # add locations for the stack parameters:
-        for i, param in enumerate(reversed(self.proc.params[6:])):
+        for i, param in enumerate(self.proc.params[6:]):
             mapping[param] = StackSlot(16 + i * 8)
         return AllocRecord(
             stacksize,
@@ -201,15 +252,36 @@ class GraphAndColorAllocator:
         )
 
     def gather_liveness(self):
+        liveness = SSALivenessAnalyzer(self.proc)
+        liveness.liveness()
         lout, de, use, cop = [], [], [], []
         for block in self.blocks:
-            for op in block.ops:
-                lout.append(list(op.live_out))
+            # the phi functions (and the parameters for the initial block) define temporaries at the entry of the block
+            phi_defs = {phi.defined for phi in block.defs}
+            entry_defs = [tmp for tmp in block.live_in if block is self.blocks[0] or tmp in phi_defs]
+            lout.append(list(block.live_in))
+            de.append(entry_defs)
+            use.append([])
+            cop.append(False)
+            for op, (_, live_out) in zip(block.ops, liveness.instruction_liveness(block)):
+                lout.append(list(live_out))
                 de.append(list(op.defined(interference=True)))
                 use.append(list(op.use(interference=True)))
                 cop.append(op.opcode == "copy")
         return lout, de, use, cop
 
+    def spill_costs(self) -> Dict[SSATemp, int]:
+        """
+        The number of uses and definitions of every temporary, each weighted by 10 ** (loop depth)
+        of the natural loops of the blocks.
+        """
+        costs = {}
+        for block, depth in zip(self.blocks, CFGIndex(self.blocks).info().loop_depths()):
+            for op in block.ops:
+                for tmp in list(op.use(interference=False)) + list(op.defined(interference=False)):
+                    costs[tmp] = costs.get(tmp, 0) + 10**depth
+        return costs
+
     def to_slot(self, i):
         if i >= 0:
             return Register(color_to_reg(i)[2:])
@@ -217,21 +289,24 @@ class GraphAndColorAllocator:
             return StackSlot(i)
 
     def coalesce_inst(
-        self, inst: TACOp | SSAOp, ig: InterferenceGraph, coloring: Dict
+        self, inst: TACOp | SSAOp, ig: InterferenceGraph, coloring: Dict, renames: RenameTable
     ) -> bool:
         """
         Performs register coalescing on TAC or SSA instructions.
 
         Args:
-            inst (TACop or SSAOp): the instruction.
+            inst (TACop or SSAOp): the instruction, its operands already resolved with renames
             ig (InterferenceGraph): an interference graph
             coloring (dict temp -> int): The current coloring
+            renames (RenameTable): records the merged temporaries, applied to the procedure by the caller
         Returns:
             bool: whether the instruction is to be removed
         """
         if inst.opcode == "copy" and isinstance(inst.result, SSATemp | TACTemp) and isinstance(inst.args[0], SSATemp | TACTemp):
             if coloring[inst.result] == coloring[inst.args[0]]:
                 return True
+            if inst.result not in ig.nodes or inst.args[0] not in ig.nodes:
+                return False  # spilled
             if inst.args[0] not in ig.nodes[inst.result].nbh:
                 fc = free_color(ig, coloring, inst.args[0], inst.result)
                 if fc:
@@ -240,8 +315,8 @@ class GraphAndColorAllocator:
                     ig.remove(inst.result)
                     ig.remove(inst.args[0])
                     coloring[new_tmp] = fc
-                    self.proc.rename_var(old=inst.args[0], new=new_tmp)
-                    self.proc.rename_var(old=inst.result, new=new_tmp)
+                    renames.rename(inst.args[0], new_tmp)
+                    renames.rename(inst.result, new_tmp)
                     return True
         return False
 
@@ -250,12 +325,16 @@ class GraphAndColorAllocator:
         Do register coalescing
         """
         # the main work is done in coalesce inst this just does it for
+        # the instructions are renamed when they are visited, the ones before them in one sweep at the end
+        renames = RenameTable()
         for block in self.blocks:
             new_ops = []
             for op in block.ops:
-                if not self.coalesce_inst(op, ig, coloring):
+                renames.resolve_op(op)
+                if not self.coalesce_inst(op, ig, coloring, renames):
                     new_ops.append(op)
             block.ops = new_ops
+        self.proc.apply_renames(renames)
 
 
 class TACGraphAndColorAllocator(GraphAndColorAllocator):
@@ -267,18 +346,41 @@ class TACGraphAndColorAllocator(GraphAndColorAllocator):
         self.proc = tacproc
 
     def gather_liveness(self):
+        self.liveness = liveness = SerializedLivenessAnalyzer(self.proc.body)
+        liveness.liveness()
+        stream = liveness.stream
+        copy = OPCODE_IDS["copy"]
         lout, de, use, cop = [], [], [], []
-        for op in self.proc.body.ops:
-            if isinstance(op, TACOp):
-                lout.append(list(op.live_out))
-                de.append(list(op.defined(interference=True)))
-                use.append(list(op.use(interference=True)))
-                cop.append(op.opcode == "copy")
+        if liveness.blocks:
+            # the temporaries live at the entry of the procedure (the parameters and the dummies) interfere
+            lout.append(list(liveness.blocks[0].live_in))
+            de.append(list(liveness.blocks[0].live_in))
+            use.append([])
+            cop.append(False)
+        for block in liveness.blocks:
+            for k, (_, live_out) in zip(block.ops, liveness.instruction_liveness(block)):
+                lout.append(list(live_out))
+                de.append(list(stream.defs[k]))
+                use.append(list(stream.uses[k]))
+                cop.append(stream.opcodes[k] == copy)
         return lout, de, use, cop
 
+    def spill_costs(self) -> Dict[TACTemp, int]:
+        """
+        The number of uses and definitions of every temporary, each weighted by 10 ** (loop depth),
+        expects `gather_liveness` to have been run on the current body
+        """
+        stream = self.liveness.stream
+        weights = stream.use_def_weights(self.liveness.loop_depths())
+        return {tmp: cost for tmp, cost in zip(stream.symbols.tmps, weights) if cost}
+
     def coalesce_registers(self, ig: InterferenceGraph, coloring: Dict):
+        renames = RenameTable()
         new_ops = []
         for op in self.proc.body.ops:
-            if not (isinstance(op, TACOp) and self.coalesce_inst(op, ig, coloring)):
+            if isinstance(op, TACOp):
+                renames.resolve_op(op)
+            if not (isinstance(op, TACOp) and self.coalesce_inst(op, ig, coloring, renames)):
                 new_ops.append(op)
         self.proc.body.ops = new_ops
+        self.proc.apply_renames(renames)
@@ -0,0 +1,99 @@
+from .ssa import *
+
+# the instructions without side effects whose result only depends on their operands
+PURE_OPS = ["add", "sub", "mul", "div", "mod", "and", "or", "xor", "not", "neg", "lshift", "rshift"]
+COMMUTATIVE_OPS = ["add", "mul", "and", "or", "xor"]
+
+
+def _order(value):
+    # a total order of value numbers (temporaries and constants) for the operands of commutative instructions
+    return (0, value, "") if isinstance(value, int) else (1, 0, str(value))
+
+
+class GVNOptimizer:
+    """
+    Dominator-based global value numbering on SSA form (the dominator value numbering technique of Briggs,
+    Cooper and Simpson). The blocks are visited in a preorder of the dominator tree with a scoped hash table
+    from (opcode, value numbers of the operands) to the temporary that first computed it. An instruction that
+    computes an expression that is available in a dominating block is replaced by a copy of that temporary,
+    the copy propagation removes it. Operands of commutative instructions are sorted, so `add a b` and
+    `add b a` get the same number. The value number of a temporary is the temporary that holds its value
+    first, or the constant it holds (a `const` or a phi function that merges the same value),
+    so `%1 = const 1; %2 = sub %n %1` and `%3 = const 1; %4 = sub %n %3` are the same expression.
+
+    Only instructions without side effects (PURE_OPS) on temporaries and constants are numbered, calls and
+    reads of globals are never the same twice. The phi functions of a block whose sources have the same
+    numbers are numbered alike.
+
+    Args:
+        ssaproc (SSAProc): the procedure, changed in place
+    """
+
+    def __init__(self, ssaproc: SSAProc) -> None:
+        self.proc = ssaproc
+        self.vn: Dict[SSATemp, SSATemp | int] = {}
+        self.eliminated = 0  # number of instructions replaced by copies
+
+    def number(self, value):
+        # temporaries that were not numbered (yet, e.g. the sources of back edges) stand for themselves
+        return self.vn.get(value, value) if isinstance(value, SSATemp) else value
+
+    def optimize(self) -> SSAProc:
+        index = CFGIndex(self.proc.blocks)
+        dom = index.info().dominators
+        table: Dict[Tuple, SSATemp] = {}
+        # walk the dominator tree, the expressions of a block are available in its subtree only
+        work: List[Tuple[int, List[Tuple] | None]] = [(dom.root, None)]
+        while work:
+            i, added = work.pop()
+            if added is not None:
+                for key in added:
+                    del table[key]
+                continue
+            added = []
+            self.number_block(index.blocks[i], table, added)
+            work.append((i, added))
+            for child in reversed(dom.children[i]):
+                work.append((child, None))
+        if self.eliminated:
+            self.proc.invalidate_def_use()
+        return self.proc
+
+    def number_block(self, block: SSABasicBlock, table: Dict[Tuple, SSATemp], added: List[Tuple]):
+        for phi in block.defs:
+            sources = {self.number(src) for src in phi.sources.values()} - {phi.defined}
+            if len(sources) == 1:
+                self.vn[phi.defined] = sources.pop()
+                continue
+            key = ("phi", block.entry) + tuple(
+                sorted((lbl.name, _order(self.number(src))) for lbl, src in phi.sources.items())
+            )
+            if key in table:
+                self.vn[phi.defined] = self.number(table[key])
+            else:
+                table[key] = phi.defined
+                added.append(key)
+        for op in block.ops:
+            result = op.result
+            if not isinstance(result, SSATemp):
+                continue
+            if op.opcode == "const" and isinstance(op.args[0], int):
+                self.vn[result] = op.args[0]
+                continue
+            if op.opcode == "copy" and isinstance(op.args[0], SSATemp | int):
+                self.vn[result] = self.number(op.args[0])
+                continue
+            if op.opcode not in PURE_OPS or not all(isinstance(arg, SSATemp | int) for arg in op.args):
+                continue
+            args = [self.number(arg) for arg in op.args]
+            if op.opcode in COMMUTATIVE_OPS:
+                args.sort(key=_order)
+            key = (op.opcode, *(_order(arg) for arg in args))
+            available = table.get(key)
+            if available is None:
+                table[key] = result
+                added.append(key)
+            else:
+                op.opcode, op.args = "copy", [available]
+                self.vn[result] = self.number(available)
+                self.eliminated += 1
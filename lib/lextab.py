@@ -0,0 +1,10 @@
+# lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('AND', 'ANDAND', 'BANG', 'BOOL', 'BREAK', 'COLON', 'COMMA', 'COMMENT', 'CONTINUE', 'DEF', 'DIVIDE', 'ELSE', 'EQUALS', 'EQUALSEQUALS', 'FALSE', 'GREATERTHAN', 'GREATERTHANEQUALS', 'IDENT', 'IF', 'INT', 'LBRACE', 'LESSTHAN', 'LESSTHANEQUALS', 'LPAREN', 'LSHIFT', 'MAIN', 'MINUS', 'MOD', 'NOTEQUALS', 'NUMBER', 'OR', 'OROR', 'PLUS', 'RBRACE', 'RETURN', 'RPAREN', 'RSHIFT', 'SEMICOLON', 'TILDE', 'TIMES', 'TRUE', 'VAR', 'WHILE', 'XOR'))
+_lexreflags   = 64
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_IDENT>[A-Za-z][A-Za-z0-9_]*)|(?P<t_COMMENT>//.*)|(?P<t_NUMBER>0|[1-9][0-9]*)|(?P<t_newline>\\n+)|(?P<t_WHILE>while)|(?P<t_ANDAND>\\&\\&)|(?P<t_OROR>\\|\\|)|(?P<t_ELSE>else)|(?P<t_PLUS>\\+)|(?P<t_MINUS>\\-)|(?P<t_TIMES>\\*)|(?P<t_DIVIDE>\\/)|(?P<t_MOD>\\%)|(?P<t_AND>\\&)|(?P<t_OR>\\|)|(?P<t_XOR>\\^)|(?P<t_LSHIFT><<)|(?P<t_RSHIFT>>>)|(?P<t_TILDE>\\~)|(?P<t_LPAREN>\\()|(?P<t_RPAREN>\\))|(?P<t_COLON>\\:)|(?P<t_EQUALSEQUALS>==)|(?P<t_NOTEQUALS>!=)|(?P<t_LESSTHANEQUALS><=)|(?P<t_GREATERTHANEQUALS>>=)|(?P<t_IF>if)|(?P<t_LBRACE>{)|(?P<t_RBRACE>})|(?P<t_EQUALS>=)|(?P<t_COMMA>,)|(?P<t_SEMICOLON>;)|(?P<t_LESSTHAN><)|(?P<t_GREATERTHAN>>)|(?P<t_BANG>!)', [None, ('t_IDENT', 'IDENT'), ('t_COMMENT', 'COMMENT'), ('t_NUMBER', 'NUMBER'), ('t_newline', 'newline'), (None, 'WHILE'), (None, 'ANDAND'), (None, 'OROR'), (None, 'ELSE'), (None, 'PLUS'), (None, 'MINUS'), (None, 'TIMES'), (None, 'DIVIDE'), (None, 'MOD'), (None, 'AND'), (None, 'OR'), (None, 'XOR'), (None, 'LSHIFT'), (None, 'RSHIFT'), (None, 'TILDE'), (None, 'LPAREN'), (None, 'RPAREN'), (None, 'COLON'), (None, 'EQUALSEQUALS'), (None, 'NOTEQUALS'), (None, 'LESSTHANEQUALS'), (None, 'GREATERTHANEQUALS'), (None, 'IF'), (None, 'LBRACE'), (None, 'RBRACE'), (None, 'EQUALS'), (None, 'COMMA'), (None, 'SEMICOLON'), (None, 'LESSTHAN'), (None, 'GREATERTHAN'), (None, 'BANG')])]}
+_lexstateignore = {'INITIAL': ' '}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
@@ -0,0 +1,224 @@
+from bisect import bisect_left
+from heapq import heappush, heappop
+from itertools import count
+from typing import Dict, List, Tuple
+from .alloc import Allocator, AllocRecord, Register, StackSlot, CC_REG_ORDER
+from .liveness import SerializedLivenessAnalyzer
+from .tac import *
+from .timing import span
+
+# the registers in the order they are handed out, the same ones the graph coloring uses
+# (r11 is the scratch register of the assembly generation)
+REGISTERS = ["rax", "rcx", "rdx", "rsi", "rdi", "r8", "r9", "r10", "rbx", "r12", "r13", "r14", "r15"]
+
+# functions with more instructions than this use the linear scan if the allocator is chosen automatically
+LINEAR_SCAN_THRESHOLD = 2000
+
+
+class Interval:
+    """
+    The lifetime of a temporary as sorted, disjoint half-open ranges of positions, the holes between them
+    can be used by other temporaries. Instruction i of the TAC (labels are not counted) has two positions:
+    2i where it reads its operands and 2i + 1 where it writes its result.
+    A temporary used by instruction i covers 2i, one that is defined by it or live after it covers 2i + 1,
+    so the operand that dies and the result of an instruction can share a register.
+
+    Args:
+        tmp (TACTemp | str): the temporary, or the name of the register for the blocked ranges of a register
+    """
+
+    __slots__ = ("tmp", "starts", "ends", "weight")
+
+    def __init__(self, tmp) -> None:
+        self.tmp = tmp
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.weight = 0.0  # spill cost, the interval with the lower one is spilled
+
+    def add(self, pos: int):
+        # positions are added in increasing order
+        if self.ends and self.ends[-1] == pos:
+            self.ends[-1] = pos + 1
+        elif not self.ends or self.ends[-1] < pos:
+            self.starts.append(pos)
+            self.ends.append(pos + 1)
+
+    @property
+    def start(self) -> int:
+        return self.starts[0]
+
+    @property
+    def end(self) -> int:
+        return self.ends[-1]
+
+    def __len__(self) -> int:
+        return sum(end - start for start, end in zip(self.starts, self.ends))
+
+    def intersects(self, other: "Interval") -> bool:
+        # look up the ranges of the interval with fewer ranges in the other one
+        if len(self.starts) > len(other.starts):
+            self, other = other, self
+        for start, end in zip(self.starts, self.ends):
+            j = bisect_left(other.ends, start + 1)  # the first range of other that ends after start
+            if j < len(other.starts) and other.starts[j] < end:
+                return True
+        return False
+
+    def __repr__(self) -> str:
+        return f"Interval({self.tmp}, {list(zip(self.starts, self.ends))})"
+
+
+class LinearScanAllocator(Allocator):
+    """
+    Linear scan register allocation (Poletto and Sarkar) on the deconstructed TAC, a fast alternative
+    to TACGraphAndColorAllocator for huge functions: no interference graph is built.
+
+    The intervals are visited in the order of their start. An interval gets the first register that is not
+    held by an interval it intersects, so it can be packed into the lifetime holes of the intervals that hold
+    the register (binpacking). If there is none, the interval with the lowest spill cost
+    (its uses and definitions weighted by the loop depth, divided by its length) is spilled: either the
+    new one, or the ones that hold the register it can take most cheaply. A temporary is spilled as a whole,
+    it lives in the same place everywhere since an AllocRecord has one location per temporary.
+
+    The registers an instruction clobbers (the dummies of `TACOp.prealloc_dummies`: rax, rbx and rdx for
+    div and mod, rcx for the shifts and the argument registers for a call) are blocked at both positions of
+    the instruction. The first six parameters are kept in their argument registers unless those are blocked
+    while they are live (then they get a register that is not an argument register, or are spilled),
+    the others stay on the stack.
+
+    Args:
+        tacproc (TACProc): the deconstructed procedure
+    """
+
+    def __init__(self, tacproc: TACProc) -> None:
+        self.proc = tacproc
+
+    def build_intervals(self) -> Tuple[Dict[TACTemp, Interval], Dict[str, Interval]]:
+        """
+        The intervals of the temporaries and the blocked ranges of the registers
+        """
+        liveness = SerializedLivenessAnalyzer(self.proc.body)
+        liveness.liveness()
+        stream = liveness.stream
+        intervals: Dict[TACTemp, Interval] = {}
+        blocked = {reg: Interval(reg) for reg in REGISTERS}
+
+        def interval(tmp):
+            iv = intervals.get(tmp)
+            if iv is None:
+                iv = intervals[tmp] = Interval(tmp)
+            return iv
+
+        i = 0
+        for block in liveness.blocks:
+            for k, (live_in, live_out) in zip(block.ops, liveness.instruction_liveness(block)):
+                for tmp in live_in:
+                    if not str(tmp.id).startswith("%%"):
+                        interval(tmp).add(2 * i)
+                for tmp in live_out | stream.kills[k]:
+                    if not str(tmp.id).startswith("%%"):
+                        interval(tmp).add(2 * i + 1)
+                for tmp in stream.defs[k]:
+                    if str(tmp.id).startswith("%%"):
+                        blocked[tmp.id[2:]].add(2 * i)
+                        blocked[tmp.id[2:]].add(2 * i + 1)
+                i += 1
+        # the temporaries that are neither live nor defined (e.g. unused parameters)
+        for tmp in stream.symbols.tmps:
+            if not str(tmp.id).startswith("%%"):
+                interval(tmp)
+
+        weights = stream.use_def_weights(liveness.loop_depths())
+        for tmp, iv in intervals.items():
+            iv.weight = weights[stream.symbols.index[tmp]] / max(len(iv), 1)
+        self.dummies = [tmp for tmp in stream.symbols.tmps if str(tmp.id).startswith("%%")]
+        return intervals, blocked
+
+    def allocate(self) -> AllocRecord:
+        """
+        Produces a valid allocation
+
+        Returns:
+            AllocRecord
+        """
+        with span("intervals"):
+            intervals, blocked = self.build_intervals()
+        with span("linear scan"):
+            mapping, spilled = self.scan(intervals, blocked)
+        for i, tmp in enumerate(spilled):
+            mapping[tmp] = StackSlot(-(i + 1) * 8)
+        # the clobbered registers count as used, so the callee save ones among them are saved
+        for dummy in self.dummies:
+            mapping[dummy] = Register(dummy.id[2:])
+        # add locations for the stack parameters:
+        for i, param in enumerate(self.proc.params[6:]):
+            mapping[param] = StackSlot(16 + i * 8)
+        return AllocRecord(len(spilled), mapping=mapping)
+
+    def scan(self, intervals: Dict[TACTemp, Interval], blocked: Dict[str, Interval]):
+        """
+        Returns:
+            dict TACTemp -> Register, list of TACTemp: the registers and the spilled temporaries
+        """
+        mapping: Dict[TACTemp, Register] = {}
+        spilled: List[TACTemp] = []
+        # the intervals that hold each register and have not ended before the current position
+        holders: Dict[str, List[Interval]] = {reg: [] for reg in REGISTERS}
+        ending: List[Tuple[int, int, str, Interval]] = []  # heap of (end, tiebreak, register, interval)
+        tiebreak = count()  # in the order of assignment, not by address, so every run frees them alike
+        fixed = set()
+
+        def assign(iv: Interval, reg: str):
+            mapping[iv.tmp] = Register(reg)
+            if iv.starts:
+                holders[reg].append(iv)
+                heappush(ending, (iv.end, next(tiebreak), reg, iv))
+
+        # a parameter that can't stay in its argument register is moved at the entry of the procedure,
+        # not into another argument register that may still hold a parameter
+        arg_registers = set(CC_REG_ORDER[: len(self.proc.params)])
+        avoid: Dict[TACTemp, set] = {}
+        for param, reg in zip(self.proc.params[:6], CC_REG_ORDER):
+            iv = intervals.get(param)
+            if iv is None:
+                iv = intervals[param] = Interval(param)
+            if iv.intersects(blocked[reg]):
+                avoid[param] = arg_registers
+            else:
+                del intervals[param]
+                fixed.add(param)
+                assign(iv, reg)
+        for param in self.proc.params[6:]:
+            intervals.pop(param, None)
+
+        empty = [iv for iv in intervals.values() if not iv.starts]
+        for iv in empty:
+            assign(iv, REGISTERS[0])
+        for iv in sorted((iv for iv in intervals.values() if iv.starts), key=lambda iv: iv.start):
+            # the intervals that ended before this one starts free their register
+            while ending and ending[0][0] <= iv.start:
+                _, _, reg, old = heappop(ending)
+                if mapping.get(old.tmp) == Register(reg):
+                    holders[reg].remove(old)
+            best, price, victims = None, iv.weight, []
+            for reg in REGISTERS:
+                if reg in avoid.get(iv.tmp, ()) or iv.intersects(blocked[reg]):
+                    continue
+                conflicts = [other for other in holders[reg] if other.intersects(iv)]
+                if not conflicts:
+                    best, victims = reg, []
+                    break
+                if any(other.tmp in fixed for other in conflicts):
+                    continue
+                cost = sum(other.weight for other in conflicts)
+                if cost < price:
+                    best, price, victims = reg, cost, conflicts
+            if best is None:
+                spilled.append(iv.tmp)
+                continue
+            for other in victims:
+                holders[best].remove(other)
+                del mapping[other.tmp]
+                spilled.append(other.tmp)
+            assign(iv, best)
+        return mapping, spilled
@@ -1,10 +1,180 @@
-from typing import Set
+from bisect import bisect_right
+from typing import Dict, FrozenSet, List, Set, Tuple
 from .tac import *
+from .opstream import OpStream
 from .cfg import *
+from .dominance import CFGInfo
 from .ssa import *
 
 
-class LivenessAnalyzer:
+class _LivenessSolver:
+    """
+    Iterative liveness analysis on a CFG with live sets as bitsets over the indices of a SymbolTable.
+
+    First the live-in set of every block is computed with a worklist that starts with the blocks in postorder
+    (so the successors of a block are mostly done before it) and revisits the predecessors of every block
+    whose live-in set grew, until nothing changes. Only the live_in and live_out sets of the blocks are stored,
+    the liveness of single instructions is rebuilt on demand by walking their block backwards
+    (`instruction_liveness`, `live_in`, `live_out` and `is_live_out`).
+    The subclasses define what an instruction uses and defines and how phi functions are handled.
+
+    Args:
+        blocks (list of BasicBlock or SSABasicBlock): the blocks of the procedure, the initial one first
+    """
+
+    def __init__(self, blocks) -> None:
+        self.blocks = blocks
+        self.symbols = SymbolTable()
+
+    def uses(self, inst) -> Set:
+        raise NotImplementedError
+
+    def defines(self, inst) -> Set:
+        raise NotImplementedError
+
+    def phi_defs(self, block) -> Set:
+        # temporaries defined at the entry of the block, they are not live-out of its predecessors
+        return set()
+
+    def phi_uses(self, block) -> Dict[TACLabel, Set]:
+        # label of a predecessor -> temporaries the block needs from that predecessor only
+        return {}
+
+    def postorder(self, succs: List[List[int]]) -> List[int]:
+        order = []
+        visited = [False] * len(self.blocks)
+        for root in range(len(self.blocks)):  # the initial block first, then the unreachable ones
+            if visited[root]:
+                continue
+            visited[root] = True
+            stack = [(root, iter(succs[root]))]
+            while stack:
+                i, children = stack[-1]
+                for j in children:
+                    if not visited[j]:
+                        visited[j] = True
+                        stack.append((j, iter(succs[j])))
+                        break
+                else:
+                    stack.pop()
+                    order.append(i)
+        return order
+
+    def edges(self) -> Tuple[List[List[int]], List[List[int]]]:
+        """
+        The successors and predecessors of every block by position, the edges are the ones recorded
+        in the predecessors of the blocks
+        """
+        position = {block.entry: i for i, block in enumerate(self.blocks)}
+        preds = [[position[pred.entry] for pred in block.predecessors if pred.entry in position] for block in self.blocks]
+        succs = [[] for _ in self.blocks]
+        for i in range(len(self.blocks)):
+            for p in preds[i]:
+                succs[p].append(i)
+        return succs, preds
+
+    def liveness(self):
+        blocks = self.blocks
+        symbols = self.symbols
+        position = {block.entry: i for i, block in enumerate(blocks)}
+        n = len(blocks)
+        succs, preds = self.edges()
+
+        # gen (upward exposed uses) and kill of every block
+        gen = [0] * n
+        kill = [0] * n
+        for i, block in enumerate(blocks):
+            g = set()
+            k = set()
+            for inst in reversed(block.ops):
+                define = self.defines(inst)
+                g -= define
+                g |= self.uses(inst)
+                k |= define
+            gen[i] = symbols.bitset(g)
+            kill[i] = symbols.bitset(k)
+        not_phi_defs = [~symbols.bitset(self.phi_defs(block)) for block in blocks]
+        # phi_in[i][p]: what block i needs from its predecessor p
+        phi_in = []
+        for i, block in enumerate(blocks):
+            needed = {}
+            for lbl, tmps in self.phi_uses(block).items():
+                if lbl in position:
+                    needed[position[lbl]] = symbols.bitset(tmps)
+            phi_in.append(needed)
+
+        live_in = [0] * n
+        live_out = [0] * n
+        worklist = self.postorder(succs)
+        queued = [True] * n
+        while worklist:
+            # the blocks queued during a round are processed in the next one, in the order they were queued
+            round_, worklist = worklist, []
+            for i in round_:
+                queued[i] = False
+                out = 0
+                for s in succs[i]:
+                    out |= (live_in[s] & not_phi_defs[s]) | phi_in[s].get(i, 0)
+                live_out[i] = out
+                new_in = gen[i] | (out & ~kill[i])
+                if new_in != live_in[i]:
+                    live_in[i] = new_in
+                    for p in preds[i]:
+                        if not queued[p]:
+                            queued[p] = True
+                            worklist.append(p)
+
+        # only the block boundaries are stored, the instructions are walked on demand
+        for i, block in enumerate(blocks):
+            block.live_in = symbols.to_set(live_in[i])
+            block.live_out = symbols.to_set(live_out[i])
+
+    def instruction_liveness(self, block) -> List[Tuple[Set, Set]]:
+        """
+        Rebuild the liveness of every instruction of a block by walking it backwards from its live-out set.
+        Expects `liveness()` to be up to date.
+
+        Returns:
+            list of (set, set): the live-in and live-out set of every instruction, in the order of the instructions
+        """
+        live = set(block.live_out)
+        sets = []
+        for inst in reversed(block.ops):
+            live_out = live
+            live = (live - self.defines(inst)) | self.uses(inst)
+            sets.append((live, live_out))
+        sets.reverse()
+        return sets
+
+    def live_out(self, block, i: int) -> Set:
+        """
+        The temporaries live after the i-th instruction of the block
+        """
+        live = set(block.live_out)
+        for inst in reversed(block.ops[i + 1 :]):
+            live -= self.defines(inst)
+            live |= self.uses(inst)
+        return live
+
+    def live_in(self, block, i: int) -> Set:
+        """
+        The temporaries live before the i-th instruction of the block
+        """
+        inst = block.ops[i]
+        return (self.live_out(block, i) - self.defines(inst)) | self.uses(inst)
+
+    def is_live_out(self, tmp, block, i: int) -> bool:
+        """
+        Whether tmp is live after the i-th instruction of the block, i.e. it is used before it is redefined
+        """
+        for inst in block.ops[i + 1 :]:
+            if tmp in self.uses(inst):
+                return True
+            if tmp in self.defines(inst):
+                return False
+        return tmp in block.live_out
+
+class LivenessAnalyzer(_LivenessSolver):
     """
     Anotate a cfg with liveness information. Done on a TAC CFG
 
@@ -13,88 +183,121 @@ class LivenessAnalyzer:
     """
 
     def __init__(self, cfg: List[BasicBlock]) -> None:
+        super().__init__(cfg)
         self.cfg = cfg
-        self.edges_covered: Set[Tuple[TACLabel, TACLabel]] = set()
-
-    def liveness_inst(self, live_out: Set[TACTemp], inst: TACOp):
-        inst.live_out = inst.live_out.union(live_out)
-        inst.live_in = inst.live_in.union(live_out)
-        for arg in inst.args:
-            if isinstance(arg, TACTemp):
-                inst.live_in.add(arg)
-        if inst.result is not None and inst.result in inst.live_in:
-            inst.live_in.remove(inst.result)
-        return inst.live_in
-
-    def liveness_block(self, live_out: Set[TACTemp], block: BasicBlock):
-        block.live_out = block.live_out.union(live_out)
-        for inst in reversed(block.ops):
-            live_out = self.liveness_inst(live_out, inst)
-        block.live_in = block.live_in.union(live_out)
 
-        for pred in block.predecessors:
-            if (block.entry, pred.entry) not in self.edges_covered:
-                self.edges_covered.add((block.entry, pred.entry))
-                self.liveness_block(live_out, pred)
+    def uses(self, inst: TACOp) -> Set[TACTemp]:
+        return {arg for arg in inst.args if isinstance(arg, TACTemp)}
 
-    def liveness(self):
-        for block in self.cfg:
-            if block.final():
-                self.liveness_block(set(), block)
+    def defines(self, inst: TACOp) -> Set[TACTemp]:
+        return {inst.result} if isinstance(inst.result, TACTemp) else set()
 
 
-class SSALivenessAnalyzer:
+class SSALivenessAnalyzer(_LivenessSolver):
     """
-    Annotate liveness information on an SSA Proc
+    Annotate liveness information on an SSA Proc.
+    The sources of a phi function are only live-out of the predecessor they come from.
 
     Args:
         ssaproc (SSAProc): The SSA procedure that is supposed to be annotated
     """
 
     def __init__(self, ssaproc: SSAProc) -> None:
+        super().__init__(ssaproc.blocks)
         self.ssaproc = ssaproc
         self.cfg = ssaproc.blocks
-        self.edges_covered: Set[Tuple[TACLabel, TACLabel]] = set()
-
-    def liveness_inst(self, live_out: Set[SSATemp], inst: SSAOp):
-        inst.live_out = inst.live_out.union(live_out)
-        inst.live_in = inst.live_in.union(live_out)
-        inst.live_in = inst.live_in.union(inst.use())
-        if inst.result is not None and inst.result in inst.live_in:
-            inst.live_in.remove(inst.result)
-        return inst.live_in
-
-    def liveness_block(self, live_out: Set[SSATemp], block: SSABasicBlock):
-        block.live_out = block.live_out.union(live_out)
-        for inst in reversed(block.ops):
-            live_out = self.liveness_inst(live_out, inst)
 
-        live_out_for_block = {}
-        defined = set()
+    def uses(self, inst: SSAOp) -> Set[SSATemp]:
+        # including the dummies of the preallocated registers
+        return inst.use()
 
-        # we need to detangle the liveness by a phi function
+    def defines(self, inst: SSAOp) -> Set[SSATemp]:
+        return {inst.result} if isinstance(inst.result, SSATemp) else set()
+
+    def phi_defs(self, block: SSABasicBlock) -> Set[SSATemp]:
+        return {phi.defined for phi in block.defs}
+
+    def phi_uses(self, block: SSABasicBlock) -> Dict[TACLabel, Set[SSATemp]]:
+        needed = {}
         for phi in block.defs:
-            defined.add(phi.defined)
             for lbl, tmp in phi.sources.items():
                 if isinstance(tmp, SSATemp):
-                    if lbl in live_out_for_block:
-                        live_out_for_block[lbl].add(tmp)
-                    else:
-                        live_out_for_block[lbl] = {tmp}
-        block.live_in = live_out
-        live_out = live_out - defined
-
-        for pred in block.predecessors:
-            if (block.entry, pred.entry) not in self.edges_covered:
-                self.edges_covered.add((block.entry, pred.entry))
-                if pred.entry in live_out_for_block:
-                    self.liveness_block(
-                        live_out_for_block[pred.entry].union(live_out), pred
-                    )
-                else:
-                    self.liveness_block(live_out, pred)
+                    needed.setdefault(lbl, set()).add(tmp)
+        return needed
 
-    def liveness(self):
-        for block in self.cfg:
-            if block.final():
-                self.liveness_block(set(), block)
+
+class SerializedLivenessAnalyzer(_LivenessSolver):
+    """
+    Liveness of serialized TAC, i.e. the body of a procedure after SSA deconstruction and the input of
+    the register allocation. The TAC is loaded into an OpStream and the blocks are split at the labels and after
+    the jumps, a block that does not end with jmp or ret falls through to the next one.
+    Instructions are addressed by their position in the stream (= their index in the TAC),
+    the ops of the blocks are these positions.
+
+    The dummies of the preallocated registers are used but never defined,
+    so they are live from their instruction up to the entry of the procedure.
+
+    Args:
+        tac (TAC): the serialized procedure
+    """
+
+    def __init__(self, tac: TAC) -> None:
+        self.tac = tac
+        self.stream = stream = OpStream(tac.ops)
+        self.starts: List[int] = []  # position of the first instruction of every block
+        blocks = []
+        for k in range(len(stream)):
+            if stream.is_label(k):
+                blocks.append(BasicBlock(entry=stream[k], ops=[]))
+                self.starts.append(k + 1)
+                continue
+            if not blocks or (blocks[-1].ops and stream.opcode(blocks[-1].ops[-1]) in JMP_OPS):
+                blocks.append(BasicBlock(entry=TACLabel(f".Lliveness.{k}"), ops=[]))
+                self.starts.append(k)
+            blocks[-1].ops.append(k)
+        labels = {block.entry: block for block in blocks}
+        for block in blocks:
+            block.predecessors = []
+        for block, following in zip(blocks, blocks[1:] + [None]):
+            last = block.ops[-1] if block.ops else None
+            targets = stream.jump_targets(last) if last is not None else []
+            successors = [labels[lbl] for lbl in targets if lbl in labels]
+            if following is not None and (last is None or stream.opcode(last) not in UNCOND_JMP_OP):
+                successors.append(following)
+            for succ in successors:
+                succ.predecessors.append(block)
+        super().__init__(blocks)
+        self.symbols = stream.symbols
+
+    def uses(self, k: int) -> FrozenSet[TACTemp]:
+        return self.stream.uses[k]
+
+    def defines(self, k: int) -> FrozenSet[TACTemp]:
+        return self.stream.kills[k]
+
+    def loop_depths(self) -> List[int]:
+        """
+        The loop depth of every position in the stream, from the natural loops of the blocks
+        (0 for the labels)
+        """
+        block_depths = CFGInfo(self.blocks, *self.edges()).loop_depths()
+        depths = [0] * len(self.stream)
+        for block, depth in zip(self.blocks, block_depths):
+            for k in block.ops:
+                depths[k] = depth
+        return depths
+
+    def locate(self, k: int) -> Tuple[BasicBlock, int]:
+        """
+        The block of the k-th element of the TAC (which has to be an instruction) and the position in it
+        """
+        j = bisect_right(self.starts, k) - 1
+        return self.blocks[j], k - self.starts[j]
+
+    def at(self, k: int) -> Tuple[Set[TACTemp], Set[TACTemp]]:
+        """
+        The live-in and live-out set of the k-th element of the TAC
+        """
+        block, i = self.locate(k)
+        live_out = self.live_out(block, i)
+        return (live_out - self.defines(k)) | self.uses(k), live_out
@@ -13,122 +13,98 @@ from .alloc import *
 def transformer(live_outs, defs, uses, is_copy):
     """Takes the arguements and spits out the interference graph.
 
+    The graph is built in one pass over the instructions (Chaitin style): every temporary an instruction defines
+    interferes with the temporaries live after it and with the other temporaries it defines.
+    Two temporaries that are live at the same point interfere through the definition of the later one, so
+    the temporaries that are live without a definition (e.g. the parameters) have to be passed as the definitions
+    of a pseudo instruction with them as its live out set, see `GraphAndColorAllocator.gather_liveness`.
+
     Args:
         live_outs (list of list of SSATemps or TACTemps): list of live out sets
         defs (list of list of SSATemps or TACTemps)): list of def sets
         use (list of list of SSATemps or TACTemps): list of use sets
         is_copy (list of Bool): wether the instruction is a copy or not.
     """
-    ans = []
+    IG = InterferenceGraph({})
     for i in range(0, len(defs)):
-        interfering_temps = set()
-        for x in live_outs[i]:
-            interfering_temps.add(x)
-            for y in defs[i]:
-                interfering_temps.add(y)
-            # we can't do register coalescing with this 
-            # we aren't really sure why source and destination would interfere here instead of just destination...
-            if is_copy[i]:
-                for y in uses[i]:
-                    interfering_temps.add(y)
-        ans.append(interfering_temps)
-    return buildIG(ans)
-
-
-def buildIG(temps):
-    """
-    Parameters
-    ----------
-    temps : list[set[SSATemps]]
-            in each set we have the variables which interfere with one another for 1 line
-            the list just collects all such for 1 function
-
-
-    Returns
-    -------
-    InterferenceGraph
-    """
-    IG = dict()
-    # distinct temporaries
-    distinct = {num for temp in temps for num in temp}
-    # non connected graph
-    for t in distinct:
-        IG[t] = InterferenceGraphNode(t, [], 0)
-    # time to build the connections now
-    for target in distinct:
-        IG[target].nbh.extend(
-            list(
-                set(
-                    IG[i].tmp
-                    for subset in temps
-                    if target in subset
-                    for i in subset - {target}
-                )
-            )
-        )
-    return InterferenceGraph(IG)
-
-
-def mcs(igraph):
+        interfering_temps = list(live_outs[i]) + list(defs[i])
+        for d in defs[i]:
+            IG.add_node(d)
+            IG.add_edges(d, interfering_temps)
+        # we can't do register coalescing with this
+        # we aren't really sure why source and destination would interfere here instead of just destination...
+        if is_copy[i] and live_outs[i]:
+            for u in uses[i]:
+                IG.add_node(u)
+                IG.add_edges(u, interfering_temps)
+    return IG
+
+
+def mcs(igraph, check=False):
     """
     Function to return a list with the simplical elimination ordering
     using Maximum cardinality search as seen in class
 
+    Linear time: the unvisited nodes are kept in buckets indexed by their value (the number of visited
+    neighbours), the next node is taken from the highest non empty bucket.
+
     Args:
         igraph (InterferenceGraph): input who's SEO is to be found
+        check (bool, optional): raise a ValueError if the ordering is not a simplicial elimination ordering,
+            which happens iff the graph is not chordal
 
     Returns:
-        [InterferenceGraphNode]: Simplical Elimination ordering
+        [InterferenceGraphNode.tmp]: Simplical Elimination ordering
     """
-    i = all_none(igraph)
+    nodes = igraph.nodes
+    # buckets[i]: the unvisited nodes with value i, dicts keep the order deterministic
+    buckets = [dict.fromkeys(nodes)]
+    for node in nodes.values():
+        node.value = 0
     ans = []
-    while i:
-        ans = update(igraph.nodes[i], ans, igraph)
-        i = all_none(igraph)
+    top = 0
+    for _ in range(len(nodes)):
+        while not buckets[top]:
+            top -= 1
+        tmp, _ = buckets[top].popitem()
+        node = nodes[tmp]
+        node.value = None
+        ans.append(tmp)
+        # update value for each neighbour
+        for i in node.nbh:
+            nei = nodes[i]
+            if nei.value is not None:
+                del buckets[nei.value][i]
+                nei.value += 1
+                if nei.value == len(buckets):
+                    buckets.append({})
+                buckets[nei.value][i] = None
+                top = max(top, nei.value)
+    if check and not is_seo(igraph, ans):
+        raise ValueError("the interference graph is not chordal, no simplicial elimination ordering exists")
     return ans
 
 
-def all_none(igraph):
-    """
-
-    Parameters
-    ----------
-    Igraph (Interference Graph) : Checks if all nodes are visited
-
-    Returns
-    -------
-    False if all are none
-    Else Returns first unvisited node
-
+def is_seo(igraph, order):
     """
-    for i, node in igraph.nodes.items():
-        if node.value is not None:
-            return i
-    return False
-
-
-def update(node, ans, igraph):
-    """
-    Used to update our coloring order for the MCS. Always chooses first instead of randomly.
+    Check whether order is a simplicial elimination ordering in the sense of `mcs`, i.e. the neighbours of every
+    node that come before it in the ordering form a clique. Linear time: for every node it is enough to check
+    that its earlier neighbours, except the last one of them, are neighbours of that last one.
 
     Args:
-        node (InterferenceGraphNode): a node from the interference graph
-        ans ([InterferenceGraphNode.tmp]): updates our MCS
-        igraph (InterferenceGraph): our original graph
+        igraph (InterferenceGraph): the graph
+        order ([InterferenceGraphNode.tmp]): an ordering of all the nodes
 
+    Returns:
+        bool
     """
-    node.value = None
-    ans.append(node.tmp)
-    # update value for each neighbour
-    for i in node.nbh:
-        if igraph.nodes[i].value != None:
-            igraph.nodes[i].value += 1
-    nnode = None
-    max = 0
-    for i in node.nbh:
-        if igraph.nodes[i].value != None and igraph.nodes[i].value > max:
-            nnode = igraph.nodes[i]
-            max = igraph.nodes[i].value
-    if nnode == None:
-        return ans
-    return update(nnode, ans, igraph)
+    position = {tmp: i for i, tmp in enumerate(order)}
+    for tmp in order:
+        earlier = [i for i in igraph.nodes[tmp].nbh if position[i] < position[tmp]]
+        if not earlier:
+            continue
+        parent = max(earlier, key=position.__getitem__)
+        parent_nbh = igraph.nodes[parent].nbh
+        if any(i is not parent and i not in parent_nbh for i in earlier):
+            return False
+    return True
@@ -0,0 +1,194 @@
+from array import array
+from typing import Any, Dict, FrozenSet, List
+from .tac import *
+
+# opcode id of the labels in an OpStream
+LABEL = -1
+EMPTY: FrozenSet = frozenset()
+
+
+class OpStream:
+    """
+    Struct of arrays store of serialized TAC: the opcode ids, operand slots and result slots of all
+    instructions in parallel arrays, and the def/use sets of every instruction computed once.
+
+    A slot is the index of a temporary in the SymbolTable if it is >= 0. Everything else (ints, labels, globals,
+    and None as the result of an instruction without one) is a constant, slot -1 - i is the i-th constant.
+    The operands of instruction k are operands[offsets[k]:offsets[k + 1]].
+    Labels are part of the stream with the opcode id LABEL and the label as their only operand,
+    so positions in the stream are positions in the TAC.
+
+    Passes that are not ported to the arrays can use `stream[k]`, a read-only TACOp-like view.
+
+    Args:
+        ops (list of TACOp and TACLabel): the serialized instructions, e.g. `proc.body.ops`
+        symbols (SymbolTable, optional): numbers the temporaries, a new table by default
+    """
+
+    def __init__(self, ops: List[TACOp | TACLabel], symbols: SymbolTable | None = None) -> None:
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.constants: List[Any] = []
+        self._constant_slots: Dict[Any, int] = {}
+        self.opcodes = array("b")
+        self.results = array("l")
+        self.operands = array("l")
+        self.offsets = array("L", [0])
+        # the use and def sets as TACOp.use(), TACOp.defined() (both with the dummies of the preallocated
+        # registers) and the result as the only definition, which is what the liveness analysis kills
+        self.uses: List[FrozenSet] = []
+        self.defs: List[FrozenSet] = []
+        self.kills: List[FrozenSet] = []
+        for op in ops:
+            self.append(op)
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def __getitem__(self, k: int) -> "OpView | TACLabel":
+        if self.opcodes[k] == LABEL:
+            return self.constants[-1 - self.operands[self.offsets[k]]]
+        return OpView(self, k)
+
+    def slot(self, value) -> int:
+        if isinstance(value, TACTemp):
+            return self.symbols.add(value)
+        # hashable constants are shared, 1 and True are told apart by their type
+        key = (type(value), value)
+        i = self._constant_slots.get(key)
+        if i is None:
+            i = self._constant_slots[key] = -1 - len(self.constants)
+            self.constants.append(value)
+        return i
+
+    def value(self, slot: int):
+        return self.symbols.tmps[slot] if slot >= 0 else self.constants[-1 - slot]
+
+    def append(self, op: TACOp | TACLabel):
+        if isinstance(op, TACLabel):
+            self.opcodes.append(LABEL)
+            self.results.append(self.slot(None))
+            self.operands.append(self.slot(op))
+            self.uses.append(EMPTY)
+            self.defs.append(EMPTY)
+            self.kills.append(EMPTY)
+        else:
+            self.opcodes.append(OPCODE_IDS[op.opcode])
+            self.results.append(self.slot(op.result))
+            for arg in op.args:
+                self.operands.append(self.slot(arg))
+            self.uses.append(frozenset(op.use()))
+            self.defs.append(frozenset(op.defined()))
+            self.kills.append(frozenset((op.result,)) if isinstance(op.result, TACTemp) else EMPTY)
+        self.offsets.append(len(self.operands))
+
+    def is_label(self, k: int) -> bool:
+        return self.opcodes[k] == LABEL
+
+    def opcode(self, k: int) -> str:
+        return OPCODES[self.opcodes[k]]
+
+    def args(self, k: int) -> List:
+        value = self.value
+        return [value(slot) for slot in self.operands[self.offsets[k] : self.offsets[k + 1]]]
+
+    def result(self, k: int):
+        return self.value(self.results[k])
+
+    def jump_targets(self, k: int) -> List[TACLabel]:
+        """
+        The labels instruction k jumps to
+        """
+        if self.is_label(k):
+            return []
+        opcode = self.opcode(k)
+        if opcode == "jmp":
+            return [self.value(self.operands[self.offsets[k]])]
+        if opcode in COND_JMP_OPS:
+            return [self.value(self.operands[self.offsets[k] + 1])]
+        return []
+
+    def loop_depths(self) -> List[int]:
+        """
+        The loop nesting depth of every position, estimated from the layout: a jump back to a label at or
+        before it closes a loop that spans the positions in between (as the loops of the source are laid out)
+        """
+        labels = {self[k]: k for k in range(len(self)) if self.is_label(k)}
+        delta = [0] * (len(self) + 1)
+        for k in range(len(self)):
+            for lbl in self.jump_targets(k):
+                start = labels.get(lbl)
+                if start is not None and start <= k:
+                    delta[start] += 1
+                    delta[k + 1] -= 1
+        depths = []
+        depth = 0
+        for k in range(len(self)):
+            depth += delta[k]
+            depths.append(depth)
+        return depths
+
+    def use_def_weights(self, depths: List[int] | None = None) -> List[int]:
+        """
+        For every temporary (by its index in the SymbolTable) its number of uses and definitions,
+        each weighted by 10 ** (loop depth), the usual estimate of what spilling it costs
+
+        Args:
+            depths (list of int, optional): the loop depth of every position, e.g. from the natural loops
+                of `SerializedLivenessAnalyzer.loop_depths`, estimated with `loop_depths` by default
+        """
+        weighted = [0] * len(self.symbols)
+        operands, offsets, results = self.operands, self.offsets, self.results
+        for k, depth in enumerate(depths if depths is not None else self.loop_depths()):
+            weight = 10**depth
+            for slot in operands[offsets[k] : offsets[k + 1]]:
+                if slot >= 0:
+                    weighted[slot] += weight
+            if results[k] >= 0:
+                weighted[results[k]] += weight
+        return weighted
+
+
+class OpView:
+    """
+    Read-only view of instruction k of an OpStream with the attributes and methods of a TACOp
+
+    Args:
+        stream (OpStream): the stream
+        k (int): position of the instruction
+    """
+
+    __slots__ = ("stream", "k")
+
+    def __init__(self, stream: OpStream, k: int) -> None:
+        self.stream = stream
+        self.k = k
+
+    @property
+    def opcode(self) -> str:
+        return self.stream.opcode(self.k)
+
+    @property
+    def args(self) -> List:
+        return self.stream.args(self.k)
+
+    @property
+    def result(self):
+        return self.stream.result(self.k)
+
+    def to_op(self) -> TACOp:
+        return TACOp(self.opcode, self.args, self.result)
+
+    def use(self, interference=True) -> FrozenSet:
+        return self.stream.uses[self.k] if interference else frozenset(self.to_op().use(interference=False))
+
+    def defined(self, interference=True) -> FrozenSet:
+        return self.stream.defs[self.k] if interference else frozenset(self.to_op().defined(interference=False))
+
+    def is_jmp(self) -> bool:
+        return self.opcode in JMP_OPS
+
+    def pretty(self) -> str:
+        return self.to_op().pretty()
+
+    def __repr__(self) -> str:
+        return f"OpView({self.k}: {self.pretty()})"
@@ -1,25 +1,10 @@
 import ply.yacc as yacc
 
 from .scanner import tokens
+from .grammar import precedence, TOKEN_TO_BINOP
 from .bxast import *
 
 
-precedence = (
-    ("left", "OROR"),
-    ("left", "ANDAND"),
-    ("left", "OR"),
-    ("left", "XOR"),
-    ("left", "AND"),
-    ("nonassoc", "EQUALSEQUALS", "NOTEQUALS"),
-    ("nonassoc", "LESSTHAN", "LESSTHANEQUALS", "GREATERTHAN", "GREATERTHANEQUALS"),
-    ("left", "LSHIFT", "RSHIFT"),
-    ("left", "PLUS", "MINUS"),
-    ("left", "TIMES", "DIVIDE", "MOD"),
-    ("right", "TILDE"),
-    ("right", "UMINUS", "BANG"),
-)
-
-
 def p_program(p):
     "program : declstar"
     p[0] = p[1]
@@ -72,7 +57,7 @@ def p_function_unparam(p):
             | DEF IDENT LPAREN  RPAREN COLON ty block
     """
     if len(p) > 6:
-        p[0] = Function(p[2], p[7], return_ty=p[5], params=[])
+        p[0] = Function(p[2], p[7], return_ty=p[6], params=[])
     else:
         p[0] = Function(p[2], p[5], return_ty=VoidType(), params=[])
 
@@ -82,11 +67,10 @@ def p_identlist(p):
     identlist : IDENT
               | IDENT COMMA identlist
     """
-    if len(p) == 1:
-        p[0] = []
+    if len(p) == 2:
+        p[0] = [p[1]]
     else:
-        p[0] = p[3]
-        p[0].append(p[1])
+        p[0] = [p[1]] + p[3]
 
 
 def p_param_identlist(p):
@@ -100,7 +84,7 @@ def p_param_ident(p):
     """
     param : IDENT COLON ty
     """
-    p[0] = (p[1], p[3])
+    p[0] = [(p[1], p[3])]
 
 
 def p_paramlist(p):
@@ -109,12 +93,11 @@ def p_paramlist(p):
           | param COMMA paramlist
     """
 
-    if len(p) == 1:
-        p[0] = []
-    elif len(p) == 2:
-        p[0] = [p[1]]
+    # every param is a list of (name, type) pairs, "x, y: int" declares two parameters
+    if len(p) == 2:
+        p[0] = p[1]
     else:
-        p[0] = [p[1]] + p[3]
+        p[0] = p[1] + p[3]
 
 
 def p_block(p):
@@ -292,27 +275,6 @@ def p_error(p):
     print(f"Syntax error in input! {p}")
 
 
-parser = yacc.yacc(start="program", debug=True)
-
-TOKEN_TO_BINOP = {
-    "&": "bitwise-and",
-    "&&": "boolean-and",
-    "|": "bitwise-or",
-    "||": "boolean-or",
-    "<": "lt",
-    "<=": "lte",
-    ">": "gt",
-    ">=": "gte",
-    "==": "equals",
-    "!=": "notequals",
-    "+": "addition",
-    "-": "subtraction",
-    "*": "multiplication",
-    "/": "division",
-    "%": "modulus",
-    "^": "bitwise-xor",
-    "~": "bitwise-negation",
-    "!": "boolean-negation",
-    "<<": "lshift",
-    ">>": "rshift",
-}
+# optimize skips the grammar signature check and debug=False stops writing parser.out.
+# parsetab.py has to be deleted after changing the grammar, the next run regenerates it
+parser = yacc.yacc(start="program", debug=False, optimize=True)
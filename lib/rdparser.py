@@ -0,0 +1,355 @@
+import re
+from typing import List, Tuple
+from .grammar import reserved, precedence, TOKEN_TO_BINOP
+from .bxast import *
+
+# Hand-written alternative to the PLY front end (scanner.py and parser.py).
+# It accepts the same language and builds the same AST: the scanner applies the rules
+# of scanner.py in the same order and the expression parser is driven by the same precedence table.
+
+OPERATOR_TOKENS = {
+    "&&": "ANDAND",
+    "||": "OROR",
+    "<<": "LSHIFT",
+    ">>": "RSHIFT",
+    "==": "EQUALSEQUALS",
+    "!=": "NOTEQUALS",
+    "<=": "LESSTHANEQUALS",
+    ">=": "GREATERTHANEQUALS",
+    "+": "PLUS",
+    "-": "MINUS",
+    "*": "TIMES",
+    "/": "DIVIDE",
+    "%": "MOD",
+    "&": "AND",
+    "|": "OR",
+    "^": "XOR",
+    "~": "TILDE",
+    "{": "LBRACE",
+    "}": "RBRACE",
+    "(": "LPAREN",
+    ")": "RPAREN",
+    ":": "COLON",
+    ";": "SEMICOLON",
+    ",": "COMMA",
+    "=": "EQUALS",
+    "<": "LESSTHAN",
+    ">": "GREATERTHAN",
+    "!": "BANG",
+}
+
+# Every match skips the ignored spaces and then matches exactly one token, so the scanner only needs one
+# regex match per token. Anything else that is not a newline is an illegal character.
+# Like in PLY the function rules come first, then the operators with the longer ones first.
+_TOKEN_RE = re.compile(
+    " *(?:"
+    + "|".join(
+        [
+            r"(?P<IDENT>[A-Za-z][A-Za-z0-9_]*)",
+            r"(?P<COMMENT>//.*)",
+            r"(?P<NUMBER>0|[1-9][0-9]*)",
+            r"(?P<NEWLINE>\n+)",
+        ]
+        + [f"(?P<{name}>{re.escape(op)})" for op, name in OPERATOR_TOKENS.items()]
+        + [r"(?P<ILLEGAL>[^ \n])"]
+    )
+    + ")"
+)
+
+# prefix operator token -> name of its row in the precedence table (the %prec of the PLY rule)
+PREFIX_PRECEDENCE = {"TILDE": "TILDE", "MINUS": "UMINUS", "BANG": "BANG"}
+# operator token -> (level, associativity) for the prefix and the binary operators, a higher level binds tighter
+PREFIX_LEVEL = {
+    token: (level, assoc)
+    for token, name in PREFIX_PRECEDENCE.items()
+    for level, (assoc, *names) in enumerate(precedence)
+    if name in names
+}
+BINOP_PRECEDENCE = {
+    token: (level, assoc)
+    for level, (assoc, *names) in enumerate(precedence)
+    for token in names
+    if token not in PREFIX_PRECEDENCE.values()
+}
+PREFIX_TO_UNIOP = {"TILDE": "bitwise-negation", "BANG": "boolean-negation", "MINUS": "opposite"}
+
+
+class Token:
+    """
+    A token in an error message, formatted like ply.lex.LexToken so the messages of both front ends agree
+    """
+
+    __slots__ = ("type", "value", "lineno", "lexpos")
+
+    def __init__(self, type: str, value, lineno: int, lexpos: int) -> None:
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __str__(self):
+        return f"LexToken({self.type},{self.value!r},{self.lineno},{self.lexpos})"
+
+    __repr__ = __str__
+
+
+def scan(src: str) -> Tuple[List[str], List, List[int], List[int]]:
+    """
+    Split the source into tokens, comments and illegal characters are skipped like in scanner.py.
+
+    Args:
+        src (str): the source code
+    Returns:
+        the types, values and positions of the tokens and the positions of the illegal characters
+    """
+    types = []
+    values = []
+    positions = []
+    illegal = []
+    for m in _TOKEN_RE.finditer(src):
+        group = kind = m.lastgroup
+        if kind == "IDENT":
+            value = m.group(group)
+            kind = reserved.get(value, "IDENT")
+        elif kind == "NUMBER":
+            value = int(m.group(group))
+        elif kind == "COMMENT" or kind == "NEWLINE":
+            continue
+        elif kind == "ILLEGAL":
+            illegal.append(m.start(group))
+            continue
+        else:
+            value = m.group(group)
+        types.append(kind)
+        values.append(value)
+        positions.append(m.start(group))
+    return types, values, positions, illegal
+
+
+class ParseError(Exception):
+    pass
+
+
+class Parser:
+    """
+    Recursive descent parser for BX, with precedence climbing for the expressions.
+
+    Args:
+        types (list of str): the token types, see `scan`
+        values (list): the token values
+    """
+
+    def __init__(self, types: List[str], values: List) -> None:
+        # the None at the end stands for the end of the input, so we never have to check the position
+        self.types = types + [None]
+        self.values = values
+        self.pos = 0
+
+    def error(self):
+        raise ParseError(self.pos)
+
+    def expect(self, type: str):
+        if self.types[self.pos] != type:
+            self.error()
+        self.pos += 1
+        return self.values[self.pos - 1]
+
+    def accept(self, type: str) -> bool:
+        if self.types[self.pos] == type:
+            self.pos += 1
+            return True
+        return False
+
+    def program(self) -> List[Function | StatementDecl]:
+        decls = [self.decl()]
+        while self.types[self.pos] is not None:
+            decls.append(self.decl())
+        return decls
+
+    def decl(self) -> Function | StatementDecl:
+        kind = self.types[self.pos]
+        if kind == "DEF":
+            return self.function()
+        if kind == "VAR":
+            return self.vardecl()
+        self.error()
+
+    def ty(self) -> PrimiType:
+        if self.types[self.pos] not in ("INT", "BOOL"):
+            self.error()
+        self.pos += 1
+        return PrimiType(self.values[self.pos - 1])
+
+    def function(self) -> Function:
+        self.expect("DEF")
+        name = self.expect("IDENT")
+        self.expect("LPAREN")
+        params = []
+        if not self.accept("RPAREN"):
+            params = self.paramlist()
+            self.expect("RPAREN")
+        return_ty = VoidType()
+        if self.accept("COLON"):
+            return_ty = self.ty()
+        return Function(name, self.block(), return_ty=return_ty, params=params)
+
+    def paramlist(self) -> List[Tuple[str, Type]]:
+        params = []
+        while True:
+            names = [self.expect("IDENT")]
+            while self.accept("COMMA"):
+                names.append(self.expect("IDENT"))
+            self.expect("COLON")
+            ty = self.ty()
+            params += [(name, ty) for name in names]
+            if not self.accept("COMMA"):
+                return params
+
+    def vardecl(self) -> StatementDecl:
+        self.expect("VAR")
+        name = self.expect("IDENT")
+        self.expect("EQUALS")
+        init = self.expr()
+        self.expect("COLON")
+        ty = self.ty()
+        self.expect("SEMICOLON")
+        return StatementDecl(name, ty, init)
+
+    def block(self) -> Block:
+        self.expect("LBRACE")
+        stmts = []
+        while not self.accept("RBRACE"):
+            stmts.append(self.stmt())
+        return Block(stmts)
+
+    def stmt(self) -> Statement:
+        kind = self.types[self.pos]
+        if kind == "IDENT":
+            name = self.values[self.pos]
+            self.pos += 1
+            if self.accept("EQUALS"):
+                value = self.expr()
+                self.expect("SEMICOLON")
+                return StatementAssign(name, value)
+            if self.types[self.pos] == "LPAREN":
+                call = self.call(name)
+                self.expect("SEMICOLON")
+                return StatementEval(call)
+            self.error()
+        if kind == "VAR":
+            return self.vardecl()
+        if kind == "LBRACE":
+            return StatementBlock(self.block())
+        if kind == "IF":
+            self.pos += 1
+            cond = self.condition()
+            body = self.block()
+            elseblock = self.block() if self.accept("ELSE") else None
+            return StatementIf(cond, body, elseblock)
+        if kind == "WHILE":
+            self.pos += 1
+            cond = self.condition()
+            return StatementWhile(cond, self.block())
+        if kind == "RETURN":
+            self.pos += 1
+            if self.accept("SEMICOLON"):
+                return StatementReturn(None)
+            value = self.expr()
+            self.expect("SEMICOLON")
+            return StatementReturn(value)
+        if kind == "BREAK" or kind == "CONTINUE":
+            self.pos += 1
+            self.expect("SEMICOLON")
+            return StatementBreak() if kind == "BREAK" else StatementContinue()
+        self.error()
+
+    def condition(self) -> Expression:
+        self.expect("LPAREN")
+        cond = self.expr()
+        self.expect("RPAREN")
+        return cond
+
+    def call(self, target: str) -> ExpressionCall:
+        self.expect("LPAREN")
+        args = []
+        if not self.accept("RPAREN"):
+            args.append(self.expr())
+            while self.accept("COMMA"):
+                args.append(self.expr())
+            self.expect("RPAREN")
+        return ExpressionCall(target, args)
+
+    def expr(self, min_level=0) -> Expression:
+        """
+        Parse an expression whose binary operators all have at least the level `min_level`.
+        The right operand of an operator is parsed like PLY resolves the shift/reduce conflicts:
+        it only contains operators of the same level if they are right associative.
+        """
+        left = self.unary()
+        types = self.types
+        while True:
+            prec = BINOP_PRECEDENCE.get(types[self.pos])
+            if prec is None or prec[0] < min_level:
+                return left
+            level, assoc = prec
+            op = self.values[self.pos]
+            self.pos += 1
+            right = self.expr(level if assoc == "right" else level + 1)
+            left = ExpressionBinOp(TOKEN_TO_BINOP[op], left, right)
+            if assoc == "nonassoc":
+                following = BINOP_PRECEDENCE.get(types[self.pos])
+                if following is not None and following[0] == level:
+                    self.error()  # e.g. a == b == c
+
+    def unary(self) -> Expression:
+        kind = self.types[self.pos]
+        if kind is None:
+            self.error()
+        value = self.values[self.pos]
+        self.pos += 1
+        if kind == "IDENT":
+            if self.types[self.pos] == "LPAREN":
+                return self.call(value)
+            return ExpressionVar(value)
+        if kind == "NUMBER":
+            return ExpressionInt(value)
+        if kind in PREFIX_LEVEL:
+            level, assoc = PREFIX_LEVEL[kind]
+            return ExpressionUniOp(PREFIX_TO_UNIOP[kind], self.expr(level if assoc == "right" else level + 1))
+        if kind == "LPAREN":
+            inner = self.expr()
+            self.expect("RPAREN")
+            return inner
+        if kind == "TRUE" or kind == "FALSE":
+            return ExpressionBool(kind == "TRUE")
+        self.pos -= 1
+        self.error()
+
+
+def parse(src: str) -> List[Function | StatementDecl] | None:
+    """
+    Parse a BX program, a drop in replacement for `parser.parse` of the PLY front end
+
+    Args:
+        src (str): the source code
+    Returns:
+        list: the declarations of the program, None after a syntax error (which is printed)
+    """
+    types, values, positions, illegal = scan(src)
+    error = None
+    try:
+        decls = Parser(types, values).program()
+    except ParseError as e:
+        decls = None
+        (index,) = e.args
+        if index < len(types):  # otherwise the error is at the end of the input
+            error = Token(types[index], values[index], src.count("\n", 0, positions[index]) + 1, positions[index])
+    # PLY scans lazily, so its messages about illegal characters are interleaved with the syntax error
+    before = len(illegal) if error is None else sum(pos < error.lexpos for pos in illegal)
+    for pos in illegal[:before]:
+        print("Illegal character '%s'" % src[pos])
+    if decls is None:
+        print(f"Syntax error in input! {error}")
+    for pos in illegal[before:]:
+        print("Illegal character '%s'" % src[pos])
+    return decls
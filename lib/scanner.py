@@ -1,65 +1,7 @@
 import ply.lex as lex
 
-reserved = {
-    "def": "DEF",
-    "var": "VAR",
-    "int": "INT",
-    "bool": "BOOL",
-    "if": "IF",
-    "while": "WHILE",
-    "else": "ELSE",
-    "true": "TRUE",
-    "false": "FALSE",
-    "break": "BREAK",
-    "continue": "CONTINUE",
-    "return": "RETURN",
-}
-tokens = (
-    "IDENT",
-    "NUMBER",
-    "TRUE",
-    "FALSE",
-    "MAIN",
-    "LPAREN",
-    "RPAREN",
-    "VAR",
-    "EQUALS",
-    "COLON",
-    "SEMICOLON",
-    "PLUS",
-    "MINUS",
-    "TIMES",
-    "DIVIDE",
-    "MOD",
-    "AND",
-    "OR",
-    "XOR",
-    "LSHIFT",
-    "RSHIFT",
-    "TILDE",
-    "COMMENT",
-    "LBRACE",
-    "RBRACE",
-    "INT",
-    "BOOL",
-    "COMMA",
-    "DEF",
-    "EQUALSEQUALS",
-    "NOTEQUALS",
-    "LESSTHAN",
-    "LESSTHANEQUALS",
-    "GREATERTHAN",
-    "GREATERTHANEQUALS",
-    "OROR",
-    "ANDAND",
-    "BANG",
-    "ELSE",
-    "IF",
-    "WHILE",
-    "BREAK",
-    "CONTINUE",
-    "RETURN",
-)
+from .grammar import reserved, tokens
+
 t_ignore = r" "
 
 
@@ -123,7 +65,9 @@ def t_newline(t):
     t.lexer.lineno += len(t.value)
 
 
-lexer = lex.lex()
+# optimize loads the master regex from lextab.py instead of validating and compiling all rules on every start.
+# lextab.py has to be deleted after changing a token rule, the next run regenerates it
+lexer = lex.lex(optimize=True, lextab="lextab")
 
 if __name__ == "__main__":
     import sys
@@ -0,0 +1,160 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"bxc-{os.getuid()}.sock")
+DEFAULT_QUEUE_SIZE = 64
+MAX_REQUEST_SIZE = 64 * 2**20  # bytes, a request is a single line
+
+
+def _warm_up():
+    # load the lexer and parser tables and the passes once per worker
+    from . import compile, parser, rdparser, cfg, liveness, ssa, dataflow, greedy_coloring, linear_scan, asmgen2  # noqa: F401
+
+
+def compile_request(source: str, optim=0, options: Dict | None = None) -> Dict:
+    """
+    Compile a single request, runs inside a worker process.
+    Anything the compiler prints (syntax and type errors) is returned as diagnostics.
+
+    Args:
+        source (str): the source code of the program
+        optim (int, optional): the optimization level
+        options (dict, optional): "cache_dir" and "cache_size" (MiB) enable the compilation cache,
+            "frontend" selects the parser, "allocator" the register allocator
+    Returns:
+        dict: {"ok": True, "asm": ..., "diagnostics": ...} or {"ok": False, "diagnostics": ...}
+    """
+    from .compile import compile
+    from .cache import CompilationCache, DEFAULT_CACHE_SIZE
+
+    options = options or {}
+    cache = None
+    if "cache_dir" in options:
+        cache = CompilationCache(
+            options["cache_dir"], options.get("cache_size", DEFAULT_CACHE_SIZE >> 20) << 20
+        )
+    diagnostics = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(diagnostics):
+            asm = compile(
+                source,
+                optim=optim,
+                cache=cache,
+                frontend=options.get("frontend", "ply"),
+                allocator=options.get("allocator", "auto"),
+            )
+    except SystemExit:
+        return {"ok": False, "diagnostics": diagnostics.getvalue()}
+    except Exception as e:
+        return {"ok": False, "diagnostics": diagnostics.getvalue() + f"internal compiler error: {e!r}\n"}
+    return {"ok": True, "asm": asm, "diagnostics": diagnostics.getvalue()}
+
+
+class CompileServer:
+    """
+    Long running compile server. Clients connect to a unix socket and send one JSON object per line:
+    {"source": ..., "optim": ..., "options": {...}}. Every request is answered by a line with the
+    JSON result of `compile_request`.
+
+    Requests go through a bounded queue: once it is full, the server stops reading from clients
+    until a worker is free again, so a burst of requests can't exhaust the memory of the server.
+
+    Args:
+        path (str, optional): path of the unix socket
+        workers (int, optional): number of worker processes, defaults to one per CPU
+        queue_size (int, optional): maximal number of requests waiting for a worker
+    """
+
+    def __init__(self, path: str = DEFAULT_SOCKET, workers: int | None = None, queue_size=DEFAULT_QUEUE_SIZE) -> None:
+        self.path = path
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.queue: asyncio.Queue | None = None
+        self.pool: ProcessPoolExecutor | None = None
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    args = (request["source"], int(request.get("optim", 0)), request.get("options"))
+                except (ValueError, KeyError, TypeError) as e:
+                    response = {"ok": False, "diagnostics": f"malformed request: {e!r}\n"}
+                else:
+                    result = loop.create_future()
+                    await self.queue.put((args, result))  # blocks while the queue is full
+                    response = await result
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass  # client went away or sent a line longer than MAX_REQUEST_SIZE
+        finally:
+            writer.close()
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            args, result = await self.queue.get()
+            try:
+                response = await loop.run_in_executor(self.pool, compile_request, *args)
+            except Exception as e:  # e.g. a crashed worker
+                response = {"ok": False, "diagnostics": f"internal compiler error: {e!r}\n"}
+            if not result.cancelled():
+                result.set_result(response)
+            self.queue.task_done()
+
+    async def serve(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up) as self.pool:
+            # start the workers right away instead of on the first request
+            await asyncio.gather(
+                *[asyncio.get_running_loop().run_in_executor(self.pool, _warm_up) for _ in range(self.workers)]
+            )
+            dispatchers = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+            if os.path.exists(self.path):
+                os.remove(self.path)  # left over from a previous server
+            server = await asyncio.start_unix_server(
+                self.handle_client, path=self.path, limit=MAX_REQUEST_SIZE
+            )
+            print(f"Serving on {self.path} with {self.workers} workers", flush=True)
+            try:
+                async with server:
+                    await server.serve_forever()
+            finally:
+                for task in dispatchers:
+                    task.cancel()
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+
+def request(source: str, optim=0, options: Dict | None = None, path: str = DEFAULT_SOCKET) -> Dict:
+    """
+    Send a compile request to a running server
+
+    Args:
+        source (str): the source code of the program
+        optim (int, optional): the optimization level
+        options (dict, optional): see `compile_request`
+        path (str, optional): path of the server's unix socket
+    Returns:
+        dict: the result of `compile_request`
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps({"source": source, "optim": optim, "options": options or {}}).encode() + b"\n")
+        with sock.makefile("rb") as fp:
+            return json.loads(fp.readline())
@@ -1,8 +1,11 @@
 from .tac import *
-from .cfg import BasicBlock
+from .cfg import BasicBlock, CFGIndex
+from .dominance import DominatorTree
 from .asmgen import CC_REG_ORDER
-from typing import Any, Set
+from typing import Any, Dict, Set, Tuple
 from copy import deepcopy
+import weakref
+from .timing import span
 
 CC_REG_ORDER = [
     "rdi",
@@ -15,9 +18,22 @@ CC_REG_ORDER = [
 
 
 class SSATemp:
-    def __init__(self, id: str | int, version: int) -> None:
-        self.id = id
-        self.version = version
+    """
+    A version of a temporary, interned like TACTemp: SSATemp(x, v) is always the same object
+    """
+
+    __slots__ = ("id", "version", "_hash", "__weakref__")
+    _interned: "weakref.WeakValueDictionary[Tuple[str | int, int], SSATemp]" = weakref.WeakValueDictionary()
+
+    def __new__(cls, id: str | int, version: int) -> "SSATemp":
+        tmp = cls._interned.get((id, version))
+        if tmp is None:
+            tmp = object.__new__(cls)
+            tmp.id = id
+            tmp.version = version
+            tmp._hash = stable_hash(id) + hash(version)
+            cls._interned[(id, version)] = tmp
+        return tmp
 
     def __str__(self):
         return f"%{self.id}.{self.version}"
@@ -25,22 +41,29 @@ class SSATemp:
     def __repr__(self):
         return f"%{self.id}.{self.version}"
 
-    def __eq__(self, __value: object) -> bool:
-        return isinstance(__value, SSATemp) and self.id == __value.id and self.version == __value.version
-
     def __hash__(self) -> int:
-        return hash(self.id) + hash(self.version)
+        return self._hash
 
+    def __reduce__(self):
+        return (type(self), (self.id, self.version))
 
-@dataclass
-class SSALabel:
-    name: str
+    def __copy__(self):
+        return self
 
-    def __hash__(self) -> int:
-        return hash(self.name)
+    def __deepcopy__(self, memo):
+        return self
 
-    def __eq__(self, __value: object) -> bool:
-        return __value.name == self.name
+
+class SSALabel(TACLabel):
+    """
+    A label in SSA form, interned like TACLabel
+    """
+
+    __slots__ = ()
+    _interned: "weakref.WeakValueDictionary[str, SSALabel]" = weakref.WeakValueDictionary()
+
+    def __repr__(self) -> str:
+        return f"SSALabel(name={self.name!r})"
 
     def __str__(self):
         return f"%{self.name}"
@@ -57,15 +80,12 @@ class SSAGlobal:
         return self.name == __value.name
 
 
-@dataclass
+@dataclass(slots=True)
 class SSAOp:
     opcode: str
     args: List[SSATemp | SSALabel | int | SSAGlobal]
     result: SSATemp | SSAGlobal | None
 
-    live_in: Set[SSATemp] = field(default_factory=set)
-    live_out: Set[SSATemp] = field(default_factory=set)
-
     def to_dict(self):
         return {
             "opcode": self.opcode,
@@ -82,8 +102,8 @@ class SSAOp:
             return f"{self.result} = {self.opcode} {' '.join([str(arg) for arg in self.args])}"
         return f"{self.opcode} {' '.join([str(arg) for arg in self.args])}"
 
-    def detailed(self) -> str:
-        return f"\t{str(self.live_in)} \n\t{self.pretty()}\n \t{str(self.live_out)}"
+    def detailed(self, live_in: Set[SSATemp], live_out: Set[SSATemp]) -> str:
+        return f"\t{str(live_in)} \n\t{self.pretty()}\n \t{str(live_out)}"
 
     def is_jmp(self) -> bool:
         return self.opcode in JMP_OPS
@@ -120,7 +140,7 @@ class SSAOp:
             dummies.add(SSATemp("%%rax", 0))
             dummies.add(SSATemp("%%rbx", 0))
             dummies.add(SSATemp("%%rdx", 0))
-        elif self.opcode in ["shl", "shr"]:
+        elif self.opcode in ["rshift", "lshift"]:
             dummies.add(SSATemp("%%rcx", 0))
         elif self.opcode == "param" and self.args[0] < 7:  # deprecated
             dummies.add(SSATemp(f"%%{CC_REG_ORDER[self.args[0]-1]}", 0))
@@ -162,12 +182,15 @@ class SSABasicBlock:
     # for liveness analysis
     live_in: Set[SSATemp] = field(default_factory=set)
     live_out: Set[SSATemp] = field(default_factory=set)
+    # position in the CFGIndex of the last CFG it was part of
+    id: int = -1
 
     def final(self) -> bool:
         return len(self.ops) > 0 and self.ops[-1].opcode == "ret"
 
     def empty(self) -> bool:
-        return all([op.opcode in JMP_OPS for op in self.ops])
+        # a block with phi functions defines temporaries, even if it only jumps
+        return len(self.defs) == 0 and all([op.opcode in JMP_OPS for op in self.ops])
 
     def get_tmps(self) -> Set[SSATemp]:
         temps = set()
@@ -179,10 +202,22 @@ class SSABasicBlock:
         return temps
 
     def coalesce(self, block2):
+        # block2 has this block as its only predecessor, so its phi functions are just copies
+        copies = [
+            SSAOp("const" if isinstance(phi.sources[self.entry], int) else "copy", [phi.sources[self.entry]], phi.defined)
+            for phi in block2.defs
+        ]
+        # and the phi functions of its successors get their values from the merged block now
+        for succ in block2.successors:
+            for phi in succ.defs:
+                if block2.entry in phi.sources:
+                    phi.sources = {
+                        self.entry if lbl == block2.entry else lbl: tmp for lbl, tmp in phi.sources.items()
+                    }
         return SSABasicBlock(
             entry=self.entry,
-            defs= self.defs + block2.defs,
-            ops=self.ops[:-1] + block2.ops,
+            defs=self.defs,
+            ops=self.ops[:-1] + copies + block2.ops,
             successors=block2.successors,
             predecessors=self.predecessors,
             initial=self.initial,
@@ -198,6 +233,16 @@ class SSABasicBlock:
                 case SSAOp(opcode, [_, lbl], None) if opcode in COND_JMP_OPS:
                     lbls.append(lbl)
         return lbls
+
+    def replace_jumps(self, old_label, new_label):
+        for op in self.ops:
+            match op:
+                case SSAOp("jmp", [lbl]) if lbl == old_label:
+                    op.args[0] = new_label
+                case SSAOp(
+                    opcode, [_, lbl]
+                ) if opcode in COND_JMP_OPS and lbl == old_label:
+                    op.args[-1] = new_label
     
     def __repr__(self) -> str:
         return f"SSABasicBlock({self.entry}, {self.ops})"
@@ -207,12 +252,126 @@ class SSABasicBlock:
     
     def __eq__(self, __value: object) -> bool:
         return isinstance(__value, SSABasicBlock) and self.entry == __value.entry
+class DefUseIndex:
+    """
+    Def-use chains of an SSAProc: the phi function or instruction that defines every temporary and the phi
+    functions and instructions that use it, so a sparse pass only visits the uses of what it changes and
+    `is_dead` is O(1). A user is stored together with its block, and once per temporary even if it uses it twice.
+
+    The index stays consistent as long as the procedure is only changed through its helpers: `replace_uses`,
+    `remove` (the removed users stay in their blocks until `sweep`) and `add` for a user the caller inserted.
+
+    Args:
+        proc (SSAProc): the procedure
+    """
+
+    def __init__(self, proc: "SSAProc") -> None:
+        self.proc = proc
+        self.defs: Dict[SSATemp, Tuple[SSABasicBlock, Phi | SSAOp]] = {}
+        # id of the user -> (block, user), ids since phi functions and instructions are not hashable
+        self.uses: Dict[SSATemp, Dict[int, Tuple[SSABasicBlock, Phi | SSAOp]]] = {}
+        self._removed: Set[int] = set()
+        self._dirty: Dict[int, SSABasicBlock] = {}  # blocks that still contain removed users
+        for block in proc.blocks:
+            for phi in block.defs:
+                self.add(block, phi)
+            for op in block.ops:
+                self.add(block, op)
+
+    @staticmethod
+    def used(user: "Phi | SSAOp") -> Set[SSATemp]:
+        values = user.sources.values() if isinstance(user, Phi) else user.args
+        return {tmp for tmp in values if isinstance(tmp, SSATemp)}
+
+    @staticmethod
+    def defined(user: "Phi | SSAOp") -> SSATemp | None:
+        tmp = user.defined if isinstance(user, Phi) else user.result
+        return tmp if isinstance(tmp, SSATemp) else None
+
+    def add(self, block: SSABasicBlock, user: "Phi | SSAOp"):
+        """
+        Add the definition and the uses of a phi function or instruction of block
+        """
+        tmp = self.defined(user)
+        if tmp is not None:
+            self.defs[tmp] = (block, user)
+        for tmp in self.used(user):
+            self.uses.setdefault(tmp, {})[id(user)] = (block, user)
+
+    def definition(self, tmp: SSATemp) -> "Tuple[SSABasicBlock, Phi | SSAOp] | None":
+        return self.defs.get(tmp)
+
+    def uses_of(self, tmp: SSATemp) -> "List[Tuple[SSABasicBlock, Phi | SSAOp]]":
+        return list(self.uses.get(tmp, {}).values())
+
+    def is_dead(self, tmp: SSATemp) -> bool:
+        return not self.uses.get(tmp)
+
+    def is_removed(self, user: "Phi | SSAOp") -> bool:
+        return id(user) in self._removed
+
+    def replace_uses(self, old: SSATemp, new) -> "List[Tuple[SSABasicBlock, Phi | SSAOp]]":
+        """
+        Replace every use of old by new (a temporary or a constant)
+
+        Returns:
+            list of (SSABasicBlock, Phi or SSAOp): the users that changed
+        """
+        users = list(self.uses.pop(old, {}).values())
+        for block, user in users:
+            if isinstance(user, Phi):
+                user.sources = {lbl: new if tmp is old else tmp for lbl, tmp in user.sources.items()}
+            else:
+                user.args = [new if arg is old else arg for arg in user.args]
+            if isinstance(new, SSATemp):
+                self.uses.setdefault(new, {})[id(user)] = (block, user)
+        return users
+
+    def remove(self, block: SSABasicBlock, user: "Phi | SSAOp"):
+        """
+        Remove a phi function or instruction of block from the chains, it is deleted from the block by `sweep`
+        """
+        tmp = self.defined(user)
+        if tmp is not None and self.defs.get(tmp, (None, None))[1] is user:
+            del self.defs[tmp]
+        for used in self.used(user):
+            self.uses.get(used, {}).pop(id(user), None)
+        self._removed.add(id(user))
+        self._dirty[id(block)] = block
+
+    def sweep(self):
+        """
+        Delete the removed phi functions and instructions from their blocks
+        """
+        removed = self._removed
+        for block in self._dirty.values():
+            block.defs = [phi for phi in block.defs if id(phi) not in removed]
+            block.ops = [op for op in block.ops if id(op) not in removed]
+        self._dirty = {}
+        self._removed = set()
+
+
 @dataclass
 class SSAProc:
     blocks: List[SSABasicBlock]
     params: List[SSATemp]
+    # of the current blocks, built when it is first needed and dropped by the changes that bypass it
+    _def_use: DefUseIndex | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def def_use(self) -> DefUseIndex:
+        if self._def_use is None:
+            self._def_use = DefUseIndex(self)
+        return self._def_use
+
+    def invalidate_def_use(self):
+        """
+        Drop the def-use index, for passes that change the blocks without it
+        """
+        self._def_use = None
 
     def rename_var(self, old, new, replace_results=True):
+        self._def_use = None
         for block in self.blocks:
             for phi in block.defs:
                 phi.sources = {
@@ -230,6 +389,26 @@ class SSAProc:
                         new if op.result is not None and op.result == old else op.result
                     )
 
+    def apply_renames(self, renames: RenameTable, replace_results=True):
+        """
+        Rewrite all phi functions and instructions with the renames recorded in the table, in one sweep
+
+        Args:
+            renames (RenameTable): the renames
+            replace_results (bool, optional): also rename the defined temporaries, defaults to True
+        """
+        if len(renames) == 0:
+            return
+        self._def_use = None
+        resolve = renames.resolve
+        for block in self.blocks:
+            for phi in block.defs:
+                phi.sources = {lbl: resolve(tmp) for lbl, tmp in phi.sources.items()}
+                if replace_results:
+                    phi.defined = resolve(phi.defined)
+            for op in block.ops:
+                renames.resolve_op(op, replace_results)
+
     def get_tmps(self):
         tmps = set(self.params)
         for block in self.blocks:
@@ -240,9 +419,12 @@ class SSAProc:
         return SSATemp(len(self.get_tmps) + 1, 0)
 
     def delete_setting_inst(self, vars: Set[SSATemp]):
-        for block in self.blocks:
-            block.ops = [op for op in block.ops if op.result not in vars]
-            block.defs = [phi for phi in block.defs if phi.defined not in vars]
+        index = self.def_use
+        for var in vars:
+            definition = index.definition(var)
+            if definition is not None:
+                index.remove(*definition)
+        index.sweep()
 
 class SSACrudeGenerator:
     def __init__(self, blocks: List[BasicBlock], proc: TACProc) -> None:
@@ -290,13 +472,7 @@ class SSACrudeGenerator:
             result_versioned = self.current_version[op.result]
         else:
             result_versioned = op.result
-        new_op = SSAOp(
-            op.opcode,
-            args_versioned,
-            result_versioned,
-            live_in=set(),
-            live_out=set()
-        )
+        new_op = SSAOp(op.opcode, args_versioned, result_versioned)
         return new_op
 
     def _versioning(self, block: BasicBlock) -> SSABasicBlock:
@@ -358,6 +534,117 @@ class SSACrudeGenerator:
             self.current_version[tmp] = SSATemp(tmp.id, 0)
 
 
+class SSAPrunedGenerator:
+    """
+    Minimal, pruned SSA construction with dominance frontiers (Cytron et al.). A temporary gets a phi function
+    only in the iterated dominance frontier of the blocks that define it, and only where it is live-in,
+    so no phi functions have to be cleaned up afterwards. The operands are then versioned in one walk
+    over the dominator tree with a stack of the current versions of every temporary.
+
+    Version 0 of a temporary is its value at the entry of the procedure (a parameter, or undefined),
+    the definitions are numbered from 1. Blocks that can't be reached from the initial one are dropped,
+    and an entry block is added if the initial block is the header of a loop.
+    Takes the same arguments as SSACrudeGenerator, the blocks need their liveness.
+
+    Args:
+        blocks (list of BasicBlock): the CFG of the procedure, the initial block first
+        proc (TACProc): the procedure
+    """
+
+    def __init__(self, blocks: List[BasicBlock], proc: TACProc) -> None:
+        self.proc = proc
+        self.blocks = blocks
+
+    def to_ssa(self) -> SSAProc:
+        blocks = self.blocks
+        if any(blocks[0].entry in block.successor_labels() for block in blocks):
+            # the initial block is a loop header: the phi functions of the loop need an entry block to get
+            # the values from before the loop from
+            entry = blocks[0]
+            blocks = [
+                BasicBlock(
+                    TACLabel(f".Lentry.{self.proc.name}"),
+                    [TACOp("jmp", [entry.entry], None)],
+                    initial=True,
+                    fallthrough=entry,
+                    live_in=set(entry.live_in),
+                    live_out=set(entry.live_in),
+                )
+            ] + blocks
+        index = CFGIndex(blocks)
+        dom = index.info().dominators
+        reachable = [i for i in range(len(index.blocks)) if dom.reachable(i)]
+        ssa_blocks = {i: SSABasicBlock(index.blocks[i].entry, [], initial=i == dom.root) for i in reachable}
+
+        # the blocks that define every temporary
+        defsites: Dict[TACTemp, List[int]] = {}
+        for i in reachable:
+            for op in index.blocks[i].ops:
+                if isinstance(op.result, TACTemp):
+                    sites = defsites.setdefault(op.result, [])
+                    if not sites or sites[-1] != i:
+                        sites.append(i)
+        # the temporaries of the phi functions of every block, the initial block has no predecessor to get them from
+        phi_tmps: Dict[int, List[TACTemp]] = {i: [] for i in reachable}
+        for tmp, sites in defsites.items():
+            for i in dom.iterated_frontier(sites):
+                if i != dom.root and tmp in index.blocks[i].live_in:
+                    phi_tmps[i].append(tmp)
+
+        self._rename(index, dom, ssa_blocks, phi_tmps)
+
+        for i, block in ssa_blocks.items():
+            block.successors = [ssa_blocks[j] for j in index.succs[i]]
+            block.predecessors = [ssa_blocks[j] for j in index.preds[i] if j in ssa_blocks]
+            fallthrough = index.blocks[i].fallthrough
+            if fallthrough is not None and index.ids.get(fallthrough.entry) in ssa_blocks:
+                block.fallthrough = ssa_blocks[index.ids[fallthrough.entry]]
+        return SSAProc(list(ssa_blocks.values()), [SSATemp(tmp.id, 0) for tmp in self.proc.params])
+
+    def _rename(self, index: CFGIndex, dom: DominatorTree, ssa_blocks: Dict[int, SSABasicBlock], phi_tmps):
+        # the current versions of every temporary, the top is the one that reaches the current block
+        stacks: Dict[TACTemp, List[SSATemp]] = {}
+        counters: Dict[TACTemp, int] = {}
+
+        def current(tmp: TACTemp) -> SSATemp:
+            stack = stacks.get(tmp)
+            return stack[-1] if stack else SSATemp(tmp.id, 0)
+
+        def define(tmp: TACTemp, pushed: List[TACTemp]) -> SSATemp:
+            counters[tmp] = counters.get(tmp, 0) + 1
+            version = SSATemp(tmp.id, counters[tmp])
+            stacks.setdefault(tmp, []).append(version)
+            pushed.append(tmp)
+            return version
+
+        for i, block in ssa_blocks.items():
+            preds = [index.blocks[j].entry for j in index.preds[i] if j in ssa_blocks]
+            block.defs = [Phi(None, dict.fromkeys(preds)) for _ in phi_tmps[i]]
+
+        # iterative walk over the dominator tree, the versions defined in a block are popped after its subtree
+        work: List[Tuple[int, List[TACTemp] | None]] = [(dom.root, None)]
+        while work:
+            i, popped = work.pop()
+            if popped is not None:
+                for tmp in popped:
+                    stacks[tmp].pop()
+                continue
+            pushed: List[TACTemp] = []
+            block = ssa_blocks[i]
+            for phi, tmp in zip(block.defs, phi_tmps[i]):
+                phi.defined = define(tmp, pushed)
+            for op in index.blocks[i].ops:
+                args = [current(arg) if isinstance(arg, TACTemp) else arg for arg in op.args]
+                result = define(op.result, pushed) if isinstance(op.result, TACTemp) else op.result
+                block.ops.append(SSAOp(op.opcode, args, result))
+            for j in index.succs[i]:
+                for phi, tmp in zip(ssa_blocks[j].defs, phi_tmps[j]):
+                    phi.sources[block.entry] = current(tmp)
+            work.append((i, pushed))
+            for child in reversed(dom.children[i]):
+                work.append((child, None))
+
+
 class SSAOptimizer:
     def __init__(self, ssa: SSAProc) -> None:
         self.proc = ssa
@@ -373,56 +660,60 @@ class SSAOptimizer:
                 Defaults to True.
         """
         if copy_propagate:
-            self._copy_propagate()
+            with span("copy propagation"):
+                self._copy_propagate()
         if rename_and_dead_choice:
-            self._rename_simpl()
-            self._null_choice_elim()
+            with span("rename simplification"):
+                self._rename_simpl()
+            with span("null choice elimination"):
+                self._null_choice_elim()
         return self.proc
 
-    def _copy_propagate_block(self, block: SSABasicBlock):
-        copy_continuations = {}
+    def _copy_propagate_block(self, block: SSABasicBlock, renames: RenameTable):
         new_ops = []
         for op in block.ops:
-            if op.opcode == "copy" and not isinstance(op.args[0], TACGlobal):
-                copy_continuations[op.result] = op.args[0]
-                self.proc.rename_var(op.result, op.args[0])
+            # a copy to a global is a store, it has to stay
+            if op.opcode == "copy" and not isinstance(op.args[0], TACGlobal) and not isinstance(op.result, TACGlobal):
+                renames.rename(op.result, op.args[0])
             else:
                 new_ops.append(op)
         block.ops = new_ops
 
     def _copy_propagate(self):
+        self.proc.invalidate_def_use()
+        renames = RenameTable()
         for block in self.blocks:
-            self._copy_propagate_block(block)
+            self._copy_propagate_block(block, renames)
+        self.proc.apply_renames(renames)
 
     def _rename_simpl(self):
-        simpls = self._find_renames()
-        while len(simpls) != 0:
-            for old, new in simpls:
-                self.proc.rename_var(old, new)
-            self._null_choice_elim()
-            simpls = self._find_renames()
-
-    def _find_renames(self):
-        renames = []
-        for block in self.blocks:
-            for phi in block.defs:
-                versions_used = {phi.defined.version}.union(set([arg.version for arg in phi.sources.values()]))
-                unique_ids = list(
-                    set([tmp.id for tmp in phi.sources.values()])
-                )  # get unique values in the arguments
-                if len(unique_ids) == 1 and len(versions_used) == 2:
-                    versions_used.remove(phi.defined.version)
-                    renames.append((phi.defined, SSATemp(unique_ids[0], versions_used.pop())))
-        return renames
+        # a phi function whose sources are only itself and one other temporary is a rename of that temporary,
+        # replacing it can make the phi functions that use it renames too
+        index = self.proc.def_use
+        work = [(block, phi) for block in self.blocks for phi in block.defs]
+        while work:
+            block, phi = work.pop()
+            if index.is_removed(phi):
+                continue
+            sources = set(phi.sources.values()) - {phi.defined}
+            if len(sources) != 1:
+                continue
+            new = sources.pop()
+            if not isinstance(new, SSATemp):
+                continue
+            index.remove(block, phi)
+            for user in index.replace_uses(phi.defined, new):
+                if isinstance(user[1], Phi):
+                    work.append(user)
+        index.sweep()
 
     def _null_choice_elim(self):
+        index = self.proc.def_use
         for block in self.blocks:
-            new_defs = []
             for phi in block.defs:
-                if not (
-                    all([phi.defined == arg for arg in phi.sources.values()])):
-                    new_defs.append(phi)
-            block.defs = new_defs
+                if all([phi.defined == arg for arg in phi.sources.values()]):
+                    index.remove(block, phi)
+        index.sweep()
 
 
 class SSADeconstructor:
@@ -469,26 +760,42 @@ class SSADeconstructor:
                 for arg in op.args
             ],
             self._ssatmp_to_tac(op.result) if op.result is not None else None,
-            live_in=op.live_in,
-            live_out=op.live_out,
         )
 
     def to_tac(self) -> TAC:
         """
         Convert the SSAProc to TAC
         """
+        self._split_critical_edges()
         self._resolve_phis()
         self._serialize(self.initial)
-        self._rename_liveness_info()
         self._remove_fallthrough_jmps()
         self._remove_unused_labels()
         return TAC(self.serialization)
 
-    def _rename_liveness_info(self):
-        for op in self.serialization:
-            if isinstance(op, TACOp):
-                op.live_in = {self.ssa_to_tac[tmp] if not (isinstance(tmp.id, str) and tmp.id.startswith("%%"))  else tmp for tmp in op.live_in}
-                op.live_out = {self.ssa_to_tac[tmp] if not (isinstance(tmp.id, str) and tmp.id.startswith("%%"))  else tmp for tmp in op.live_out}
+    def _split_critical_edges(self):
+        # the copies of a phi function are inserted at the end of the predecessor, if the predecessor has another
+        # successor they would also run on the path to it (the lost copy problem), so the edge gets its own block
+        for block in list(self.blocks):
+            if len(block.successors) < 2:
+                continue
+            for succ in [succ for succ in block.successors if succ.defs]:
+                split = SSABasicBlock(
+                    SSALabel(f"{block.entry.name}.{succ.entry.name.lstrip('.')}"),
+                    [],
+                    ops=[SSAOp("jmp", [succ.entry], None)],
+                    successors={succ},
+                    predecessors={block},
+                    fallthrough=succ,
+                )
+                block.replace_jumps(succ.entry, split.entry)
+                block.successors = (block.successors - {succ}) | {split}
+                if block.fallthrough == succ:
+                    block.fallthrough = split
+                succ.predecessors = (succ.predecessors - {block}) | {split}
+                for phi in succ.defs:
+                    phi.sources = {split.entry if lbl == block.entry else lbl: tmp for lbl, tmp in phi.sources.items()}
+                self.blocks.append(split)
 
     def _resolve_phis(self):
         copies_to_insert = {block.entry: set() for block in self.blocks}
@@ -510,14 +817,6 @@ class SSADeconstructor:
         copies = dummy_copies + [
             TACOp("copy", [breakups.get(src, src)], res) for (res, src) in to_insert
         ]
-        # carry over liveness
-        live_out = set([c[0] for c in to_insert])
-        for copy_inst in reversed(copies):
-            copy_inst.live_out = live_out
-            copy_inst.live_in = live_out.union(copy_inst.use())
-            copy_inst.live_in.remove(copy_inst.result)
-            live_out = copy_inst.live_in
-
         pre_jump = [op for op in block.ops if not op.is_jmp()]
         jumps = block.ops[len(pre_jump) :]
         block.ops = pre_jump + copies + jumps
@@ -604,13 +903,14 @@ def ssa_print(block: SSABasicBlock):
             print(f"{op.name}")
 
 
-def ssa_print_detailed(block: SSABasicBlock):
+def ssa_print_detailed(block: SSABasicBlock, liveness):
+    # liveness is an SSALivenessAnalyzer of the procedure of the block
     print(str(block.entry) + ":")
     for phi in block.defs:
         print("\t" + phi.pretty())
-    for op in block.ops:
+    for op, (live_in, live_out) in zip(block.ops, liveness.instruction_liveness(block)):
         if isinstance(op, SSAOp):
-            print(op.detailed())
+            print(op.detailed(live_in, live_out))
         else:
             print(f"{op.name}")
 
@@ -0,0 +1,88 @@
+import sys
+import time
+from importlib.abc import MetaPathFinder
+from typing import Dict, List
+
+
+class _TimedLoader:
+    """
+    Wraps the loader of a module to time the execution of its body
+    """
+
+    def __init__(self, loader, profiler: "ImportProfiler") -> None:
+        self.loader = loader
+        self.profiler = profiler
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.profiler.stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            total = time.perf_counter() - start
+            nested = self.profiler.stack.pop()
+            if self.profiler.stack:
+                self.profiler.stack[-1] += total
+            self.profiler.times[module.__name__] = (total - nested, total)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class ImportProfiler(MetaPathFinder):
+    """
+    Measures how long importing every module takes, like `python -X importtime`
+    but from inside the compiler so it only covers what a compilation actually imports.
+    Modules imported before `install` is called are not measured.
+
+    For every module we record the time spent in its own body (self) and
+    including the modules it imported (cumulative).
+    """
+
+    def __init__(self) -> None:
+        self.times: Dict[str, tuple] = {}  # module name -> (self, cumulative) in seconds
+        self.stack: List[float] = []  # time spent in nested imports for each module being loaded
+        self.start = time.perf_counter()
+        self.interpreter_startup = 0.0
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        self.start = time.perf_counter()
+        # CPU time of the process so far, i.e. starting the interpreter and running site
+        self.interpreter_startup = time.process_time()
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def report(self, file=sys.stderr, limit=25):
+        """
+        Print the slowest imports, the total import time and the time since `install`
+
+        Args:
+            file (optional): where to print the report, stderr by default
+            limit (int, optional): number of modules to list
+        """
+        elapsed = time.perf_counter() - self.start
+        print(f"{'module':<40} {'self [ms]':>10} {'cumul [ms]':>10}", file=file)
+        slowest = sorted(self.times.items(), key=lambda item: item[1][0], reverse=True)
+        for name, (own, total) in slowest[:limit]:
+            print(f"{name:<40} {own * 1000:>10.2f} {total * 1000:>10.2f}", file=file)
+        print(f"{len(self.times)} modules imported", file=file)
+        print(f"total import time {sum(own for own, _ in self.times.values()) * 1000:.2f} ms", file=file)
+        print(f"interpreter startup (cpu) {self.interpreter_startup * 1000:.2f} ms", file=file)
+        print(f"time since install {elapsed * 1000:.2f} ms", file=file)
@@ -1,13 +1,43 @@
+import weakref
+import zlib
 from dataclasses import field
 from .bxast import *
-from typing import Dict, Set
+from typing import Any, Dict, Iterator, Set
 
 CC_REG_ORDER = ["rdi", "rsi", "rdx", "rcx", "r8", "r9"]
 
 
+def stable_hash(value: str | int) -> int:
+    """
+    The hash of the id of a temporary or the name of a label. hash() of a str changes with PYTHONHASHSEED,
+    this one doesn't, so sets of temporaries and labels are iterated in the same order in every run
+    and the register allocation and the block order don't depend on the process.
+    """
+    if isinstance(value, str):
+        return zlib.crc32(value.encode())
+    return hash(value)
+
+
 class TACTemp:
-    def __init__(self, id: str | int) -> None:
-        self.id = id
+    """
+    A temporary. Temporaries are interned: TACTemp(x) always returns the same object for the same id,
+    so they are compared by identity and their hash is computed once.
+    They must not be modified, copies of them are the temporary itself.
+    The table only holds them weakly, a long running process (--serve, --watch) forgets the temporaries
+    of the programs it compiled before.
+    """
+
+    __slots__ = ("id", "_hash", "__weakref__")
+    _interned: "weakref.WeakValueDictionary[str | int, TACTemp]" = weakref.WeakValueDictionary()
+
+    def __new__(cls, id: str | int) -> "TACTemp":
+        tmp = cls._interned.get(id)
+        if tmp is None:
+            tmp = object.__new__(cls)
+            tmp.id = id
+            tmp._hash = stable_hash(id)
+            cls._interned[id] = tmp
+        return tmp
 
     def __str__(self):
         return f"%{self.id}"
@@ -15,11 +45,18 @@ class TACTemp:
     def __repr__(self):
         return f"%{self.id}"
 
-    def __eq__(self, __value: object) -> bool:
-        return isinstance(__value, TACTemp) and self.id == __value.id
-
     def __hash__(self) -> int:
-        return hash(self.id)
+        return self._hash
+
+    def __reduce__(self):
+        # unpickling interns the temporary again
+        return (type(self), (self.id,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
 
 @dataclass
@@ -43,30 +80,49 @@ class TACGlobalDecl:
         return f"{self.glob} = {self.init}"
 
 
-@dataclass
 class TACLabel:
-    name: str
+    """
+    A label, interned like TACTemp
+    """
+
+    __slots__ = ("name", "_hash", "__weakref__")
+    __match_args__ = ("name",)
+    _interned: "weakref.WeakValueDictionary[str, TACLabel]" = weakref.WeakValueDictionary()
+
+    def __new__(cls, name: str) -> "TACLabel":
+        lbl = cls._interned.get(name)
+        if lbl is None:
+            lbl = object.__new__(cls)
+            lbl.name = name
+            lbl._hash = stable_hash(name)
+            cls._interned[name] = lbl
+        return lbl
+
+    def __repr__(self) -> str:
+        return f"TACLabel(name={self.name!r})"
 
     def __hash__(self) -> int:
-        return hash(self.name)
+        return self._hash
 
-    def __eq__(self, __value: object) -> bool:
-        return __value.name == self.name
+    def __reduce__(self):
+        return (type(self), (self.name,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __str__(self):
         return f"%{self.name}"
 
 
-@dataclass
+@dataclass(slots=True)
 class TACOp:
     opcode: str
     args: List[TACTemp | TACLabel | int | TACGlobal]
     result: TACTemp | TACGlobal | None
 
-    # for liveness analysis
-    live_in: Set[TACTemp] = field(default_factory=set)
-    live_out: Set[TACTemp] = field(default_factory=set)
-
     def to_dict(self):
         return {
             "opcode": self.opcode,
@@ -83,8 +139,8 @@ class TACOp:
             return f"{self.result} = {self.opcode} {' '.join([str(arg) for arg in self.args])}"
         return f"{self.opcode} {' '.join([str(arg) for arg in self.args])}"
 
-    def detailed(self) -> str:
-        return f"\t{str(self.live_in)} \n\t{self.pretty()}\n \t{str(self.live_out)}"
+    def detailed(self, live_in: Set[TACTemp], live_out: Set[TACTemp]) -> str:
+        return f"\t{str(live_in)} \n\t{self.pretty()}\n \t{str(live_out)}"
 
     def is_jmp(self) -> bool:
         return self.opcode in JMP_OPS
@@ -103,7 +159,7 @@ class TACOp:
     def defined(self, interference=True) -> Set[TACTemp]:
         defined = set()
 
-        if self.result is not None:
+        if self.result is not None and not isinstance(self.result, TACGlobal):
             defined.add(self.result)
         if interference:
             # these dummies only need to be added for the construction of the interference graph
@@ -144,11 +200,163 @@ class TAC:
         return temps
 
 
+def bits(bitset: int) -> Iterator[int]:
+    """
+    The positions of the set bits, lowest first
+    """
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
+
+
+class SymbolTable:
+    """
+    The temporaries of one procedure with dense integer indices (in the order they were added),
+    for bitsets and array indexed side tables. A set of temporaries as a bitset is an int whose bit i is set
+    if the temporary with index i is in the set, so unions and differences are single int operations.
+    Also hands out fresh temporaries in constant time.
+
+    Args:
+        tmps (iterable of TACTemp or SSATemp, optional): the temporaries to add
+    """
+
+    def __init__(self, tmps=()) -> None:
+        self.index: Dict[TACTemp | Any, int] = {}
+        self.tmps: List[TACTemp | Any] = []
+        self.next_id = 0  # larger than the integer id of every TACTemp in the table
+        for tmp in tmps:
+            self.add(tmp)
+
+    def __len__(self) -> int:
+        return len(self.tmps)
+
+    def add(self, tmp) -> int:
+        """
+        Add a temporary if it isn't in the table yet, returns its index
+        """
+        i = self.index.get(tmp)
+        if i is None:
+            i = self.index[tmp] = len(self.tmps)
+            self.tmps.append(tmp)
+            if isinstance(tmp, TACTemp) and isinstance(tmp.id, int) and tmp.id >= self.next_id:
+                self.next_id = tmp.id + 1
+        return i
+
+    def fresh(self) -> TACTemp:
+        """
+        A new temporary that is not in the table
+        """
+        tmp = TACTemp(self.next_id)
+        self.add(tmp)
+        return tmp
+
+    def bitset(self, tmps) -> int:
+        bitset = 0
+        for tmp in tmps:
+            bitset |= 1 << self.add(tmp)
+        return bitset
+
+    def to_set(self, bitset: int) -> set:
+        tmps = self.tmps
+        return {tmps[i] for i in bits(bitset)}
+
+
+class RenameTable:
+    """
+    Union-find of the renames done by a pass. `rename(old, new)` records in O(α) time that old now has the same value
+    as new, `resolve` gives the current name of a temporary (a temporary or a constant), and the passes rewrite
+    their operands with it once at the end (`apply_renames` of the procedures) or when they read them.
+    Renames are done on the current names, so renaming a temporary that was already renamed merges its class.
+
+    Constants (ints) are never renamed themselves, they can only be the name of a class.
+    """
+
+    def __init__(self) -> None:
+        self.parent: Dict[Any, Any] = {}
+        self.rank: Dict[Any, int] = {}
+        self.name: Dict[Any, Any] = {}  # root of a class -> current name of its temporaries
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def _root(self, tmp):
+        parent = self.parent
+        if tmp not in parent:
+            parent[tmp] = tmp
+            self.rank[tmp] = 0
+            self.name[tmp] = tmp
+            return tmp
+        root = tmp
+        while parent[root] is not root:
+            root = parent[root]
+        # path compression
+        while parent[tmp] is not root:
+            parent[tmp], tmp = root, parent[tmp]
+        return root
+
+    def rename(self, old, new):
+        """
+        Record that every occurrence of old (or of what old was renamed to) is replaced by new
+        """
+        old_root = self._root(old)
+        if isinstance(new, int):
+            self.name[old_root] = new
+            return
+        new_root = self._root(new)
+        if old_root is new_root:
+            return
+        name = self.name[new_root]
+        # union by rank
+        if self.rank[old_root] > self.rank[new_root]:
+            old_root, new_root = new_root, old_root
+        elif self.rank[old_root] == self.rank[new_root]:
+            self.rank[new_root] += 1
+        self.parent[old_root] = new_root
+        self.name[new_root] = name
+
+    def resolve(self, tmp):
+        if tmp.__hash__ is None or tmp not in self.parent:
+            return tmp
+        return self.name[self._root(tmp)]
+
+    def resolve_op(self, op, replace_results=True):
+        """
+        Rewrite the operands (and the result) of a TACOp or SSAOp to their current names
+        """
+        resolve = self.resolve
+        op.args = [resolve(arg) for arg in op.args]
+        if replace_results and op.result is not None:
+            op.result = resolve(op.result)
+
+
 @dataclass
 class TACProc:
     name: str
     body: TAC
     params: List[TACTemp]
+    # of the current body, built when it is first needed
+    _symbols: SymbolTable | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def symbols(self) -> SymbolTable:
+        if self._symbols is None:
+            self._symbols = SymbolTable(self.params)
+            for op in self.body.ops:
+                if isinstance(op, TACOp):
+                    for tmp in op.args:
+                        if isinstance(tmp, TACTemp):
+                            self._symbols.add(tmp)
+                    if isinstance(op.result, TACTemp):
+                        self._symbols.add(op.result)
+        return self._symbols
+
+    def replace_body(self, body: TAC):
+        """
+        Replace the body, e.g. by the deconstructed SSA form, which names the temporaries differently
+        """
+        self.body = body
+        self._symbols = None
 
     def get_tmps(self):
         return set(self.params).union(self.body.get_tmps())
@@ -164,8 +372,18 @@ class TACProc:
                     new if op.result is not None and op.result == old else op.result
                 )
 
+    def apply_renames(self, renames: RenameTable):
+        """
+        Rewrite the whole body with the renames recorded in the table
+        """
+        if len(renames) == 0:
+            return
+        for op in self.body.ops:
+            if isinstance(op, TACOp):
+                renames.resolve_op(op)
+
     def new_unused_tmp(self) -> TACTemp:
-        return TACTemp(len(self.get_tmps()) + 1)
+        return self.symbols.fresh()
 
 
 OPCODES = [
@@ -196,6 +414,9 @@ OPCODES = [
     "call",
 ]
 
+# dense ids of the opcodes, e.g. for the opcode array of an OpStream
+OPCODE_IDS = {opcode: i for i, opcode in enumerate(OPCODES)}
+
 JMP_OPS = ["jmp", "jz", "jnz", "jl", "jle", "jnl", "jnle", "ret"]
 
 UNCOND_JMP_OP = ["jmp", "ret"]
@@ -232,9 +453,13 @@ def pretty_print(tac: TAC) -> str:
 
 
 def print_detailed(tac: TAC):
-    for op in tac.ops:
+    from .liveness import SerializedLivenessAnalyzer
+
+    liveness = SerializedLivenessAnalyzer(tac)
+    liveness.liveness()
+    for k, op in enumerate(tac.ops):
         if isinstance(op, TACOp):
-            print(f"{op.detailed()}")
+            print(f"{op.detailed(*liveness.at(k))}")
         else:
             print(f"{op.name}")
 
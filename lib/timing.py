@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+from typing import Dict, List
+
+# The timer of the running compilation, None if nobody asked for timings.
+# It is a global so that the passes don't have to pass it around: `span` is a no-op without it.
+_active: "PassTimer | None" = None
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def note(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, timer: "PassTimer", name: str, args: Dict) -> None:
+        self.timer = timer
+        self.name = name
+        self.args = args
+
+    def note(self, **args):
+        """
+        Add results of the pass to the record, e.g. the number of instructions it removed
+        """
+        self.args.update(args)
+
+    def __enter__(self):
+        timer = self.timer
+        self.depth = len(timer.stack)
+        if timer.memory:
+            import tracemalloc
+
+            current, peak = tracemalloc.get_traced_memory()
+            if timer.stack:
+                parent = timer.stack[-1]
+                parent.peak = max(parent.peak, peak)
+            tracemalloc.reset_peak()
+            self.mem_start = current
+            self.peak = current
+        timer.stack.append(self)
+        self.cpu_start = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu_start
+        timer = self.timer
+        timer.stack.pop()
+        mem = None
+        if timer.memory:
+            import tracemalloc
+
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            mem = self.peak - self.mem_start
+            if timer.stack:
+                parent = timer.stack[-1]
+                parent.peak = max(parent.peak, self.peak)
+            tracemalloc.reset_peak()
+        timer.records.append(
+            {
+                "name": self.name,
+                "args": self.args,
+                "depth": self.depth,
+                "start": self.start,
+                "wall": wall,
+                "cpu": cpu,
+                "mem": mem,
+                "pid": os.getpid(),
+            }
+        )
+        return False
+
+
+class PassTimer:
+    """
+    Collects the wall time, CPU time and (optionally) the peak memory of nested spans of the compilation,
+    e.g. a pass inside the compilation of a function.
+
+    Every finished span is a record, a dict with the keys name, args (e.g. the function), depth (nesting level),
+    start (time.perf_counter()), wall and cpu (seconds), mem (bytes allocated at the peak of the span
+    above what was allocated at its start, None without memory tracking) and pid (of the worker process).
+
+    Args:
+        memory (bool, optional): track the memory with tracemalloc, this makes the compilation a lot slower
+    """
+
+    def __init__(self, memory=False) -> None:
+        self.memory = memory
+        self.records: List[Dict] = []
+        self.stack: List[_Span] = []
+
+    def span(self, name: str, args: Dict | None = None) -> _Span:
+        return _Span(self, name, args or {})
+
+    def start(self):
+        """
+        Make this the active timer
+        """
+        global _active
+        import tracemalloc
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _active = self
+
+    def stop(self):
+        global _active
+        import tracemalloc
+
+        if _active is self:
+            _active = None
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def span(name: str, **args):
+    """
+    Context manager timing the code inside it, if a PassTimer is active
+
+    Args:
+        name (str): the name of the pass
+        **args: shown in the trace, e.g. function="main"
+    """
+    if _active is None:
+        return _NULL_SPAN
+    return _active.span(name, args)
+
+
+def active() -> "PassTimer | None":
+    return _active
+
+
+def time_passes_table(records: List[Dict], file=sys.stderr):
+    """
+    Print a table with the times of every pass, for every function and summed over all functions
+
+    Args:
+        records (list of dict): the records of a PassTimer
+        file (optional): where to print the table, stderr by default
+    """
+    records = sorted(records, key=lambda record: (record["pid"], record["start"], record["depth"]))
+    has_mem = any(record["mem"] is not None for record in records)
+    header = f"{'pass':<48} {'wall [ms]':>10} {'cpu [ms]':>10}"
+    if has_mem:
+        header += f" {'peak [KiB]':>11}"
+
+    def row(name, wall, cpu, mem):
+        line = f"{name:<48} {wall * 1000:>10.2f} {cpu * 1000:>10.2f}"
+        if has_mem:
+            line += f" {mem / 1024:>11.1f}" if mem is not None else f" {'':>11}"
+        return line
+
+    print(header, file=file)
+    for record in records:
+        label = "  " * record["depth"] + record["name"]
+        if "function" in record["args"] and record["name"] == "function":
+            label += " " + record["args"]["function"]
+        else:
+            label += "".join(f" {key}={value}" for key, value in record["args"].items())
+        print(row(label, record["wall"], record["cpu"], record["mem"]), file=file)
+
+    # the same passes summed over all functions
+    totals: Dict[str, List] = {}
+    for record in records:
+        if record["name"] == "function":
+            continue
+        total = totals.setdefault(record["name"], [0, 0.0, 0.0, None])
+        total[0] += 1
+        total[1] += record["wall"]
+        total[2] += record["cpu"]
+        if record["mem"] is not None:
+            total[3] = max(total[3] or 0, record["mem"])
+    print(file=file)
+    print(f"{'total per pass':<40} {'count':>7}" + header[48:], file=file)
+    for name, (count, wall, cpu, mem) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        print(f"{name:<40} {count:>7}" + row("", wall, cpu, mem)[48:], file=file)
+
+
+def write_trace(records: List[Dict], path: str):
+    """
+    Write the records in the Chrome trace event format, to be opened with Perfetto or chrome://tracing
+
+    Args:
+        records (list of dict): the records of a PassTimer
+        path (str): the output file
+    """
+    import json
+
+    origin = min((record["start"] for record in records), default=0.0)
+    events = []
+    for record in records:
+        args = dict(record["args"])
+        args["cpu_ms"] = round(record["cpu"] * 1000, 3)
+        if record["mem"] is not None:
+            args["peak_kib"] = round(record["mem"] / 1024, 1)
+        events.append(
+            {
+                "name": record["name"] if record["name"] != "function" else args.get("function", "function"),
+                "cat": "function" if record["name"] == "function" else "pass",
+                "ph": "X",
+                "ts": (record["start"] - origin) * 1e6,
+                "dur": record["wall"] * 1e6,
+                "pid": record["pid"],
+                "tid": record["pid"],
+                "args": args,
+            }
+        )
+    # the enclosing spans first, so viewers nest spans starting at the same time correctly
+    events.sort(key=lambda event: (event["pid"], event["ts"], -event["dur"]))
+    with open(path, "w") as fp:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fp)
@@ -0,0 +1,168 @@
+import os
+import time
+from typing import Callable, Dict, List, Set, Tuple
+from .bxast import *
+from .tac import TACGlobal
+from .asmgen import make_data_section, make_text_section, global_symbs
+from .cache import unit_key
+from .compile import front_end, compile_units, function_allocator
+
+
+class CallGraph:
+    """
+    The static call graph of a program
+
+    Args:
+        funs (list of Function): the functions of the program
+    """
+
+    def __init__(self, funs: List[Function]) -> None:
+        self.callees: Dict[str, Set[str]] = {fun.name: called_functions(fun.body) for fun in funs}
+        self.callers: Dict[str, Set[str]] = {fun.name: set() for fun in funs}
+        for caller, callees in self.callees.items():
+            for callee in callees:
+                if callee in self.callers:  # runtime functions are not part of the graph
+                    self.callers[callee].add(caller)
+
+    def transitive_callers(self, names: Set[str]) -> Set[str]:
+        """
+        All functions that (directly or indirectly) call one of the given functions
+        """
+        found = set()
+        worklist = list(names)
+        while worklist:
+            name = worklist.pop()
+            for caller in self.callers.get(name, ()):
+                if caller not in found:
+                    found.add(caller)
+                    worklist.append(caller)
+        return found
+
+
+def called_functions(node) -> Set[str]:
+    """
+    Names of all functions called somewhere in the AST
+    """
+    called = set()
+    if isinstance(node, (list, tuple)):
+        for child in node:
+            called |= called_functions(child)
+    elif isinstance(node, ExpressionCall):
+        called.add(node.target)
+        called |= called_functions(node.arguments)
+    elif isinstance(node, (Block, Statement, Expression)):
+        for child in vars(node).values():
+            if child is not None and not isinstance(child, (str, int, Type)):
+                called |= called_functions(child)
+    return called
+
+
+class IncrementalCompiler:
+    """
+    Keeps the compiled program in memory and only recompiles the functions
+    whose AST (or the globals they use) changed since the last build.
+
+    Args:
+        optim (int, optional): the optimization level
+        jobs (int, optional): number of worker processes for the recompiled functions
+        recompile_callers (bool, optional): also recompile all callers of a changed function.
+            This is only needed once we do interprocedural optimization, all our passes only look at a single function.
+        frontend (str, optional): the parser to use, see `compile.parse`
+        allocator (str or dict str -> str, optional): the register allocator, see `compile.compile`
+    """
+
+    def __init__(self, optim=0, jobs=1, recompile_callers=False, frontend="ply", allocator="auto") -> None:
+        self.optim = optim
+        self.frontend = frontend
+        self.allocator = allocator
+        self.jobs = jobs
+        self.recompile_callers = recompile_callers
+        self.units: Dict[str, Tuple[str, str]] = {}  # function name -> (key, asm)
+        self.callgraph: CallGraph | None = None
+        self.recompiled: Set[str] = set()
+
+    def rebuild(self, src: str) -> str:
+        """
+        Compile the new version of the program, reusing the assembly of unchanged functions
+
+        Args:
+            src (str): the new source code
+        Returns:
+            str: the assembly of the whole program
+        """
+        decls = front_end(src, frontend=self.frontend)
+        globvars = [decl for decl in decls if isinstance(decl, StatementDecl)]
+        funs = [fun for fun in decls if isinstance(fun, Function)]
+        globalmap = {var.name: TACGlobal(var.name) for var in globvars}
+        self.callgraph = CallGraph(funs)
+
+        keys = {
+            fun.name: unit_key(fun, globalmap, self.optim, function_allocator(self.allocator, fun.name))
+            for fun in funs
+        }
+        changed = {
+            name
+            for name, key in keys.items()
+            if name not in self.units or self.units[name][0] != key
+        }
+        if self.recompile_callers:
+            changed |= self.callgraph.transitive_callers(changed)
+
+        to_compile = [fun for fun in funs if fun.name in changed]
+        asms = compile_units(to_compile, globalmap, optim=self.optim, jobs=self.jobs, allocator=self.allocator)
+        units = {fun.name: self.units.get(fun.name) for fun in funs}  # drops deleted functions
+        for fun, asm in zip(to_compile, asms):
+            units[fun.name] = (keys[fun.name], asm)
+        self.units = units
+        self.recompiled = changed
+
+        return (
+            global_symbs(decls)
+            + make_data_section(globvars)
+            + make_text_section([self.units[fun.name][1] for fun in funs])
+        )
+
+
+def watch(
+    sourcefile: str,
+    compiler: IncrementalCompiler,
+    on_rebuild: Callable[[str], None],
+    interval=0.5,
+):
+    """
+    Rebuild the program every time the source file changes. Runs until interrupted.
+
+    Args:
+        sourcefile (str): path of the source file
+        compiler (IncrementalCompiler): the compiler holding the previous build
+        on_rebuild (str -> None): called with the new assembly after every successful build (e.g. to link it)
+        interval (float, optional): seconds between checks of the file
+    """
+    last_mtime = None
+    while True:
+        try:
+            mtime = os.stat(sourcefile).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None  # editors sometimes delete and recreate the file
+        if mtime is not None and mtime != last_mtime:
+            last_mtime = mtime
+            with open(sourcefile) as fp:
+                source = fp.read()
+            start = time.perf_counter()
+            try:
+                asm = compiler.rebuild(source)
+            except SystemExit:
+                # the checkers already printed the errors
+                print("Build failed, waiting for changes...")
+            except Exception as e:
+                print(f"Build failed: {e}, waiting for changes...")
+            else:
+                on_rebuild(asm)
+                msg = (
+                    f"Rebuilt {sourcefile} in {time.perf_counter() - start:.3f}s, "
+                    f"recompiled {len(compiler.recompiled)} of {len(compiler.units)} functions"
+                )
+                if len(compiler.recompiled) < len(compiler.units):
+                    msg += ": " + ", ".join(sorted(compiler.recompiled))
+                print(msg)
+        time.sleep(interval)
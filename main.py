@@ -1,15 +1,35 @@
 import sys
 import os
 import time
-from lib.asmgen import AsmGen
-from lib.parser import parser
-from lib.checker import SyntaxChecker, TypeChecker
-from lib.tmm import TMM
-from lib.cfg import CFGAnalyzer
-from lib.tac import pretty_print
-from lib.compile import compile
+
+# --startup-profile has to be set up before the compiler is imported,
+# everything else is imported where it is needed to keep the startup short
+if "--startup-profile" in sys.argv:
+    from lib.startup import ImportProfiler
+
+    profiler = ImportProfiler()
+    profiler.install()
+
+
+def optional_arg(flag: str, default: str) -> str:
+    # value of a flag whose argument can be left out
+    i = sys.argv.index(flag)
+    if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("-"):
+        return sys.argv[i + 1]
+    return default
+
 
 if __name__ == "__main__":
+    if "--serve" in sys.argv:
+        # long running compile server, see lib/server.py
+        from lib.server import CompileServer, DEFAULT_SOCKET
+
+        workers = None
+        if "--workers" in sys.argv:
+            workers = int(sys.argv[sys.argv.index("--workers") + 1])
+        CompileServer(optional_arg("--serve", DEFAULT_SOCKET), workers=workers).run()
+        sys.exit()
+
     sourcefile = sys.argv[1]
     # sourcefile= "examples/bigcondition2.bx"
     with open(sourcefile) as fp:
@@ -20,17 +40,63 @@ if __name__ == "__main__":
         if f"-O{i}" in sys.argv:
             optim = i
 
-    asm = compile(source, optim=optim)
+    # -jN or -j N compiles the functions on N worker processes (-j alone uses all CPUs)
+    jobs = 1
+    for i, arg in enumerate(sys.argv):
+        if arg.startswith("-j"):
+            if len(arg) > 2:
+                jobs = int(arg[2:])
+            elif i + 1 < len(sys.argv) and sys.argv[i + 1].isdigit():
+                jobs = int(sys.argv[i + 1])
+            else:
+                jobs = 0
+
+    # --cache reuses the results for unchanged functions from earlier runs
+    cache = None
+    if "--cache" in sys.argv or "--cache-dir" in sys.argv:
+        from lib.cache import CompilationCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE
+
+        cache_dir = DEFAULT_CACHE_DIR
+        cache_size = DEFAULT_CACHE_SIZE
+        if "--cache-dir" in sys.argv:
+            cache_dir = sys.argv[sys.argv.index("--cache-dir") + 1]
+        if "--cache-size" in sys.argv:
+            # given in MiB
+            cache_size = int(sys.argv[sys.argv.index("--cache-size") + 1]) * 2**20
+        cache = CompilationCache(cache_dir, cache_size)
+
+    # --frontend rd uses the hand-written parser instead of the PLY one
+    frontend = "ply"
+    if "--frontend" in sys.argv:
+        frontend = sys.argv[sys.argv.index("--frontend") + 1]
+
+    # --allocator linear|graph|auto picks the register allocator for all functions,
+    # --allocator f=linear,g=graph for single functions (the others use auto)
+    allocator = "auto"
+    if "--allocator" in sys.argv:
+        allocator = sys.argv[sys.argv.index("--allocator") + 1]
+        if "=" in allocator:
+            allocator = dict(item.split("=", 1) for item in allocator.split(","))
 
-    if "--nolink" in sys.argv:
-        print(asm)
+    # --time-passes prints the time and memory used by every pass, --trace file.json writes them as a chrome trace
+    timer = None
+    if "--time-passes" in sys.argv or "--trace" in sys.argv:
+        from lib.timing import PassTimer
+
+        timer = PassTimer(memory="--time-passes" in sys.argv)
+        timer.start()
+
+    if "-o" in sys.argv:
+        i = sys.argv.index("-o")
+        output = sys.argv[i + 1]
     else:
-        if "-o" in sys.argv:
-            i = sys.argv.index("-o")
-            output = sys.argv[i + 1]
-        else:
-            output = "./out"
-        # output = "examples/bigcond2_opt"
+        output = "./out"
+    # output = "examples/bigcond2_opt"
+
+    def emit(asm: str):
+        if "--nolink" in sys.argv:
+            print(asm)
+            return
         fp = open(f"{output}.S", "w")
         fp.write(asm)
         fp.close()
@@ -40,4 +106,40 @@ if __name__ == "__main__":
             os.system(f"{output}.o")
             time.sleep(0.1)
             os.system(f"rm {output}.S")
-            os.system(f"rm {output}.o")
\ No newline at end of file
+            os.system(f"rm {output}.o")
+
+    if "--watch" in sys.argv:
+        # keep the program in memory and only recompile changed functions on every save
+        from lib.watch import IncrementalCompiler, watch
+
+        try:
+            watch(sourcefile, IncrementalCompiler(optim=optim, jobs=jobs, frontend=frontend, allocator=allocator), emit)
+        except KeyboardInterrupt:
+            pass
+    elif "--connect" in sys.argv:
+        # let a running compile server do the work
+        from lib.server import request, DEFAULT_SOCKET
+
+        options = {"frontend": frontend, "allocator": allocator}
+        if cache is not None:
+            options |= {"cache_dir": os.path.abspath(cache.path), "cache_size": cache.max_size >> 20}
+        response = request(source, optim, options, path=optional_arg("--connect", DEFAULT_SOCKET))
+        print(response["diagnostics"], end="")
+        if not response["ok"]:
+            sys.exit(1)
+        emit(response["asm"])
+    else:
+        from lib.compile import compile
+
+        emit(compile(source, optim=optim, jobs=jobs, cache=cache, frontend=frontend, allocator=allocator))
+
+    if timer is not None:
+        from lib.timing import time_passes_table, write_trace
+
+        timer.stop()
+        if "--time-passes" in sys.argv:
+            time_passes_table(timer.records)
+        if "--trace" in sys.argv:
+            write_trace(timer.records, sys.argv[sys.argv.index("--trace") + 1])
+    if "--startup-profile" in sys.argv:
+        profiler.report()
@@ -0,0 +1,39 @@
+"""
+The generated assembly must not depend on the hash seed of the process
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bxgen import generate
+
+COMPILE = """
+import sys
+sys.path.insert(0, {root!r})
+sys.setrecursionlimit(100000)
+from lib.compile import compile
+asm = compile(sys.stdin.read(), optim={optim}, allocator={allocator!r})
+sys.stdout.write("\\0" + asm)
+"""
+
+
+def compile_with_seed(src: str, optim: int, allocator: str, seed: int) -> str:
+    env = dict(os.environ, PYTHONHASHSEED=str(seed))
+    code = COMPILE.format(root=ROOT, optim=optim, allocator=allocator)
+    result = subprocess.run(
+        [sys.executable, "-c", code], input=src, capture_output=True, text=True, env=env, check=True
+    )
+    # the compiler may print diagnostics before the assembly
+    return result.stdout.split("\0", 1)[1]
+
+
+@pytest.mark.parametrize("allocator", ["graph", "linear"])
+@pytest.mark.parametrize("optim", [3, 4, 6])
+def test_hash_seed_independent(optim, allocator):
+    src = generate(functions=10, statements=30, params=3, seed=1)
+    assert compile_with_seed(src, optim, allocator, 1) == compile_with_seed(src, optim, allocator, 2)
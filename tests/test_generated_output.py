@@ -0,0 +1,52 @@
+"""
+Generated programs print the same at every optimization level and with both register allocators as at -O0,
+and the parameters after the sixth arrive in their places
+"""
+import io
+import os
+import shutil
+import subprocess
+import sys
+from contextlib import redirect_stdout
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+sys.setrecursionlimit(100000)
+
+from bxgen import generate
+from lib.compile import compile
+
+pytestmark = pytest.mark.skipif(shutil.which("gcc") is None, reason="needs gcc to link the programs")
+
+
+def run(src: str, optim: int, allocator: str, path: str) -> bytes:
+    with redirect_stdout(io.StringIO()):
+        asm = compile(src, optim=optim, allocator=allocator)
+    with open(path + ".S", "w") as fp:
+        fp.write(asm)
+    subprocess.run(["gcc", "-o", path, path + ".S", os.path.join(ROOT, "bx_runtime.c")], check=True, capture_output=True)
+    return subprocess.run([path], check=True, capture_output=True, timeout=60).stdout
+
+
+# more than 2 parameters puts some in %rdx and %rcx, which div, mod and the shifts clobber,
+# more than 6 passes some on the stack
+@pytest.mark.parametrize("params,seed", [(0, 1), (3, 1), (3, 2), (5, 3), (7, 4), (9, 5)])
+def test_levels_match_O0(params, seed, tmp_path):
+    src = generate(functions=6, statements=25, params=params, seed=seed)
+    expected = run(src, 0, "auto", str(tmp_path / "O0"))
+    for optim in range(1, 7):
+        for allocator in ["graph", "linear"] if optim > 2 and optim != 5 else ["auto"]:
+            output = run(src, optim, allocator, str(tmp_path / f"O{optim}{allocator}"))
+            assert output == expected, f"-O{optim} --allocator {allocator}"
+
+
+@pytest.mark.parametrize("allocator", ["graph", "linear"])
+def test_stack_parameters(allocator, tmp_path):
+    with open(os.path.join(ROOT, "examples", "stackparams.bx")) as fp:
+        src = fp.read()
+    for optim in [3, 4, 6]:
+        output = run(src, optim, allocator, str(tmp_path / f"O{optim}"))
+        assert output.split() == [b"204", b"123", b"207", b"888"], f"-O{optim}"
@@ -0,0 +1,27 @@
+"""
+A parallel build gives the same assembly as a serial one, whatever the start method of the workers
+"""
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bxgen import generate
+from lib.compile import compile_units, front_end
+from lib.tac import TACGlobal
+from lib.bxast import Function, StatementDecl
+
+
+@pytest.mark.parametrize("optim", [0, 3, 6])
+def test_spawned_workers_match_serial(optim):
+    decls = front_end(generate(functions=8, statements=20, params=3, seed=3))
+    funs = [decl for decl in decls if isinstance(decl, Function)]
+    globalmap = {decl.name: TACGlobal(decl.name) for decl in decls if isinstance(decl, StatementDecl)}
+    serial = compile_units(funs, globalmap, optim=optim, jobs=1)
+    spawned = compile_units(funs, globalmap, optim=optim, jobs=4, mp_context=multiprocessing.get_context("spawn"))
+    assert spawned == serial
@@ -0,0 +1,52 @@
+"""
+A compile server answers every request as if it was the first one its worker got
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lib.server import request
+
+# the semicolon after print(x) is missing, PLY reports the } on line 4
+SYNTAX_ERROR = """def main() {
+  var x = 1 : int;
+  print(x)
+}
+"""
+
+
+@pytest.fixture
+def server():
+    # unix socket paths are short, tmp_path may be too long
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "bxc.sock")
+        # a single worker, so it gets every request
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "main.py"), "--serve", path, "--workers", "1"],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            assert process.stdout.readline().startswith("Serving on")
+            yield path
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+@pytest.mark.parametrize("frontend", ["ply", "rd"])
+def test_syntax_errors(server, frontend):
+    options = {"frontend": frontend}
+    first = request(SYNTAX_ERROR, options=options, path=server)
+    second = request(SYNTAX_ERROR, options=options, path=server)
+    assert not first["ok"] and not second["ok"]
+    assert "internal compiler error" not in first["diagnostics"]
+    assert "'}',4," in first["diagnostics"]
+    assert second == first
+    assert request("def main() { print(42); }", options=options, path=server)["ok"]